@@ -0,0 +1,243 @@
+"""
+Модуль асинхронного режима работы бота (BOT_MODE=async).
+
+В этом режиме бот работает через AsyncTeleBot, а запросы к API Hotels.com выполняются асинхронно
+через aiohttp, поэтому медленный ответ RapidAPI не занимает поток-обработчик: один процесс
+может одновременно вести сотни поисковых диалогов.
+
+Обработчики команд (пакет handlers) и шаги поиска (модуль utils) те же, что и в синхронном режиме:
+здесь заменяется только слой ввода-вывода - движок AsyncEngine (см. модуль engine). Запросы к API
+и Telegram выполняются в цикле событий, фоновые задачи - задачами asyncio, а вызовы, которые берут
+блокировки потоков или работают с файлами (кэши, хранилища сессий и истории поиска), - в отдельных потоках.
+
+Для работы режима требуется библиотека aiohttp.
+"""
+
+import asyncio
+import time
+from typing import Any, Callable, Coroutine, Dict, Optional
+
+import aiohttp
+
+from config import (BOT_TOKEN, ENRICHMENT_WORKERS, HTTP_CONNECT_TIMEOUT, HTTP_POOL_SIZE, HTTP_READ_TIMEOUT,
+                    ORIGINAL_COMMANDS, headers, main_url)
+
+from engine import Engine, register_handlers, set_engine
+
+import handlers  # noqa: F401
+
+from metrics import API_ERRORS, record_api_call, register_stats
+
+from outbound import outbound_scheduler
+
+from records import extract_payload, json_loads
+
+from resilience import ApiStatusError, PoolTimeoutError, api_resilience, parse_retry_after
+
+from set_bot_commands import commands_changed, remember_commands
+
+from singleflight import AsyncSingleFlight
+
+from telebot import asyncio_helper
+from telebot.async_telebot import AsyncTeleBot
+from telebot.asyncio_helper import ApiTelegramException
+from telebot.types import BotCommand
+
+from tracing import current_span
+
+from transport import request_key
+
+from utils import load_persisted_data
+
+
+asyncio_helper.REQUEST_LIMIT = HTTP_POOL_SIZE
+async_hotels_bot = AsyncTeleBot(BOT_TOKEN)
+
+_api_session: Optional[aiohttp.ClientSession] = None
+async_api_flights = AsyncSingleFlight()
+register_stats('hotels4_singleflight', 'Объединение одинаковых запросов к API Hotels.com', 'engine',
+               {'async': async_api_flights.stats})
+
+
+async def get_api_session() -> aiohttp.ClientSession:
+    """
+    Функция возвращает общую aiohttp-сессию для запросов к API Hotels.com (с пулом keep-alive соединений
+    размера HTTP_POOL_SIZE и таймаутами HTTP_CONNECT_TIMEOUT/HTTP_READ_TIMEOUT), создавая её при первом вызове.
+
+    :rtype: aiohttp.ClientSession
+    """
+    global _api_session
+    if _api_session is None or _api_session.closed:
+        _api_session = aiohttp.ClientSession(
+            headers=headers,
+            connector=aiohttp.TCPConnector(limit=HTTP_POOL_SIZE),
+            timeout=aiohttp.ClientTimeout(sock_connect=HTTP_CONNECT_TIMEOUT, sock_read=HTTP_READ_TIMEOUT))
+    return _api_session
+
+
+async def async_fetch_once(url_part: str, querystring: Dict[str, Any]) -> Any:
+    """
+    Асинхронный вариант transport.fetch_once: одна попытка запроса с таймаутом на чтение ответа
+    из настроек адреса; ответ декодируется из байтов и сводится к нужным боту данным (см. records.extract_payload).
+
+    :param url_part: часть url, отвечающая за конкретный запрос
+    :type url_part: str
+
+    :param querystring: параметры запроса
+    :type querystring: Dict[str, Any]
+
+    :rtype: Any
+
+    :raises resilience.ApiStatusError: если код ответа не равен 200
+    :raises ValueError: если в ответе нет нужных полей
+    :raises json.decoder.JSONDecodeError: если формат ответа от сервера некорректен
+    :raises aiohttp.ClientError, asyncio.TimeoutError: если соединение не удалось установить
+        или ответ не был получен за отведённое время
+    """
+    api_session = await get_api_session()
+    params = {key: str(value) for key, value in querystring.items()}
+    timeout = aiohttp.ClientTimeout(sock_connect=HTTP_CONNECT_TIMEOUT,
+                                    sock_read=api_resilience.policy(url_part).timeout)
+    started = time.monotonic()
+    try:
+        async with api_session.get(main_url + url_part, params=params, timeout=timeout) as response:
+            response_body = await response.read()
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        record_api_call(url_part, time.monotonic() - started, 'network')
+        raise
+    record_api_call(url_part, time.monotonic() - started, response.status, response.headers)
+    if response.status != 200:
+        raise ApiStatusError(response.status, parse_retry_after(response.headers.get('Retry-After')))
+    try:
+        return extract_payload(url_part, json_loads(response_body))
+    except ValueError:
+        API_ERRORS.inc(url_part, 'invalid_json')
+        raise
+
+
+async def async_fetch_json(url_part: str, querystring: Dict[str, Any]) -> Any:
+    """
+    Асинхронный вариант transport.fetch_json: запрос с повторами, дублирующими запросами
+    и circuit breaker (см. модуль resilience).
+
+    :param url_part: часть url, отвечающая за конкретный запрос
+    :type url_part: str
+
+    :param querystring: параметры запроса
+    :type querystring: Dict[str, Any]
+
+    :rtype: Any
+
+    :raises resilience.CircuitOpenError: если запросы к API прекращены из-за его недоступности
+    :raises ValueError: если код ответа не равен 200 или в ответе нет нужных полей
+    :raises json.decoder.JSONDecodeError: если формат ответа от сервера некорректен
+    :raises aiohttp.ClientError, asyncio.TimeoutError: если соединение не удалось установить
+        или ответ не был получен за отведённое время
+    """
+    return await api_resilience.async_call(url_part, (aiohttp.ClientError, asyncio.TimeoutError),
+                                           async_fetch_once, url_part, querystring)
+
+
+
+class AsyncTask:
+    """
+    Класс фоновой задачи асинхронного режима (asyncio.Task).
+    Задачу можно отменить и из другого потока (например, SessionStore.start закрывает прежнюю сессию
+    пользователя в потоке, см. AsyncEngine.blocking): отмена тогда передаётся в цикл событий.
+
+    :param task: задача asyncio
+    :type task: asyncio.Task
+    """
+
+    __slots__ = ('task', 'loop')
+
+    def __init__(self, task: asyncio.Task) -> None:
+        self.task = task
+        self.loop = task.get_loop()
+
+    def __await__(self) -> Any:
+        return asyncio.shield(self.task).__await__()
+
+    def cancel(self) -> None:
+        """Метод отменяет задачу."""
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self.loop:
+            self.task.cancel()
+        elif not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.task.cancel)
+
+    def cancelled(self) -> bool:
+        """
+        Метод проверяет, отменена ли задача.
+
+        :rtype: bool
+        """
+        return self.task.cancelled()
+
+
+class AsyncEngine(Engine):
+    """
+    Класс движка асинхронного режима: запросы к API Hotels.com выполняются через aiohttp (с объединением
+    одинаковых запросов в async_api_flights), сообщения отправляются через async_hotels_bot, фоновые задачи -
+    задачами asyncio (одновременно выполняется не более ENRICHMENT_WORKERS), блокирующие вызовы - в потоках
+    (asyncio.to_thread).
+    """
+
+    network_errors = (aiohttp.ClientError, asyncio.TimeoutError, PoolTimeoutError)
+    telegram_errors = (ApiTelegramException, aiohttp.ClientError, asyncio.TimeoutError)
+
+    def __init__(self) -> None:
+        self._task_slots = asyncio.Semaphore(ENRICHMENT_WORKERS)
+
+    async def fetch(self, url_part: str, querystring: Dict[str, Any]) -> Any:
+        """Метод выполняет запрос через async_fetch_json (см. Engine.fetch)."""
+        with current_span('hotels4', endpoint=url_part):
+            return await async_api_flights.do(request_key(url_part, querystring), async_fetch_json,
+                                              url_part, querystring)
+
+    async def send(self, method: str, chat_id: int, *args: Any, cost: float = 1, **kwargs: Any) -> Any:
+        """Метод отправляет сообщение через outbound_scheduler.async_call (см. Engine.send)."""
+        return await outbound_scheduler.async_call(getattr(async_hotels_bot, method), chat_id, *args, cost=cost,
+                                                   **kwargs)
+
+    async def bot_call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        """Метод вызывает метод async_hotels_bot (см. Engine.bot_call)."""
+        return await getattr(async_hotels_bot, method)(*args, **kwargs)
+
+    async def blocking(self, function: Callable, *args: Any) -> Any:
+        """Метод выполняет функцию в отдельном потоке, не останавливая цикл событий (см. Engine.blocking)."""
+        return await asyncio.to_thread(function, *args)
+
+    def spawn(self, function: Callable[..., Coroutine], *args: Any) -> AsyncTask:
+        """Метод запускает корутинную функцию задачей asyncio (см. Engine.spawn)."""
+        return AsyncTask(asyncio.ensure_future(self._bounded(function, *args)))
+
+    async def _bounded(self, function: Callable[..., Coroutine], *args: Any) -> Any:
+        """Метод выполняет корутинную функцию, когда одновременно выполняется меньше ENRICHMENT_WORKERS задач."""
+        async with self._task_slots:
+            return await function(*args)
+
+
+async def async_main() -> None:
+    """
+    Функция запуска бота в асинхронном режиме: устанавливает движок AsyncEngine и подключает обработчики
+    к async_hotels_bot, устанавливает меню команд (если оно изменилось, см. модуль set_bot_commands),
+    в фоне загружает сохранённые кэши и запускает бесконечное 'прослушивание' сообщений.
+    При остановке закрывает HTTP-сессии.
+    """
+    set_engine(AsyncEngine())
+    register_handlers(async_hotels_bot)
+    if commands_changed(BOT_TOKEN):
+        await async_hotels_bot.set_my_commands([BotCommand(*command) for command in ORIGINAL_COMMANDS])
+        remember_commands(BOT_TOKEN)
+    loading = asyncio.create_task(asyncio.to_thread(load_persisted_data))
+    try:
+        await async_hotels_bot.infinity_polling()
+    finally:
+        if _api_session is not None:
+            await _api_session.close()
+        await async_hotels_bot.close_session()
+        await loading
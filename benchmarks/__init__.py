@@ -0,0 +1,8 @@
+"""
+Пакет нагрузочных замеров бота.
+
+fake_servers - локальные заменители API Hotels.com (hotels4) и Bot API Telegram с настраиваемой задержкой.
+dialogs - синтетические обновления Telegram: полные диалоги команд /lowprice, /highprice, /bestdeal и /history.
+run - замер полных сценариев команд (запуск: python -m benchmarks.run).
+load - нагрузочный тест синтетическими пользователями (запуск: python -m benchmarks.load).
+"""
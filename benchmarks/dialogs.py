@@ -0,0 +1,116 @@
+"""
+Модуль синтетических обновлений Telegram для нагрузочных замеров.
+
+Диалог команды - список шагов (название шага, обновление), которые пользователь проходит от команды
+до вывода результатов. Шаги называются по обработчикам бота, которые их принимают.
+"""
+
+import itertools
+from typing import Any, Dict, List, Tuple
+
+COMMANDS = ('lowprice', 'highprice', 'bestdeal', 'history')
+DATES = '2022-10-15 - 2022-10-21'
+
+_update_ids = itertools.count(1)
+
+
+def user_data(user_id: int) -> Dict[str, Any]:
+    """
+    Функция составляет данные пользователя.
+
+    :param user_id: ID пользователя
+    :type user_id: int
+
+    :rtype: Dict[str, Any]
+    """
+    return {'id': user_id, 'is_bot': False, 'first_name': 'User {id}'.format(id=user_id)}
+
+
+def message_update(user_id: int, text: str) -> Dict[str, Any]:
+    """
+    Функция составляет обновление с текстовым сообщением пользователя.
+
+    :param user_id: ID пользователя
+    :type user_id: int
+
+    :param text: текст сообщения
+    :type text: str
+
+    :rtype: Dict[str, Any]
+    """
+    update_id = next(_update_ids)
+    message = {'message_id': update_id, 'from': user_data(user_id), 'chat': {'id': user_id, 'type': 'private'},
+               'date': 0, 'text': text}
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return {'update_id': update_id, 'message': message}
+
+
+def callback_update(user_id: int, data: str) -> Dict[str, Any]:
+    """
+    Функция составляет обновление с нажатием пользователем кнопки виртуальной клавиатуры.
+
+    :param user_id: ID пользователя
+    :type user_id: int
+
+    :param data: данные кнопки
+    :type data: str
+
+    :rtype: Dict[str, Any]
+    """
+    update_id = next(_update_ids)
+    return {'update_id': update_id,
+            'callback_query': {'id': str(update_id), 'from': user_data(user_id), 'chat_instance': str(user_id),
+                               'data': data,
+                               'message': {'message_id': update_id, 'chat': {'id': user_id, 'type': 'private'},
+                                           'date': 0, 'text': 'Сколько отелей показать?'}}}
+
+
+def search_dialog(command: str, user_id: int, city: str, hotels_number: int = 5,
+                  photo_number: int = 3) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Функция составляет диалог поисковой команды (lowprice, highprice или bestdeal).
+
+    :param command: команда
+    :type command: str
+
+    :param user_id: ID пользователя
+    :type user_id: int
+
+    :param city: город поиска
+    :type city: str
+
+    :param hotels_number: количество отелей (от 1 до 9)
+    :type hotels_number: int
+
+    :param photo_number: количество фото каждого отеля (0 - без фото)
+    :type photo_number: int
+
+    :rtype: List[Tuple[str, Dict[str, Any]]]
+    """
+    photo_answer = 'Да {number}'.format(number=photo_number) if photo_number else 'Нет'
+    steps = [(command, message_update(user_id, '/' + command)),
+             ('city_definition', message_update(user_id, city)),
+             ('set_hotels_number', callback_update(user_id, str(hotels_number))),
+             ('set_dates', message_update(user_id, DATES)),
+             ('set_photo_need_and_search', message_update(user_id, photo_answer))]
+    if command == 'bestdeal':
+        steps.extend((('distance_definition', message_update(user_id, '5')),
+                      ('price_definition', message_update(user_id, '1000'))))
+    return steps
+
+
+def history_dialog(user_id: int, request_id: int) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Функция составляет диалог команды history: список запросов и первая страница одного из них.
+
+    :param user_id: ID пользователя
+    :type user_id: int
+
+    :param request_id: ID сохранённого поискового запроса пользователя
+    :type request_id: int
+
+    :rtype: List[Tuple[str, Dict[str, Any]]]
+    """
+    return [('history', message_update(user_id, '/history')),
+            ('history_page', callback_update(user_id, 'history:{id}:0'.format(id=request_id)))]
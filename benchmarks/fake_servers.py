@@ -0,0 +1,334 @@
+"""
+Модуль локальных заменителей внешних сервисов бота для нагрузочных замеров.
+
+FakeHotelsServer - HTTP-сервер, отвечающий на запросы /locations/v2/search/, /properties/list/,
+    /properties/get-details/ и /properties/get-hotel-photos/ ответами в формате API Hotels.com (hotels4).
+    Ответы либо генерируются детерминированно по параметрам запроса, либо берутся из записанных файлов
+    (locations.json, list.json, details.json, photos.json в каталоге payloads_dir).
+FakeTelegramServer - HTTP-сервер, отвечающий на вызовы методов Bot API (/bot<token>/<method>).
+
+Оба сервера выдерживают перед ответом заданную задержку (latency, плюс случайная добавка до jitter)
+и считают запросы: hotels4 - по адресам, Telegram - по методам. FakeHotelsServer может отвечать
+на долю запросов (error_rate) ошибкой 503, чтобы проверить повторы запросов и circuit breaker.
+"""
+
+import json
+import random
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+ENDPOINTS = {
+    '/locations/v2/search/': 'locations',
+    '/properties/list/': 'list',
+    '/properties/get-details/': 'details',
+    '/properties/get-hotel-photos/': 'photos',
+}
+PAGE_SIZE = 25
+PAGES_NUMBER = 5
+PHOTOS_NUMBER = 8
+
+
+def destination_id(query: str) -> str:
+    """
+    Функция детерминированно вычисляет destinationId города по тексту запроса.
+
+    :param query: название города
+    :type query: str
+
+    :rtype: str
+    """
+    return str(100000 + zlib.crc32(query.strip().lower().encode()) % 900000)
+
+
+def locations_payload(params: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Функция составляет ответ /locations/v2/search/.
+
+    :param params: параметры запроса
+    :type params: Dict[str, str]
+
+    :rtype: Dict[str, Any]
+    """
+    return {'term': params.get('query', ''),
+            'suggestions': [{'group': 'CITY_GROUP',
+                             'entities': [{'destinationId': destination_id(params.get('query', '')),
+                                           'type': 'CITY', 'name': params.get('query', '')}]}]}
+
+
+def list_payload(params: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Функция составляет ответ /properties/list/: страницу из PAGE_SIZE отелей города
+    (всего PAGES_NUMBER страниц), упорядоченную по цене согласно sortOrder.
+
+    :param params: параметры запроса
+    :type params: Dict[str, str]
+
+    :rtype: Dict[str, Any]
+    """
+    city_id = int(params.get('destinationId', '0'))
+    page_number = int(params.get('pageNumber', '1'))
+    prices = random.Random(city_id).sample(range(20, 20 + 10 * PAGE_SIZE * PAGES_NUMBER, 10),
+                                           PAGE_SIZE * PAGES_NUMBER)
+    prices.sort(reverse=params.get('sortOrder') == 'PRICE_HIGHEST_FIRST')
+    start = (page_number - 1) * PAGE_SIZE
+    results = [{'id': city_id * 1000 + start + index,
+                'name': 'Hotel {number}'.format(number=start + index + 1),
+                'starRating': 1 + (start + index) % 5,
+                'ratePlan': {'price': {'current': '${price}'.format(price=price), 'exactCurrent': float(price)}},
+                'landmarks': [{'label': 'City center',
+                               'distance': '{km:.1f} км'.format(km=0.3 + (price * 7 % 50) / 10).replace('.', ',')}]}
+               for index, price in enumerate(prices[start:start + PAGE_SIZE])]
+    return {'result': 'OK',
+            'data': {'body': {'header': 'City {id}'.format(id=city_id),
+                              'searchResults': {
+                                  'totalCount': PAGE_SIZE * PAGES_NUMBER,
+                                  'results': results,
+                                  'pagination': {'currentPage': page_number,
+                                                 'nextPageNumber': (page_number + 1
+                                                                    if page_number < PAGES_NUMBER else None)}}}}}
+
+
+def details_payload(params: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Функция составляет ответ /properties/get-details/.
+
+    :param params: параметры запроса
+    :type params: Dict[str, str]
+
+    :rtype: Dict[str, Any]
+    """
+    hotel_id = params.get('id', '0')
+    address = '{number} Main street, City {city}'.format(number=int(hotel_id) % 1000, city=int(hotel_id) // 1000)
+    return {'result': 'OK', 'data': {'body': {'propertyDescription': {'name': 'Hotel',
+                                                                      'address': {'fullAddress': address}}}}}
+
+
+def photos_payload(params: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Функция составляет ответ /properties/get-hotel-photos/.
+
+    :param params: параметры запроса
+    :type params: Dict[str, str]
+
+    :rtype: Dict[str, Any]
+    """
+    hotel_id = params.get('id', '0')
+    base_url = 'https://images.example.com/{id}/{kind}{number}_{{size}}.jpg'
+    return {'hotelId': hotel_id,
+            'hotelImages': [{'baseUrl': base_url.format(id=hotel_id, kind='h', number=number)}
+                            for number in range(PHOTOS_NUMBER)],
+            'roomImages': [{'images': [{'baseUrl': base_url.format(id=hotel_id, kind='r', number=number)}]}
+                           for number in range(PHOTOS_NUMBER)]}
+
+
+GENERATORS = {'locations': locations_payload, 'list': list_payload,
+              'details': details_payload, 'photos': photos_payload}
+
+
+class _FakeServer:
+    """Базовый класс локального HTTP-сервера в отдельном потоке: задержка ответа и счётчик запросов."""
+
+    handler_class: type = BaseHTTPRequestHandler
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, host: str = '127.0.0.1', port: int = 0) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.calls: Counter = Counter()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self.handler_class)
+        self._server.daemon_threads = True
+        self._server.fake = self  # type: ignore[attr-defined]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        """Адрес сервера (http://host:port)."""
+        host, port = self._server.server_address[:2]
+        return 'http://{host}:{port}'.format(host=host, port=port)
+
+    def start(self) -> '_FakeServer':
+        """Метод запускает сервер в отдельном потоке."""
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Метод останавливает сервер."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def count(self, name: str) -> None:
+        """
+        Метод учитывает запрос и выдерживает задержку ответа.
+
+        :param name: название адреса или метода
+        :type name: str
+        """
+        with self._lock:
+            self.calls[name] += 1
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def reset(self) -> Dict[str, int]:
+        """
+        Метод обнуляет счётчик запросов.
+
+        :return: количество запросов с прошлого обнуления
+        :rtype: Dict[str, int]
+        """
+        with self._lock:
+            calls, self.calls = dict(self.calls), Counter()
+        return calls
+
+
+class _JsonHandler(BaseHTTPRequestHandler):
+    """Базовый обработчик запросов: ответ в формате JSON, без записи в журнал."""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def send_json(self, status: int, payload: Any) -> None:
+        """
+        Метод отправляет ответ в формате JSON.
+
+        :param status: код ответа
+        :type status: int
+
+        :param payload: тело ответа
+        :type payload: Any
+        """
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        """Метод отключает запись запросов в журнал."""
+
+
+class _HotelsHandler(_JsonHandler):
+    """Обработчик запросов к заменителю API Hotels.com."""
+
+    def do_GET(self) -> None:  # noqa: N802
+        """Метод отвечает на запрос одного из адресов ENDPOINTS."""
+        fake: FakeHotelsServer = self.server.fake  # type: ignore[attr-defined]
+        url = urlsplit(self.path)
+        endpoint = ENDPOINTS.get(url.path)
+        if endpoint is None:
+            self.send_json(404, {'message': 'Endpoint not found'})
+            return
+        fake.count(url.path)
+        if fake.error_rate and random.random() < fake.error_rate:
+            self.send_json(503, {'message': 'Service Unavailable'})
+            return
+        self.send_json(200, fake.payload(endpoint, dict(parse_qsl(url.query))))
+
+
+class _TelegramHandler(_JsonHandler):
+    """Обработчик запросов к заменителю Bot API Telegram."""
+
+    def do_POST(self) -> None:  # noqa: N802
+        """Метод отвечает на вызов метода Bot API."""
+        fake: FakeTelegramServer = self.server.fake  # type: ignore[attr-defined]
+        url = urlsplit(self.path)
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        method = url.path.rsplit('/', 1)[-1]
+        fake.count(method)
+        self.send_json(200, {'ok': True, 'result': fake.result(method, dict(parse_qsl(url.query)))})
+
+    do_GET = do_POST
+
+
+class FakeHotelsServer(_FakeServer):
+    """
+    Класс заменителя API Hotels.com.
+
+    :param payloads_dir: каталог с записанными ответами (locations.json, list.json, details.json, photos.json);
+        записанный ответ отдаётся на любой запрос своего адреса, для остальных адресов ответ генерируется
+    :param error_rate: доля запросов (от 0 до 1), на которые сервер отвечает ошибкой 503
+    """
+
+    handler_class = _HotelsHandler
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, payloads_dir: Optional[str] = None,
+                 host: str = '127.0.0.1', port: int = 0, error_rate: float = 0.0) -> None:
+        super().__init__(latency, jitter, host, port)
+        self.error_rate = error_rate
+        self.recorded: Dict[str, Any] = dict()
+        if payloads_dir:
+            for endpoint in GENERATORS:
+                try:
+                    with open('{dir}/{name}.json'.format(dir=payloads_dir, name=endpoint), encoding='utf-8') as file:
+                        self.recorded[endpoint] = json.load(file)
+                except FileNotFoundError:
+                    pass
+
+    def payload(self, endpoint: str, params: Dict[str, str]) -> Any:
+        """
+        Метод возвращает ответ на запрос: записанный, если он есть, иначе сгенерированный.
+
+        :param endpoint: название адреса (см. ENDPOINTS)
+        :type endpoint: str
+
+        :param params: параметры запроса
+        :type params: Dict[str, str]
+        """
+        if endpoint in self.recorded:
+            return self.recorded[endpoint]
+        return GENERATORS[endpoint](params)
+
+
+class FakeTelegramServer(_FakeServer):
+    """Класс заменителя Bot API Telegram: любой вызов метода завершается успешно."""
+
+    handler_class = _TelegramHandler
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, host: str = '127.0.0.1', port: int = 0) -> None:
+        super().__init__(latency, jitter, host, port)
+        self._message_id = 0
+
+    @property
+    def api_url(self) -> str:
+        """Шаблон адреса Bot API для telebot.apihelper.API_URL."""
+        return self.url + '/bot{0}/{1}'
+
+    def result(self, method: str, params: Dict[str, str]) -> Any:
+        """
+        Метод возвращает результат вызова метода Bot API.
+
+        :param method: название метода
+        :type method: str
+
+        :param params: параметры вызова
+        :type params: Dict[str, str]
+        """
+        if method == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'HotelsEasyBot', 'username': 'hotels_easy_bot'}
+        if method == 'sendMediaGroup':
+            return [self.message(params) for _ in json.loads(params.get('media', '[]'))]
+        if method.startswith('send'):
+            return self.message(params)
+        return True
+
+    def message(self, params: Dict[str, str]) -> Dict[str, Any]:
+        """
+        Метод составляет отправленное сообщение.
+
+        :param params: параметры вызова
+        :type params: Dict[str, str]
+
+        :rtype: Dict[str, Any]
+        """
+        with self._lock:
+            self._message_id += 1
+            message_id = self._message_id
+        chat_id = int(params.get('chat_id', 0))
+        return {'message_id': message_id, 'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'}, 'text': params.get('text', '')}
@@ -0,0 +1,424 @@
+"""
+Модуль нагрузочного теста: синтетические пользователи одновременно проходят полные поисковые диалоги.
+
+Пользователи появляются случайным образом (пуассоновский поток) с заданной интенсивностью (пользователей
+в секунду) и проходят диалог команды (см. dialogs.search_dialog): команда, город, кнопка количества
+отелей, даты, ответ о фото, а для bestdeal - расстояние и цена. Между шагами пользователь "думает"
+(случайная пауза около --think секунд). Бот работает на локальных заменителях API (см. модуль fake_servers).
+
+Обновления доставляются боту одним из способов:
+- inprocess - напрямую в очереди потоков-обработчиков (webhook.UpdateDispatcher), без HTTP;
+- webhook - POST-запросами на локальный HTTP-сервер вебхука (webhook.create_server).
+Задержка шага - время от отправки обновления до окончания его обработки обработчиками hotels_bot
+(включая ожидание в очереди и повторную доставку после отказа при переполнении очереди).
+
+Интенсивности из --rates проверяются по очереди, каждая в течение --duration секунд. Для каждой выводятся
+пропускная способность (обработанных шагов и завершённых диалогов в секунду) и перцентили p50/p95/p99
+задержки каждого шага. Точка насыщения - первая интенсивность, при которой завершённые диалоги отстают
+от поступающих более чем на 10% или p95 задержки какого-либо шага превышает её значение при первой
+интенсивности в --slo-factor раз.
+
+Запуск: python -m benchmarks.load [--mode inprocess|webhook] [--rates 1,2,5,10] [--duration S] [--json FILE]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.dialogs import search_dialog
+from benchmarks.fake_servers import FakeHotelsServer, FakeTelegramServer
+from benchmarks.run import connect_bot, percentile, prepare_environment
+
+SEARCH_COMMANDS = ('lowprice', 'highprice', 'bestdeal')
+STEP_ORDER = SEARCH_COMMANDS + ('city_definition', 'set_hotels_number', 'set_dates', 'set_photo_need_and_search',
+                                'distance_definition', 'price_definition')
+RETRY_DELAY = 1.0
+THROUGHPUT_SHARE = 0.9
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Функция разбирает аргументы командной строки.
+
+    :rtype: argparse.Namespace
+    """
+    parser = argparse.ArgumentParser(description='Нагрузочный тест бота синтетическими пользователями.')
+    parser.add_argument('--mode', choices=('inprocess', 'webhook'), default='inprocess',
+                        help='способ доставки обновлений боту')
+    parser.add_argument('--rates', default='1,2,5,10', help='интенсивности появления пользователей (в секунду)')
+    parser.add_argument('--duration', type=float, default=20, help='время появления пользователей на одной '
+                                                                   'интенсивности, с')
+    parser.add_argument('--think', type=float, default=1.0, help='средняя пауза пользователя между шагами, с')
+    parser.add_argument('--mix', default='lowprice=1,highprice=1,bestdeal=1', help='доли команд')
+    parser.add_argument('--cities', type=int, default=20, help='количество разных городов поиска')
+    parser.add_argument('--hotels', type=int, default=5, help='количество отелей в поиске (от 1 до 9)')
+    parser.add_argument('--photos', type=int, default=3, help='количество фото каждого отеля (0 - без фото)')
+    parser.add_argument('--workers', type=int, default=8, help='количество потоков-обработчиков обновлений')
+    parser.add_argument('--queue-size', type=int, default=100, help='размер очереди одного потока-обработчика')
+    parser.add_argument('--api-latency', type=float, default=0.05, help='задержка ответа API Hotels.com, с')
+    parser.add_argument('--api-error-rate', type=float, default=0.0,
+                        help='доля запросов к API Hotels.com, на которые отвечается ошибка 503')
+    parser.add_argument('--tg-latency', type=float, default=0.01, help='задержка ответа Bot API, с')
+    parser.add_argument('--jitter', type=float, default=0.02, help='случайная добавка к задержкам (до), с')
+    parser.add_argument('--payloads', help='каталог с записанными ответами API Hotels.com')
+    parser.add_argument('--step-timeout', type=float, default=120, help='предельное время обработки шага, с')
+    parser.add_argument('--slo-factor', type=float, default=3.0,
+                        help='рост p95 задержки шага относительно первой интенсивности, означающий насыщение')
+    parser.add_argument('--real-rate-limits', action='store_true',
+                        help='не снимать ограничения частоты отправки сообщений (TG_*)')
+    parser.add_argument('--seed', type=int, help='начальное значение генератора случайных чисел')
+    parser.add_argument('--json', dest='json_file', help='файл, в который записывается отчёт в формате JSON')
+    return parser.parse_args(argv)
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """
+    Функция разбирает доли команд вида 'lowprice=1,bestdeal=2'.
+
+    :param mix: доли команд
+    :type mix: str
+
+    :rtype: Dict[str, float]
+
+    :raises ValueError: если команда неизвестна или доля некорректна
+    """
+    weights = dict()
+    for item in mix.split(','):
+        command, _, weight = item.strip().partition('=')
+        command = command.lstrip('/')
+        if command not in SEARCH_COMMANDS:
+            raise ValueError(command)
+        weights[command] = float(weight or 1)
+    if not weights or sum(weights.values()) <= 0:
+        raise ValueError(mix)
+    return weights
+
+
+class CompletionTracker:
+    """
+    Класс отслеживания окончания обработки обновлений: оборачивает hotels_bot.process_new_updates
+    и отмечает каждое обработанное обновление.
+
+    :param bot: объект TeleBot
+    :type bot: telebot.TeleBot
+    """
+
+    def __init__(self, bot: Any) -> None:
+        self._events: Dict[int, threading.Event] = dict()
+        self._lock = threading.Lock()
+        process_new_updates = bot.process_new_updates
+
+        def process_and_mark(updates: List[Any]) -> None:
+            try:
+                process_new_updates(updates)
+            finally:
+                for update in updates:
+                    self._event(update.update_id).set()
+
+        bot.process_new_updates = process_and_mark
+
+    def _event(self, update_id: int) -> threading.Event:
+        """
+        Метод возвращает событие окончания обработки обновления.
+
+        :param update_id: ID обновления
+        :type update_id: int
+
+        :rtype: threading.Event
+        """
+        with self._lock:
+            return self._events.setdefault(update_id, threading.Event())
+
+    def wait(self, update_id: int, timeout: float) -> bool:
+        """
+        Метод ждёт окончания обработки обновления.
+
+        :param update_id: ID обновления
+        :type update_id: int
+
+        :param timeout: предельное время ожидания, с
+        :type timeout: float
+
+        :return: True, если обновление обработано
+        :rtype: bool
+        """
+        done = self._event(update_id).wait(timeout)
+        with self._lock:
+            self._events.pop(update_id, None)
+        return done
+
+
+class StageResult:
+    """Класс результатов одной интенсивности: задержки шагов и счётчики диалогов."""
+
+    def __init__(self, rate: float) -> None:
+        self.rate = rate
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.started = 0
+        self.completed = 0
+        self.timed_out = 0
+        self.rejected = 0
+        self.wall = 0.0
+        self._lock = threading.Lock()
+
+    def step(self, name: str, latency: float, rejected: int) -> None:
+        """
+        Метод учитывает обработанный шаг диалога.
+
+        :param name: название шага
+        :type name: str
+
+        :param latency: задержка шага, с
+        :type latency: float
+
+        :param rejected: количество отказов в приёме обновления (очередь переполнена)
+        :type rejected: int
+        """
+        with self._lock:
+            self.latencies[name].append(latency)
+            self.rejected += rejected
+
+    def finish(self, completed: bool) -> None:
+        """
+        Метод учитывает окончание диалога.
+
+        :param completed: диалог пройден полностью (иначе - шаг не был обработан за --step-timeout)
+        :type completed: bool
+        """
+        with self._lock:
+            if completed:
+                self.completed += 1
+            else:
+                self.timed_out += 1
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Метод составляет отчёт по интенсивности.
+
+        :rtype: Dict[str, Any]
+        """
+        steps = {name: {'count': len(values), 'p50': percentile(values, 0.5), 'p95': percentile(values, 0.95),
+                        'p99': percentile(values, 0.99)}
+                 for name, values in sorted(self.latencies.items(), key=lambda item: STEP_ORDER.index(item[0]))}
+        wall = self.wall or 1.0
+        return {'rate': self.rate, 'users': self.started, 'completed': self.completed, 'timed_out': self.timed_out,
+                'rejected': self.rejected, 'wall': wall,
+                'steps_per_second': sum(len(values) for values in self.latencies.values()) / wall,
+                'dialogs_per_second': self.completed / wall, 'steps': steps}
+
+
+def user_flow(deliver: Callable[[Dict[str, Any]], bool],
+              tracker: CompletionTracker,
+              dialog: List[Any],
+              args: argparse.Namespace,
+              result: StageResult) -> None:
+    """
+    Функция проходит диалог одного синтетического пользователя.
+
+    :param deliver: функция доставки обновления боту (False - обновление не принято, его нужно повторить)
+    :type deliver: Callable
+
+    :param tracker: отслеживание окончания обработки обновлений
+    :type tracker: CompletionTracker
+
+    :param dialog: шаги диалога (см. dialogs.search_dialog)
+    :type dialog: List[Tuple[str, Dict[str, Any]]]
+
+    :param args: аргументы командной строки
+    :type args: argparse.Namespace
+
+    :param result: результаты интенсивности
+    :type result: StageResult
+    """
+    for number, (name, update) in enumerate(dialog):
+        if number:
+            time.sleep(random.uniform(0.5, 1.5) * args.think)
+        rejected = 0
+        started = time.perf_counter()
+        while not deliver(update):
+            rejected += 1
+            time.sleep(RETRY_DELAY)
+        if not tracker.wait(update['update_id'], args.step_timeout):
+            result.finish(False)
+            return
+        result.step(name, time.perf_counter() - started, rejected)
+    result.finish(True)
+
+
+def run_stage(rate: float,
+              deliver: Callable[[Dict[str, Any]], bool],
+              tracker: CompletionTracker,
+              args: argparse.Namespace,
+              first_user_id: int) -> StageResult:
+    """
+    Функция проводит нагрузку с одной интенсивностью и дожидается окончания всех диалогов.
+
+    :param rate: интенсивность появления пользователей (в секунду)
+    :type rate: float
+
+    :param deliver: функция доставки обновления боту
+    :type deliver: Callable
+
+    :param tracker: отслеживание окончания обработки обновлений
+    :type tracker: CompletionTracker
+
+    :param args: аргументы командной строки
+    :type args: argparse.Namespace
+
+    :param first_user_id: ID первого пользователя интенсивности
+    :type first_user_id: int
+
+    :rtype: StageResult
+    """
+    result = StageResult(rate)
+    weights = parse_mix(args.mix)
+    threads = []
+    started = time.perf_counter()
+    arrival = 0.0
+    while True:
+        arrival += random.expovariate(rate)
+        if arrival > args.duration:
+            break
+        delay = started + arrival - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        command = random.choices(list(weights), list(weights.values()))[0]
+        city = 'City {number}'.format(number=random.randrange(args.cities))
+        dialog = search_dialog(command, first_user_id + result.started, city, args.hotels, args.photos)
+        thread = threading.Thread(target=user_flow, args=(deliver, tracker, dialog, args, result), daemon=True)
+        thread.start()
+        threads.append(thread)
+        result.started += 1
+    for thread in threads:
+        thread.join()
+    result.wall = time.perf_counter() - started
+    return result
+
+
+def saturation_rate(reports: List[Dict[str, Any]], slo_factor: float) -> Optional[float]:
+    """
+    Функция определяет точку насыщения: первую интенсивность, при которой завершённые диалоги отстают
+    от поступающих более чем на 10% или p95 задержки какого-либо шага вырос более чем в slo_factor раз
+    относительно первой интенсивности.
+
+    :param reports: отчёты по интенсивностям (см. StageResult.report)
+    :type reports: List[Dict[str, Any]]
+
+    :param slo_factor: допустимый рост p95 задержки шага
+    :type slo_factor: float
+
+    :return: интенсивность или None, если насыщение не достигнуто
+    :rtype: float | None
+    """
+    if not reports:
+        return None
+    baseline = {name: step['p95'] for name, step in reports[0]['steps'].items()}
+    for report in reports:
+        offered = report['users'] / report['wall']
+        if report['timed_out'] or report['dialogs_per_second'] < THROUGHPUT_SHARE * offered:
+            return report['rate']
+        if any(step['p95'] > slo_factor * baseline.get(name, step['p95'])
+               for name, step in report['steps'].items()):
+            return report['rate']
+    return None
+
+
+def format_stage(report: Dict[str, Any]) -> str:
+    """
+    Функция форматирует отчёт по интенсивности для вывода в консоль.
+
+    :param report: отчёт по интенсивности (см. StageResult.report)
+    :type report: Dict[str, Any]
+
+    :rtype: str
+    """
+    lines = ['rate {rate:g} users/s: {users} users, {completed} completed, {timed_out} timed out, '
+             '{rejected} rejected deliveries, {steps:.1f} steps/s, {dialogs:.2f} dialogs/s'.format(
+                 rate=report['rate'], users=report['users'], completed=report['completed'],
+                 timed_out=report['timed_out'], rejected=report['rejected'],
+                 steps=report['steps_per_second'], dialogs=report['dialogs_per_second'])]
+    for name, step in report['steps'].items():
+        lines.append('    {name:<26} n={count:<5} p50 {p50:.3f} s  p95 {p95:.3f} s  p99 {p99:.3f} s'.format(
+            name=name, **step))
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Функция проводит нагрузочный тест и выводит отчёт.
+
+    :return: код завершения
+    :rtype: int
+    """
+    args = parse_args(argv)
+    try:
+        rates = [float(rate) for rate in args.rates.split(',') if rate.strip()]
+        parse_mix(args.mix)
+    except ValueError as error:
+        print('Некорректный аргумент: {}'.format(error), file=sys.stderr)
+        return 2
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    hotels_server = FakeHotelsServer(args.api_latency, args.jitter, args.payloads,
+                                     error_rate=args.api_error_rate).start()
+    telegram_server = FakeTelegramServer(args.tg_latency, args.jitter).start()
+    with tempfile.TemporaryDirectory() as workdir:
+        prepare_environment(args, workdir)
+        os.environ.update(WEBHOOK_WORKERS=str(args.workers), WEBHOOK_QUEUE_SIZE=str(args.queue_size))
+        hotels_bot = connect_bot(hotels_server, telegram_server)
+        tracker = CompletionTracker(hotels_bot)
+
+        import webhook
+        from config import WEBHOOK_PATH, WEBHOOK_SECRET
+        if args.mode == 'webhook':
+            from transport import create_session
+
+            server = webhook.create_server(port=0)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            url = 'http://{}:{}{}'.format(*server.server_address[:2], WEBHOOK_PATH)
+            session = create_session(args.workers * 4,
+                                     {'X-Telegram-Bot-Api-Secret-Token': WEBHOOK_SECRET} if WEBHOOK_SECRET else None)
+
+            def deliver(update: Dict[str, Any]) -> bool:
+                return session.post(url, json=update, timeout=30).status_code != 503
+        else:
+            server = None
+            hotels_bot.threaded = False
+            dispatcher = webhook.UpdateDispatcher(args.workers, args.queue_size)
+            dispatcher.start()
+            deliver = dispatcher.submit
+
+        reports = []
+        for number, rate in enumerate(rates):
+            result = run_stage(rate, deliver, tracker, args, 1000000 * (number + 1))
+            reports.append(result.report())
+            print(format_stage(reports[-1]), flush=True)
+
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    hotels_server.stop()
+    telegram_server.stop()
+    saturation = saturation_rate(reports, args.slo_factor)
+    if saturation is None:
+        print('saturation point: not reached')
+    else:
+        print('saturation point: {rate:g} users/s'.format(rate=saturation))
+    if args.json_file:
+        with open(args.json_file, 'w', encoding='utf-8') as file:
+            json.dump({'settings': vars(args), 'reports': reports, 'saturation_rate': saturation},
+                      file, ensure_ascii=False, indent=4)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
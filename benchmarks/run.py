@@ -0,0 +1,234 @@
+"""
+Модуль замера полных сценариев команд бота.
+
+Бот работает в обычном синхронном режиме, но вместо API Hotels.com и Telegram обращается к локальным
+заменителям (см. модуль fake_servers). Каждая команда (/lowprice, /highprice, /bestdeal, /history)
+проходится полным диалогом repeat раз; для каждой команды выводятся время выполнения сценария,
+количество запросов к API Hotels.com (по адресам) и вызовов Bot API (по методам) на один сценарий.
+
+История поиска и кэш городов на время замера переносятся во временный каталог, ограничения частоты
+отправки сообщений снимаются (если не указан флаг --real-rate-limits).
+
+Запуск: python -m benchmarks.run [--repeat N] [--api-latency S] [--tg-latency S] [--json FILE]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from benchmarks.dialogs import COMMANDS, history_dialog, search_dialog
+from benchmarks.fake_servers import FakeHotelsServer, FakeTelegramServer
+
+BENCHMARK_ENVIRONMENT = {'BOT_TOKEN': '123456:benchmark', 'BOT_MODE': 'polling', 'METRICS_PORT': '0'}
+UNLIMITED_RATES = {'TG_GLOBAL_RATE': '1000000', 'TG_CHAT_RATE': '1000000', 'TG_CHAT_BURST': '1000000'}
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Функция разбирает аргументы командной строки.
+
+    :rtype: argparse.Namespace
+    """
+    parser = argparse.ArgumentParser(description='Замер полных сценариев команд бота на локальных заменителях API.')
+    parser.add_argument('--commands', default=','.join(COMMANDS),
+                        help='команды через запятую (по умолчанию - все)')
+    parser.add_argument('--repeat', type=int, default=3, help='количество прохождений сценария каждой команды')
+    parser.add_argument('--hotels', type=int, default=5, help='количество отелей в поиске (от 1 до 9)')
+    parser.add_argument('--photos', type=int, default=3, help='количество фото каждого отеля (0 - без фото)')
+    parser.add_argument('--api-latency', type=float, default=0.05, help='задержка ответа API Hotels.com, с')
+    parser.add_argument('--api-error-rate', type=float, default=0.0,
+                        help='доля запросов к API Hotels.com, на которые отвечается ошибка 503')
+    parser.add_argument('--tg-latency', type=float, default=0.01, help='задержка ответа Bot API, с')
+    parser.add_argument('--jitter', type=float, default=0.0, help='случайная добавка к задержкам (до), с')
+    parser.add_argument('--payloads', help='каталог с записанными ответами API Hotels.com')
+    parser.add_argument('--warm', action='store_true',
+                        help='искать в одном городе (кэши прогреты после первого прохождения)')
+    parser.add_argument('--real-rate-limits', action='store_true',
+                        help='не снимать ограничения частоты отправки сообщений (TG_*)')
+    parser.add_argument('--json', dest='json_file', help='файл, в который записывается отчёт в формате JSON')
+    return parser.parse_args(argv)
+
+
+def prepare_environment(args: argparse.Namespace, workdir: str) -> None:
+    """
+    Функция задаёт переменные окружения бота до импорта модуля config.
+
+    :param args: аргументы командной строки
+    :type args: argparse.Namespace
+
+    :param workdir: временный каталог для файлов истории и кэша
+    :type workdir: str
+    """
+    os.environ.update(BENCHMARK_ENVIRONMENT)
+    os.environ['HISTORY_DB_FILE'] = os.path.join(workdir, 'search_requests.db')
+    os.environ['LOCATION_CACHE_FILE'] = os.path.join(workdir, 'location_cache.json')
+    if not args.real_rate_limits:
+        os.environ.update(UNLIMITED_RATES)
+
+
+def connect_bot(hotels_server: FakeHotelsServer, telegram_server: FakeTelegramServer) -> Any:
+    """
+    Функция импортирует модули бота (после prepare_environment) и направляет его запросы к заменителям
+    API Hotels.com и Bot API.
+
+    :param hotels_server: заменитель API Hotels.com
+    :type hotels_server: FakeHotelsServer
+
+    :param telegram_server: заменитель Bot API
+    :type telegram_server: FakeTelegramServer
+
+    :return: hotels_bot - объект TeleBot с зарегистрированными обработчиками команд
+    :rtype: telebot.TeleBot
+    """
+    import handlers  # noqa: F401, объявляет обработчики команд
+    import transport
+    from config import get_hotels_bot
+    from engine import register_handlers, synchronous
+    from telebot import apihelper
+
+    transport.main_url = hotels_server.url
+    apihelper.API_URL = telegram_server.api_url
+    hotels_bot = get_hotels_bot()
+    register_handlers(hotels_bot, synchronous)
+    return hotels_bot
+
+
+def percentile(values: List[float], share: float) -> float:
+    """
+    Функция вычисляет перцентиль (метод ближайшего ранга).
+
+    :param values: значения
+    :type values: List[float]
+
+    :param share: доля (от 0 до 1)
+    :type share: float
+
+    :rtype: float
+    """
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(share * len(ordered)) - 1))]
+
+
+def flow_report(command: str, wall_times: List[float], upstream: Counter, telegram: Counter) -> Dict[str, Any]:
+    """
+    Функция составляет отчёт по сценарию одной команды.
+
+    :param command: команда
+    :type command: str
+
+    :param wall_times: время прохождения сценария, с
+    :type wall_times: List[float]
+
+    :param upstream: суммарное количество запросов к API Hotels.com по адресам
+    :type upstream: Counter
+
+    :param telegram: суммарное количество вызовов Bot API по методам
+    :type telegram: Counter
+
+    :rtype: Dict[str, Any]
+    """
+    runs = len(wall_times)
+    return {'command': command, 'runs': runs,
+            'wall_mean': statistics.mean(wall_times), 'wall_p50': percentile(wall_times, 0.5),
+            'wall_max': max(wall_times),
+            'upstream_per_run': {name: count / runs for name, count in sorted(upstream.items())},
+            'telegram_per_run': {name: count / runs for name, count in sorted(telegram.items())}}
+
+
+def format_report(reports: List[Dict[str, Any]]) -> str:
+    """
+    Функция форматирует отчёт для вывода в консоль.
+
+    :param reports: отчёты по командам (см. flow_report)
+    :type reports: List[Dict[str, Any]]
+
+    :rtype: str
+    """
+    lines = []
+    for report in reports:
+        lines.append('/{command}: {runs} runs, wall mean {mean:.3f} s, p50 {p50:.3f} s, max {max:.3f} s'.format(
+            command=report['command'], runs=report['runs'], mean=report['wall_mean'],
+            p50=report['wall_p50'], max=report['wall_max']))
+        for title, key in (('hotels4 calls per run', 'upstream_per_run'),
+                           ('telegram calls per run', 'telegram_per_run')):
+            calls = report[key]
+            details = ', '.join('{name} {count:g}'.format(name=name, count=count) for name, count in calls.items())
+            lines.append('    {title}: {total:g} ({details})'.format(title=title, total=sum(calls.values()),
+                                                                     details=details or '-'))
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Функция проводит замер и выводит отчёт.
+
+    :return: код завершения
+    :rtype: int
+    """
+    args = parse_args(argv)
+    commands = [command.strip().lstrip('/') for command in args.commands.split(',') if command.strip()]
+    unknown = set(commands) - set(COMMANDS)
+    if unknown:
+        print('Неизвестные команды: {}'.format(', '.join(sorted(unknown))), file=sys.stderr)
+        return 2
+
+    hotels_server = FakeHotelsServer(args.api_latency, args.jitter, args.payloads,
+                                     error_rate=args.api_error_rate).start()
+    telegram_server = FakeTelegramServer(args.tg_latency, args.jitter).start()
+    with tempfile.TemporaryDirectory() as workdir:
+        prepare_environment(args, workdir)
+
+        hotels_bot = connect_bot(hotels_server, telegram_server)
+        hotels_bot.threaded = False
+        import storage
+        from telebot import types
+
+        reports = []
+        searched_users: List[int] = []
+        for command in commands:
+            wall_times: List[float] = []
+            upstream: Counter = Counter()
+            telegram: Counter = Counter()
+            for run in range(args.repeat):
+                if command == 'history':
+                    if not searched_users:
+                        break
+                    user_id = searched_users[run % len(searched_users)]
+                    request_id = storage.get_search_request_summaries(str(user_id))[-1][0]
+                    dialog = history_dialog(user_id, request_id)
+                else:
+                    user_id = 1000 * (COMMANDS.index(command) + 1) + run
+                    city = 'Benchmark city' if args.warm else 'City {command} {run}'.format(command=command, run=run)
+                    dialog = search_dialog(command, user_id, city, args.hotels, args.photos)
+                    searched_users.append(user_id)
+
+                hotels_server.reset()
+                telegram_server.reset()
+                start = time.perf_counter()
+                for _, update in dialog:
+                    hotels_bot.process_new_updates([types.Update.de_json(update)])
+                wall_times.append(time.perf_counter() - start)
+                upstream.update(hotels_server.reset())
+                telegram.update(telegram_server.reset())
+            if wall_times:
+                reports.append(flow_report(command, wall_times, upstream, telegram))
+
+        storage.get_connection().close()
+
+    hotels_server.stop()
+    telegram_server.stop()
+    print(format_report(reports))
+    if args.json_file:
+        with open(args.json_file, 'w', encoding='utf-8') as file:
+            json.dump({'settings': vars(args), 'reports': reports}, file, ensure_ascii=False, indent=4)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+"""
+Модуль с кэшем, который используется для хранения ответов API Hotels.com между поисковыми запросами.
+
+TTLCache - потокобезопасный кэш с вытеснением давно не использованных записей (LRU),
+ограничением времени жизни записей (TTL), счётчиками попаданий/промахов и необязательным
+сохранением на диск, благодаря которому данные переживают перезапуск бота.
+Изменения сохраняются на диск не при каждой записи, а в фоне: записи, добавленные за SAVE_DELAY секунд,
+сохраняются одной записью файла.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+from telebot import logger
+
+
+class TTLCache:
+    """
+    Класс кэша с ограниченным размером и временем жизни записей.
+
+    Записи хранятся в порядке последнего обращения: при переполнении удаляется запись,
+    к которой дольше всего не обращались. Время жизни отсчитывается по системным часам (time.time),
+    поэтому оно остаётся корректным и для записей, загруженных с диска после перезапуска.
+
+    :param maxsize: максимальное количество записей
+    :type maxsize: int
+
+    :param ttl: время жизни записи (в секундах)
+    :type ttl: float
+
+    :param path: путь к файлу, в котором кэш сохраняется на диск; если не указан, кэш хранится
+        только в памяти. Ключи кэша с сохранением на диск должны быть строками.
+    :type path: str | None
+    """
+
+    SAVE_DELAY = 1.0
+
+    def __init__(self, maxsize: int, ttl: float, path: Optional[str] = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._data: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._save_timer: Optional[threading.Timer] = None
+        self._loaded = False
+        if path:
+            atexit.register(self.flush)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Проверка наличия непросроченной записи (не меняет счётчики и порядок вытеснения записей)."""
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and entry[0] >= time.time()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Метод возвращает значение по ключу, если запись есть в кэше и её время жизни не истекло.
+
+        :param key: ключ записи
+        :type key: Hashable
+
+        :param default: значение, которое возвращается при отсутствии записи
+        :type default: Any
+
+        :return: значение записи или default
+        :rtype: Any
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Метод добавляет запись в кэш. При переполнении удаляется самая давно использованная запись.
+        Если у кэша указан файл, через SAVE_DELAY секунд кэш сохраняется на диск в фоновом потоке.
+
+        :param key: ключ записи
+        :type key: Hashable
+
+        :param value: значение записи
+        :type value: Any
+
+        :param ttl: время жизни записи (в секундах), если оно отличается от заданного для кэша
+        :type ttl: float | None
+        """
+        with self._lock:
+            self._data[key] = (time.time() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            if self.path and self._loaded and self._save_timer is None:
+                self._save_timer = threading.Timer(self.SAVE_DELAY, self.flush)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Метод удаляет запись из кэша и возвращает её значение.
+
+        :param key: ключ записи
+        :type key: Hashable
+
+        :param default: значение, которое возвращается при отсутствии записи
+        :type default: Any
+
+        :return: значение записи или default
+        :rtype: Any
+        """
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Метод возвращает счётчики попаданий и промахов, а также текущий размер кэша.
+
+        :rtype: Dict[str, int]
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data)}
+
+    def flush(self) -> None:
+        """Метод сохраняет на диск изменения, ожидающие фонового сохранения (вызывается и при завершении бота)."""
+        with self._lock:
+            if self._save_timer is None:
+                return
+            self._save_timer.cancel()
+            self._save_timer = None
+        self.save()
+
+    def save(self) -> None:
+        """
+        Метод сохраняет непросроченные записи кэша в файл.
+        Под блокировкой кэша снимается только список записей, а сам файл записывается без неё, поэтому
+        запись на диск не задерживает обращения к кэшу. Запись производится во временный файл, который затем
+        атомарно заменяет основной, поэтому при сбое во время записи файл кэша не повреждается;
+        ошибка записи выводится в лог, а кэш продолжает работать в памяти.
+        """
+        tmp_path = '{path}.tmp'.format(path=self.path)
+        with self._save_lock:
+            now = time.time()
+            with self._lock:
+                entries = [[key, expires_at, value] for key, (expires_at, value) in self._data.items()
+                           if expires_at >= now]
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as cache_file:
+                    json.dump(entries, cache_file, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+            except OSError:
+                logger.exception('Не удалось сохранить кэш в файл %s', self.path)
+
+    def load(self) -> None:
+        """
+        Метод загружает записи кэша из файла (если файл существует).
+        Просроченные записи пропускаются, повреждённый файл игнорируется.
+        Записи, которые уже есть в памяти, считаются более свежими и не перезаписываются.
+
+        До загрузки кэш не сохраняется на диск, чтобы не затереть файл, который ещё не прочитан
+        (загрузка может выполняться в фоне, когда бот уже отвечает пользователям); записи, добавленные
+        до загрузки, сохраняются вместе с загруженными.
+        """
+        entries = []
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as cache_file:
+                    entries = json.load(cache_file)
+            except (OSError, ValueError):
+                entries = []
+        now = time.time()
+        with self._lock:
+            has_new_entries = bool(self._data)
+            loaded = OrderedDict((key, (expires_at, value)) for key, expires_at, value in entries
+                                 if expires_at >= now and key not in self._data)
+            loaded.update(self._data)
+            self._data = loaded
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            self._loaded = True
+        if self.path and has_new_entries:
+            self.save()
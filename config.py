@@ -3,37 +3,187 @@
 
 
 BOT_TOKEN - токен телеграм-бота, который хранится в среде окружения.
-hotels_bot - объект TeleBot.
+get_hotels_bot - функция, возвращающая объект TeleBot (синхронные режимы polling и webhook); объект создаётся
+    при первом вызове, поэтому импорт config не создаёт бота, а в асинхронном режиме TeleBot не создаётся вовсе.
 headers - словарь с ключом RapidAPI, а также host RapidAPI.
 main_url - основной url сервиса с API, по которому происходят все запросы.
-tg_api_url = url, требующийся для запросов через API Telegram.
+BOT_MODE - режим работы бота: 'polling' (по умолчанию, синхронный TeleBot), 'webhook' (приём обновлений
+    локальным HTTP-сервером, см. модуль webhook) или 'async' (AsyncTeleBot и асинхронные запросы
+    к API Hotels.com, см. модуль async_engine).
+WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH - адрес, порт и путь, на которых HTTP-сервер принимает обновления.
+WEBHOOK_URL - публичный url вебхука; если задан, при запуске он устанавливается боту (setWebhook).
+WEBHOOK_SECRET - секретный токен, который Telegram передаёт в заголовке X-Telegram-Bot-Api-Secret-Token.
+    Необязателен, но без него сервер принимает обновления от любого отправителя, поэтому, если порт
+    доступен извне, его нужно задавать.
+WEBHOOK_MAX_BODY_SIZE - наибольший размер тела запроса (в байтах); на более крупные запросы сервер отвечает 413.
+WEBHOOK_PEERS - внутренние url вебхука всех экземпляров бота через запятую (в одном порядке на каждом экземпляре),
+    если их запущено несколько. Поисковый диалог хранится в памяти процесса, поэтому обновления пользователя
+    обрабатывает только экземпляр с номером user_id % len(WEBHOOK_PEERS), а остальные пересылают их ему.
+WEBHOOK_INSTANCE - номер этого экземпляра в списке WEBHOOK_PEERS (с 0).
+WEBHOOK_WORKERS - количество потоков, обрабатывающих обновления.
+WEBHOOK_QUEUE_SIZE - максимальное количество необработанных обновлений в очереди одного потока
+    (при переполнении сервер отвечает 503, и Telegram повторяет доставку позже).
+HTTP_POOL_SIZE - максимальное количество keep-alive соединений в пуле для каждого хоста.
+HTTP_CONNECT_TIMEOUT - таймаут на установку соединения (в секундах).
+HTTP_READ_TIMEOUT - таймаут на чтение ответа сервера (в секундах).
+API_ENDPOINTS - настройки запросов к API Hotels.com по адресам (см. модуль resilience): таймаут на чтение ответа
+    (timeout, в секундах), количество повторов (retries) и отправка дублирующего запроса (hedge).
+    Для адресов, которых нет в словаре, используются HTTP_READ_TIMEOUT, API_RETRIES и отправка дубля выключена.
+    Для списка отелей (/properties/list/) дубли выключены: это самый тяжёлый запрос, и его долгий ответ
+    обычно означает загруженность сервера, а не случайную задержку.
+API_RETRIES - количество повторов запроса к API Hotels.com после сетевой ошибки, ответа 5xx или 429.
+API_RETRY_AFTER_MAX - наибольшее время (в секундах) из заголовка Retry-After ответа 429, при котором запрос
+    повторяется (через указанное время); при большем времени или без заголовка ответ 429 не повторяется.
+API_RETRY_BACKOFF, API_RETRY_BACKOFF_MAX - начальная и наибольшая пауза (в секундах) перед повтором:
+    пауза удваивается с каждым повтором, и из неё выбирается случайное время (jitter).
+API_HEDGE_QUANTILE - квантиль длительности запросов к адресу, после которой отправляется дублирующий запрос.
+API_HEDGE_MIN_SAMPLES - количество последних успешных запросов к адресу, необходимое для отправки дублей.
+API_HEDGE_MIN_DELAY - наименьшее время (в секундах) до отправки дублирующего запроса.
+API_HEDGE_BUDGET - наибольшая доля запросов к API Hotels.com, для которых отправляются дублирующие запросы.
+API_BREAKER_THRESHOLD - количество неудачных запросов подряд, после которого запросы к API Hotels.com
+    прекращаются (circuit breaker), и пользователю сразу сообщается о недоступности сервиса.
+API_BREAKER_COOLDOWN - время (в секундах), через которое после прекращения запросов отправляется пробный запрос.
+TG_GLOBAL_RATE - допустимое количество сообщений, отправляемых ботом в секунду (во все чаты).
+TG_CHAT_RATE, TG_CHAT_BURST - допустимое количество запросов в секунду в один чат и допустимый всплеск
+    (альбом считается одним запросом).
+TG_MAX_RETRIES - максимальное количество повторов отправки после ошибки 429 (см. модуль outbound).
+ENRICHMENT_WORKERS - количество потоков, в которых параллельно запрашиваются адреса и фото отелей.
+LOCATION_CACHE_SIZE, LOCATION_CACHE_TTL, LOCATION_CACHE_FILE - размер, время жизни записей (в секундах)
+    и файл кэша destinationId городов.
+HOTEL_CACHE_SIZE - максимальное количество отелей в кэшах адресов и фото.
+HOTEL_ADDRESS_CACHE_TTL, HOTEL_PHOTOS_CACHE_TTL - время жизни (в секундах) адреса и ссылок на фото отеля в кэше.
+RESULT_CACHE_SIZE, RESULT_CACHE_TTL - размер и время жизни записей (в секундах) общего кэша результатов поиска:
+    отелей из просмотренных страниц списка отелей по городу, датам, порядку сортировки, локали и валюте.
+RESULT_CACHE_FILE - файл, в котором сохраняется кэш результатов поиска (если не задан, кэш хранится только в памяти).
+MAX_PHOTO_NUMBER - максимальное количество фото, которое можно вывести по одному отелю.
+MEDIA_GROUP_MAX_SIZE - максимальное количество фото в одном альбоме (ограничение Telegram).
+CAPTION_MAX_LENGTH - максимальная длина подписи к фото или альбому (ограничение Telegram).
+MESSAGE_MAX_LENGTH - максимальная длина текстового сообщения (ограничение Telegram).
+PHOTO_ALBUM_CAPTION - выводить ли информацию об отеле подписью к альбому с его фото.
+RESULT_STREAMING - выводить ли результаты поиска по мере готовности: заголовок - сразу после запроса списка отелей,
+    карточку каждого отеля (с фото) - как только получены его адрес и фото (порядок отелей сохраняется);
+    если выключено, результаты выводятся после получения данных всех отелей в как можно меньшем количестве сообщений.
+HISTORY_DB_FILE - файл базы данных SQLite с историей поиска пользователей.
+LEGACY_HISTORY_FILE - прежний JSON-файл с историей поиска, данные из которого переносятся в базу.
+HISTORY_LIMIT - количество последних поисковых запросов, которые хранятся для каждого пользователя.
+HISTORY_PAGE_SIZE - количество отелей на одной странице при просмотре истории поиска.
+BESTDEAL_MAX_PAGES - максимальное количество страниц списка отелей, которые просматриваются при команде bestdeal.
+BESTDEAL_TIME_BUDGET - время (в секундах), после которого новые страницы списка отелей не запрашиваются.
+BESTDEAL_PRICE_WEIGHT - вес цены (от 0 до 1) при ранжировании отелей по цене и расстоянию от центра.
+ADMIN_IDS - ID пользователей (через запятую), которым доступна команда /metrics.
+METRICS_HOST, METRICS_PORT - адрес и порт HTTP-сервера, отдающего метрики в формате Prometheus
+    по пути /metrics (0 - сервер не запускается).
+TRACE_SAMPLE_RATE - доля поисков (от 0 до 1), для которых записываются трассы этапов поиска (см. модуль tracing).
+TRACE_SLOW_THRESHOLD - время работы бота над поиском (в секундах), начиная с которого трасса сохраняется.
+TRACE_FILE - файл (JSON lines), в который дописываются трассы медленных поисков.
+COMMANDS_DIGEST_FILE - файл с отпечатком установленного меню команд (см. модуль set_bot_commands).
 ORIGINAL_COMMANDS - кортеж с парами "название команды" - "описание команды". Список возможностей бота.
 
-search_data - словарь для сохранения данных, полученных от пользователя, по которым проводится поиск отелей.
-search_result - словарь с результатами поиска, который проводил пользователь.
+SESSION_TTL - время (в секундах) без ответа пользователя, после которого его поисковая сессия удаляется.
+SESSION_MAX_SIZE - максимальное количество одновременно хранящихся поисковых сессий.
+search_sessions - хранилище поисковых сессий: данных, полученных от пользователя, по которым проводится
+    поиск отелей, и результатов поиска.
 """
 
 import os
+import threading
+from typing import Optional
 
 from dotenv import load_dotenv
 
+from sessions import SessionStore
+
 import telebot
 
 
 load_dotenv()
 BOT_TOKEN = os.environ.get('BOT_TOKEN')
-hotels_bot = telebot.TeleBot(BOT_TOKEN)
+_hotels_bot: Optional[telebot.TeleBot] = None
+_hotels_bot_lock = threading.Lock()
 
 headers = {
     "X-RapidAPI-Key": os.environ.get('X-RapidAPI-Key'),
     "X-RapidAPI-Host": 'hotels4.p.rapidapi.com'
 }
 main_url = 'https://hotels4.p.rapidapi.com'
-tg_api_url = 'https://api.telegram.org/bot'
 
-search_data = dict()
-search_result = dict()
+BOT_MODE = os.environ.get('BOT_MODE', 'polling')
+
+WEBHOOK_HOST = os.environ.get('WEBHOOK_HOST', '127.0.0.1')
+WEBHOOK_PORT = int(os.environ.get('WEBHOOK_PORT', 8443))
+WEBHOOK_PATH = os.environ.get('WEBHOOK_PATH', '/webhook')
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL')
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET')
+WEBHOOK_WORKERS = int(os.environ.get('WEBHOOK_WORKERS', 8))
+WEBHOOK_QUEUE_SIZE = int(os.environ.get('WEBHOOK_QUEUE_SIZE', 100))
+WEBHOOK_MAX_BODY_SIZE = int(os.environ.get('WEBHOOK_MAX_BODY_SIZE', 1024 * 1024))
+WEBHOOK_PEERS = tuple(peer.strip() for peer in os.environ.get('WEBHOOK_PEERS', '').split(',') if peer.strip())
+WEBHOOK_INSTANCE = int(os.environ.get('WEBHOOK_INSTANCE', 0))
+
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 10))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 3.05))
+HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 30))
+API_RETRIES = int(os.environ.get('API_RETRIES', 2))
+API_ENDPOINTS = {
+    '/locations/v2/search/': {'timeout': 10, 'retries': API_RETRIES, 'hedge': True},
+    '/properties/list/': {'timeout': 20, 'retries': API_RETRIES, 'hedge': False},
+    '/properties/get-details/': {'timeout': 10, 'retries': API_RETRIES, 'hedge': True},
+    '/properties/get-hotel-photos/': {'timeout': 10, 'retries': API_RETRIES, 'hedge': True},
+}
+API_RETRY_BACKOFF = float(os.environ.get('API_RETRY_BACKOFF', 0.25))
+API_RETRY_BACKOFF_MAX = float(os.environ.get('API_RETRY_BACKOFF_MAX', 2))
+API_RETRY_AFTER_MAX = float(os.environ.get('API_RETRY_AFTER_MAX', 2))
+API_HEDGE_QUANTILE = float(os.environ.get('API_HEDGE_QUANTILE', 0.95))
+API_HEDGE_MIN_SAMPLES = int(os.environ.get('API_HEDGE_MIN_SAMPLES', 20))
+API_HEDGE_MIN_DELAY = float(os.environ.get('API_HEDGE_MIN_DELAY', 0.05))
+API_HEDGE_BUDGET = float(os.environ.get('API_HEDGE_BUDGET', 0.05))
+API_BREAKER_THRESHOLD = int(os.environ.get('API_BREAKER_THRESHOLD', 10))
+API_BREAKER_COOLDOWN = float(os.environ.get('API_BREAKER_COOLDOWN', 30))
+TG_GLOBAL_RATE = float(os.environ.get('TG_GLOBAL_RATE', 30))
+TG_CHAT_RATE = float(os.environ.get('TG_CHAT_RATE', 1))
+TG_CHAT_BURST = float(os.environ.get('TG_CHAT_BURST', 3))
+TG_MAX_RETRIES = int(os.environ.get('TG_MAX_RETRIES', 3))
+ENRICHMENT_WORKERS = int(os.environ.get('ENRICHMENT_WORKERS', 8))
+
+LOCATION_CACHE_SIZE = int(os.environ.get('LOCATION_CACHE_SIZE', 1000))
+LOCATION_CACHE_TTL = float(os.environ.get('LOCATION_CACHE_TTL', 7 * 24 * 60 * 60))
+LOCATION_CACHE_FILE = os.environ.get('LOCATION_CACHE_FILE', 'location_cache.json')
+
+HOTEL_CACHE_SIZE = int(os.environ.get('HOTEL_CACHE_SIZE', 5000))
+HOTEL_ADDRESS_CACHE_TTL = float(os.environ.get('HOTEL_ADDRESS_CACHE_TTL', 30 * 24 * 60 * 60))
+HOTEL_PHOTOS_CACHE_TTL = float(os.environ.get('HOTEL_PHOTOS_CACHE_TTL', 7 * 24 * 60 * 60))
+RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 1000))
+RESULT_CACHE_TTL = float(os.environ.get('RESULT_CACHE_TTL', 10 * 60))
+RESULT_CACHE_FILE = os.environ.get('RESULT_CACHE_FILE')
+MAX_PHOTO_NUMBER = 6
+MEDIA_GROUP_MAX_SIZE = 10
+CAPTION_MAX_LENGTH = 1024
+MESSAGE_MAX_LENGTH = 4096
+PHOTO_ALBUM_CAPTION = os.environ.get('PHOTO_ALBUM_CAPTION', '1') == '1'
+RESULT_STREAMING = os.environ.get('RESULT_STREAMING', '1') == '1'
+
+HISTORY_DB_FILE = os.environ.get('HISTORY_DB_FILE', 'search_requests.db')
+LEGACY_HISTORY_FILE = 'search_requests.json'
+HISTORY_LIMIT = 5
+HISTORY_PAGE_SIZE = int(os.environ.get('HISTORY_PAGE_SIZE', 3))
 
+BESTDEAL_MAX_PAGES = int(os.environ.get('BESTDEAL_MAX_PAGES', 5))
+BESTDEAL_TIME_BUDGET = float(os.environ.get('BESTDEAL_TIME_BUDGET', 15))
+BESTDEAL_PRICE_WEIGHT = float(os.environ.get('BESTDEAL_PRICE_WEIGHT', 0.5))
+
+SESSION_TTL = float(os.environ.get('SESSION_TTL', 60 * 60))
+SESSION_MAX_SIZE = int(os.environ.get('SESSION_MAX_SIZE', 10000))
+search_sessions = SessionStore(SESSION_MAX_SIZE, SESSION_TTL)
+
+ADMIN_IDS = frozenset(int(admin_id) for admin_id in os.environ.get('ADMIN_IDS', '').split(',') if admin_id.strip())
+METRICS_HOST = os.environ.get('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.environ.get('METRICS_PORT', 0))
+
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 0.1))
+TRACE_SLOW_THRESHOLD = float(os.environ.get('TRACE_SLOW_THRESHOLD', 10))
+TRACE_FILE = os.environ.get('TRACE_FILE', 'slow_traces.jsonl')
+
+COMMANDS_DIGEST_FILE = os.environ.get('COMMANDS_DIGEST_FILE', 'bot_commands.digest')
 ORIGINAL_COMMANDS = (
     ('start', 'запуск бота HotelsEasy'),
     ('help', 'справка по возможностям бота'),
@@ -43,3 +193,17 @@ ORIGINAL_COMMANDS = (
         'от центра'),
     ('history', 'вывод истории поиска отелей')
 )
+
+
+def get_hotels_bot() -> telebot.TeleBot:
+    """
+    Функция возвращает объект TeleBot, создавая его при первом вызове.
+
+    :rtype: telebot.TeleBot
+    """
+    global _hotels_bot
+    if _hotels_bot is None:
+        with _hotels_bot_lock:
+            if _hotels_bot is None:
+                _hotels_bot = telebot.TeleBot(BOT_TOKEN)
+    return _hotels_bot
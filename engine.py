@@ -0,0 +1,315 @@
+"""
+Модуль движка диалога бота: общий слой ввода-вывода, через который обработчики команд (пакет handlers)
+и шаги поиска (модуль utils) обращаются к API Hotels.com и Telegram.
+
+Обработчики и шаги написаны один раз - корутинными функциями, которые выполняют ввод-вывод только через
+текущий движок (get_engine), поэтому одни и те же функции работают во всех режимах бота:
+- SyncEngine (режимы polling и webhook): запросы выполняются блокирующими вызовами (модули transport и outbound)
+  прямо в потоке-обработчике TeleBot. Корутина при этом ни разу не приостанавливается, и run_sync выполняет её
+  до конца без цикла событий. Фоновые задачи (данные отелей, следующая страница списка отелей, упреждающий
+  запрос) выполняются в пуле потоков enrichment_pool;
+- async_engine.AsyncEngine (режим async): запросы выполняются через aiohttp и AsyncTeleBot в цикле событий,
+  фоновые задачи - задачами asyncio, а вызовы, которые берут блокировки потоков или пишут файлы
+  (кэши, хранилища сессий и истории поиска), - в отдельных потоках.
+
+Обработчики объявляются декораторами message_handler и callback_query_handler этого модуля
+и подключаются к объекту бота (TeleBot или AsyncTeleBot) функцией register_handlers при запуске.
+"""
+
+import asyncio
+import contextvars
+from concurrent import futures
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple
+
+from config import ENRICHMENT_WORKERS, get_hotels_bot
+
+from outbound import outbound_scheduler
+
+import requests
+
+from resilience import PoolTimeoutError
+
+from telebot import types
+from telebot.apihelper import ApiTelegramException
+
+from transport import api_get_json
+
+
+HANDLERS: List[Tuple[str, Callable, Dict[str, Any]]] = list()
+
+enrichment_pool = ThreadPoolExecutor(max_workers=ENRICHMENT_WORKERS, thread_name_prefix='enrichment')
+
+
+def message_handler(**filters: Any) -> Callable:
+    """
+    Декоратор объявляет корутинную функцию обработчиком сообщений с фильтрами filters
+    (как у TeleBot.message_handler: commands, regexp, func и т.д.).
+
+    :rtype: Callable
+    """
+    def decorator(function: Callable) -> Callable:
+        HANDLERS.append(('message', function, filters))
+        return function
+    return decorator
+
+
+def callback_query_handler(**filters: Any) -> Callable:
+    """
+    Декоратор объявляет корутинную функцию обработчиком нажатий кнопок виртуальной клавиатуры
+    с фильтрами filters (как у TeleBot.callback_query_handler).
+
+    :rtype: Callable
+    """
+    def decorator(function: Callable) -> Callable:
+        HANDLERS.append(('callback_query', function, filters))
+        return function
+    return decorator
+
+
+def register_handlers(bot: Any, adapt: Optional[Callable[[Callable], Callable]] = None) -> None:
+    """
+    Функция подключает объявленные обработчики к объекту бота в порядке объявления
+    (обработчик ответов в поисковом диалоге объявляется последним, см. пакет handlers).
+
+    :param bot: объект TeleBot или AsyncTeleBot
+    :type bot: telebot.TeleBot | telebot.async_telebot.AsyncTeleBot
+
+    :param adapt: функция, которая превращает корутинный обработчик в обработчик бота
+        (для TeleBot - synchronous); если None, обработчики подключаются как есть
+    :type adapt: Callable | None
+    """
+    for kind, function, filters in HANDLERS:
+        register = bot.register_message_handler if kind == 'message' else bot.register_callback_query_handler
+        register(adapt(function) if adapt else function, **filters)
+
+
+def run_sync(coroutine: Coroutine) -> Any:
+    """
+    Функция выполняет корутину до конца в текущем потоке без цикла событий (синхронный режим).
+    С движком SyncEngine корутины обработчиков и шагов поиска не приостанавливаются:
+    весь ввод-вывод выполняется блокирующими вызовами.
+
+    :param coroutine: корутина
+    :type coroutine: Coroutine
+
+    :return: результат корутины
+
+    :raises RuntimeError: если корутина приостановилась (ожидает то, что может завершить только цикл событий)
+    """
+    try:
+        coroutine.send(None)
+    except StopIteration as stop:
+        return stop.value
+    coroutine.close()
+    raise RuntimeError('Корутина приостановилась: в синхронном режиме ввод-вывод выполняется через SyncEngine')
+
+
+def synchronous(function: Callable[..., Coroutine]) -> Callable:
+    """
+    Функция превращает корутинную функцию в обычную, которая выполняет её через run_sync
+    (так обработчики подключаются к TeleBot).
+
+    :param function: корутинная функция
+    :type function: Callable
+
+    :rtype: Callable
+    """
+    @wraps(function)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        return run_sync(function(*args, **kwargs))
+    return wrapper
+
+
+class Engine:
+    """
+    Класс движка: ввод-вывод, общий для обработчиков и шагов поиска. Методы, которые выполняют ввод-вывод, -
+    корутинные, даже если движок выполняет их блокирующими вызовами (SyncEngine).
+
+    network_errors - исключения сетевых ошибок запросов к API Hotels.com (и ожидания соединения из пула,
+        см. resilience.PoolTimeoutError).
+    telegram_errors - исключения, при которых Telegram не принял сообщение.
+    """
+
+    network_errors: Tuple[type, ...] = ()
+    telegram_errors: Tuple[type, ...] = ()
+
+    async def fetch(self, url_part: str, querystring: Dict[str, Any]) -> Any:
+        """
+        Метод отправляет запрос к API Hotels.com (с объединением одинаковых запросов, повторами и circuit breaker)
+        и возвращает нужные боту данные ответа (см. records.extract_payload).
+
+        :param url_part: часть url, отвечающая за конкретный запрос
+        :type url_part: str
+
+        :param querystring: параметры запроса
+        :type querystring: Dict[str, Any]
+
+        :rtype: Any
+
+        :raises resilience.CircuitOpenError: если запросы к API прекращены из-за его недоступности
+        :raises ValueError: если код ответа не равен 200 или в ответе нет нужных полей
+        :raises json.decoder.JSONDecodeError: если формат ответа от сервера некорректен
+        :raises network_errors: если соединение не удалось установить или истёк таймаут
+        """
+        raise NotImplementedError
+
+    async def send(self, method: str, chat_id: int, *args: Any, cost: float = 1, **kwargs: Any) -> Any:
+        """
+        Метод отправляет сообщение методом бота method (например, 'send_message') через планировщик
+        outbound_scheduler, с учётом лимитов Telegram на частоту отправки.
+
+        :param method: название метода бота
+        :type method: str
+
+        :param chat_id: ID чата
+        :type chat_id: int
+
+        :param cost: стоимость запроса (см. outbound.OutboundScheduler.call)
+        :type cost: float
+
+        :return: результат запроса
+        """
+        raise NotImplementedError
+
+    async def bot_call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        """
+        Метод вызывает метод бота, который не отправляет сообщений в чат (например, 'answer_callback_query').
+
+        :param method: название метода бота
+        :type method: str
+
+        :return: результат запроса
+        """
+        raise NotImplementedError
+
+    async def blocking(self, function: Callable, *args: Any) -> Any:
+        """
+        Метод выполняет функцию, которая берёт блокировки потоков или работает с файлами
+        (кэши, хранилища сессий и истории поиска).
+
+        :param function: функция
+        :type function: Callable
+
+        :return: результат функции
+        """
+        raise NotImplementedError
+
+    def spawn(self, function: Callable[..., Coroutine], *args: Any) -> Any:
+        """
+        Метод запускает корутинную функцию фоновой задачей. Задачу можно дождаться (await),
+        отменить (cancel, из любого потока) и проверить, отменена ли она (cancelled);
+        при ожидании отменённой задачи возникает asyncio.CancelledError.
+
+        :param function: корутинная функция
+        :type function: Callable
+
+        :return: фоновая задача
+        """
+        raise NotImplementedError
+
+
+class SyncTask:
+    """
+    Класс фоновой задачи синхронного режима: корутина, выполняемая в потоке пула enrichment_pool.
+
+    :param future: результат выполнения корутины в пуле потоков
+    :type future: concurrent.futures.Future
+    """
+
+    __slots__ = ('future',)
+
+    def __init__(self, future: futures.Future) -> None:
+        self.future = future
+
+    def __await__(self) -> Any:
+        return self._result().__await__()
+
+    def cancel(self) -> None:
+        """Метод отменяет задачу, если она ещё не начала выполняться."""
+        self.future.cancel()
+
+    def cancelled(self) -> bool:
+        """
+        Метод проверяет, отменена ли задача.
+
+        :rtype: bool
+        """
+        return self.future.cancelled()
+
+    async def _result(self) -> Any:
+        """Метод дожидается результата задачи (блокируя поток)."""
+        try:
+            return self.future.result()
+        except futures.CancelledError:
+            raise asyncio.CancelledError from None
+
+
+class SyncEngine(Engine):
+    """
+    Класс движка синхронного режима (polling, webhook): запросы к API Hotels.com выполняются через
+    transport.api_get_json, сообщения отправляются через TeleBot (config.get_hotels_bot), фоновые задачи -
+    в пуле enrichment_pool.
+    """
+
+    network_errors = (requests.RequestException, PoolTimeoutError)
+    telegram_errors = (ApiTelegramException, requests.RequestException)
+
+    async def fetch(self, url_part: str, querystring: Dict[str, Any]) -> Any:
+        """Метод выполняет запрос блокирующим вызовом transport.api_get_json (см. Engine.fetch)."""
+        return api_get_json(url_part, querystring)
+
+    async def send(self, method: str, chat_id: int, *args: Any, cost: float = 1, **kwargs: Any) -> Any:
+        """Метод отправляет сообщение блокирующим вызовом outbound_scheduler.call (см. Engine.send)."""
+        return outbound_scheduler.call(getattr(get_hotels_bot(), method), chat_id, *args, cost=cost, **kwargs)
+
+    async def bot_call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        """Метод вызывает метод TeleBot (см. Engine.bot_call)."""
+        return getattr(get_hotels_bot(), method)(*args, **kwargs)
+
+    async def blocking(self, function: Callable, *args: Any) -> Any:
+        """Метод выполняет функцию прямо в потоке-обработчике (см. Engine.blocking)."""
+        return function(*args)
+
+    def spawn(self, function: Callable[..., Coroutine], *args: Any) -> SyncTask:
+        """Метод выполняет корутинную функцию через run_sync в потоке пула enrichment_pool (см. Engine.spawn)."""
+        return SyncTask(enrichment_pool.submit(contextvars.copy_context().run, synchronous(function), *args))
+
+
+_engine: Engine = SyncEngine()
+
+
+def get_engine() -> Engine:
+    """
+    Функция возвращает текущий движок (SyncEngine, если асинхронный режим не запущен).
+
+    :rtype: Engine
+    """
+    return _engine
+
+
+def set_engine(engine: Engine) -> None:
+    """
+    Функция устанавливает текущий движок (при запуске асинхронного режима, см. модуль async_engine).
+
+    :param engine: движок
+    :type engine: Engine
+    """
+    global _engine
+    _engine = engine
+
+
+async def send_message(chat_id: int, text: str, **kwargs: Any) -> types.Message:
+    """
+    Функция отправляет сообщение через текущий движок (с учётом лимитов Telegram, см. модуль outbound).
+
+    :param chat_id: ID чата
+    :type chat_id: int
+
+    :param text: текст сообщения
+    :type text: str
+
+    :rtype: telebot.types.Message
+    """
+    return await get_engine().send('send_message', chat_id, text, **kwargs)
@@ -7,6 +7,12 @@ lowprice - обработчик команды пользователя '/lowpri
 highprice - обработчик команды пользователя '/highprice'.
 bestdeal - обработчик команды пользователя '/bestdeal'.
 history - обработчик команды пользователя '/history'.
+hotels_number - обработчик кнопки выбора количества отелей в поисковом диалоге.
+admin - обработчик команды администратора '/metrics'.
+dialog - обработчик ответов пользователя в поисковом диалоге (импортируется последним: обработчики подключаются
+к боту в порядке объявления, а этот обработчик принимает все сообщения).
+
+Обработчики объявляются декораторами модуля engine и подключаются к боту функцией engine.register_handlers.
 """
 from handlers import bestdeal
 from handlers import helping
@@ -14,3 +20,6 @@ from handlers import highprice
 from handlers import lowprice
 from handlers import start
 from handlers import history
+from handlers import hotels_number
+from handlers import admin
+from handlers import dialog
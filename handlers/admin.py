@@ -0,0 +1,24 @@
+from config import ADMIN_IDS  # noqa: D100
+
+from engine import message_handler, send_message
+
+from metrics import summary_text
+
+from rendering import pack_blocks
+
+from telebot import types
+
+
+@message_handler(commands=['metrics'], func=lambda message: message.from_user.id in ADMIN_IDS)
+async def command_metrics(message: types.Message) -> None:
+    """
+    Функция - обработчик команды администратора '/metrics'.
+    Выводит сводку метрик работы бота: запросы к API Hotels.com, квота RapidAPI, длительность поиска
+    и обработчиков, статистика кэшей и очередей (см. модуль metrics).
+    Команда доступна только пользователям из ADMIN_IDS и не входит в меню бота.
+
+    :param message: сообщение пользователя
+    :type message: telebot.types.Message
+    """
+    for text in pack_blocks((summary_text(),)):
+        await send_message(message.from_user.id, text)
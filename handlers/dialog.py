@@ -0,0 +1,22 @@
+from config import search_sessions  # noqa: D100
+
+from engine import get_engine, message_handler
+
+from telebot import types
+
+from utils import DIALOG_STEPS
+
+
+@message_handler(func=lambda message: True)
+async def dialog_answer(message: types.Message) -> None:
+    """
+    Функция - обработчик всех остальных сообщений пользователя (подключается последним, после обработчиков команд).
+    Передаёт ответ пользователя шагу поискового диалога, имя которого сохранено в его поисковой сессии
+    (next_step, см. utils.DIALOG_STEPS). Если бот не ждёт ответа, сообщение пропускается.
+
+    :param message: сообщение пользователя
+    :type message: telebot.types.Message
+    """
+    session = await get_engine().blocking(search_sessions.get, message.from_user.id)
+    if session is not None and session.next_step is not None:
+        await DIALOG_STEPS[session.next_step](message, session)
@@ -1,10 +1,19 @@
-from config import ORIGINAL_COMMANDS, hotels_bot  # noqa: D100
+from config import ORIGINAL_COMMANDS  # noqa: D100
+
+from engine import message_handler, send_message
+
+from metrics import timed_handler
 
 from telebot import types
 
 
-@hotels_bot.message_handler(commands=['help'])
-def helping(message: types.Message):
+HELP_TEXT = '\n'.join(['Доступны следующие команды:'] + ['/{command} - {description}'.format(
+                      command=command, description=description) for command, description in ORIGINAL_COMMANDS])
+
+
+@message_handler(commands=['help'])
+@timed_handler('help')
+async def helping(message: types.Message):
     """
     Функция - обработчик команды пользователя '/help'.
     Выводит пользователю список команд, с помощью которых можно обращаться к боту.
@@ -12,8 +21,4 @@ def helping(message: types.Message):
     :param message: сообщение пользователя
     :type message: telebot.types.Message
     """
-    help_text = ['Доступны следующие команды:']
-    help_text.extend(['/{command} - {description}'.format(command=command,
-                     description=description)
-                     for command, description in ORIGINAL_COMMANDS])
-    hotels_bot.send_message(message.from_user.id, '\n'.join(help_text))
+    await send_message(message.from_user.id, HELP_TEXT)
@@ -1,25 +1,24 @@
-from config import hotels_bot  # noqa: D100
+from engine import message_handler, send_message  # noqa: D100
+
+from metrics import timed_handler
 
 from telebot import types
 
-from utils import city_definition, empty_dictionary, search_data
+from utils import empty_dictionary
 
 
-@hotels_bot.message_handler(commands=['highprice'])
-def command_highprice(message: types.Message) -> None:
+@message_handler(commands=['highprice'])
+@timed_handler('highprice')
+async def command_highprice(message: types.Message) -> None:
     """
     Функция - обработчик команды пользователя '/highprice'.
-    Подготавливает словари-хранилища информации поискового запроса для начала работы.
-    Создаёт в словаре-хранилище отдельный словарь для каждого пользователя,
-    куда сохраняются полученные от него данные дл поиска.
-    Перенаправляет работу на обработчик 'city_definition' модуля 'utils'.
+    Создаёт для пользователя новую поисковую сессию, куда сохраняются полученные от него данные для поиска.
+    Перенаправляет работу на шаг диалога 'city_definition' модуля 'utils'.
 
     :param message: сообщение пользователя
     :type message: telebot.types.Message
     """
-    empty_dictionary(message.from_user.id)
-    search_data[message.from_user.id].setdefault('search_command', 'Highprice')
-    search_data[message.from_user.id].setdefault('search_pattern', 'PRICE_HIGHEST_FIRST')
+    session = await empty_dictionary(message.from_user.id, 'Highprice', 'PRICE_HIGHEST_FIRST')
+    session.next_step = 'city_definition'
     city_question = 'В каком городе хотите найти отель?'
-    hotels_bot.send_message(message.from_user.id, city_question)
-    hotels_bot.register_next_step_handler(message, city_definition)
+    await send_message(message.from_user.id, city_question)
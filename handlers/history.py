@@ -1,37 +1,111 @@
-import json  # noqa: D100
+import html  # noqa: D100
+from typing import Any, Dict, List, Tuple
 
-from config import hotels_bot
+from config import HISTORY_PAGE_SIZE
+
+from engine import callback_query_handler, get_engine, message_handler, send_message
+
+from keyboards.history_keyboard import get_history_keyboard, get_next_page_keyboard
+
+from metrics import timed_handler
+
+from records import HotelRecord
+
+from rendering import PARSE_MODE, html_pairs, pack_blocks
+
+from storage import get_search_request, get_search_request_summaries
 
 from telebot import types
 
-from utils import info_pairs_formation, output_each_hotel_info
+from utils import output_search_result
 
 
-@hotels_bot.message_handler(commands=['history'])
-def command_history(message: types.Message) -> None:
+@message_handler(commands=['history'])
+@timed_handler('history')
+async def command_history(message: types.Message) -> None:
     """
     Функция - обработчик команды пользователя '/history'.
-    Из сохранённых в файле 'search_requests.json' данных по поисковым запросам пользователя выводит ему
-    последние 5 запросов.
+    Из сохранённых в хранилище истории (storage) данных по поисковым запросам пользователя выводит ему
+    краткий список последних 5 запросов (без отелей и фото) и клавиатуру, с помощью которой можно
+    открыть результаты любого из них.
     Если пользователь ранее ещё не использовал поиск с помощью бота, ему выводится соответствующее сообщение.
 
     :param message: сообщение пользователя
     :type message: telebot.types.Message
     """
-    hotels_bot.send_message(message.from_user.id, 'Ваша история поиска:')
-
-    with open('search_requests.json', 'r', encoding='utf-8') as req_file:
-        all_requests_data = json.load(req_file)
-        user_id = str(message.from_user.id)
-        if user_id not in all_requests_data:
-            error_text = 'Вы ещё не пользовались поиском'
-            hotels_bot.send_message(message.from_user.id, error_text)
-        else:
-            for search_date, search_result in all_requests_data[user_id].items():
-                output_text = []
-                output_text.append('Дата поиска: {date}\n'.format(date=search_date))
-                main_text = info_pairs_formation(search_result, 'Отели')
-                output_text.extend(main_text)
-                hotels_bot.send_message(message.from_user.id, '\n'.join(output_text))
-
-                output_each_hotel_info(message, search_result['Отели'])
+    summaries = await get_engine().blocking(get_search_request_summaries, str(message.from_user.id))
+    if not summaries:
+        await send_message(message.from_user.id, 'Ваша история поиска:\nВы ещё не пользовались поиском')
+        return
+
+    keyboard = get_history_keyboard((request_id, search_date) for request_id, search_date, _ in summaries)
+    history_messages = pack_blocks(('<b>Ваша история поиска:</b>', summaries_text_formation(summaries)))
+    for history_message in history_messages[:-1]:
+        await send_message(message.from_user.id, history_message, parse_mode=PARSE_MODE)
+    await send_message(message.from_user.id, history_messages[-1], parse_mode=PARSE_MODE, reply_markup=keyboard)
+
+
+def summaries_text_formation(summaries: List[Tuple[int, str, Dict[str, Any]]]) -> str:
+    """
+    Функция составляет краткий список сохранённых поисковых запросов (HTML): по строке на каждый запрос.
+
+    :param summaries: краткие данные поисковых запросов (см. storage.get_search_request_summaries)
+    :type summaries: List[Tuple[int, str, Dict[str, Any]]]
+
+    :rtype: str
+    """
+    return '\n'.join(html.escape('{date} - {command}, {city}, {dates}'.format(
+                     date=search_date,
+                     command=summary.get('Команда поиска'),
+                     city=summary.get('Город'),
+                     dates=summary.get('Даты пребывания')))
+                     for _, search_date, summary in summaries)
+
+
+@callback_query_handler(func=lambda call: call.data.startswith('history:'))
+@timed_handler('history_page')
+async def history_page(call: types.CallbackQuery) -> None:
+    """
+    Функция-обработчик обратного вызова от кнопок клавиатуры истории поиска.
+    Загружает из хранилища один сохранённый поисковый запрос и выводит страницу его результатов:
+    HISTORY_PAGE_SIZE отелей с фото. На первой странице также выводятся данные самого запроса.
+    Если отелей больше, в конце выводится кнопка перехода к следующей странице.
+
+    :param call: объект ответа от кнопки на виртуальной клавиатуре
+    :type call: telebot.types.CallbackQuery
+    """
+    engine = get_engine()
+    await engine.bot_call('answer_callback_query', call.id)
+    _, request_id, page = call.data.split(':')
+    request_id, page = int(request_id), int(page)
+
+    saved_request = await engine.blocking(get_search_request, str(call.from_user.id), request_id)
+    if saved_request is None:
+        error_text = 'Этот поисковый запрос больше не хранится в истории'
+        await send_message(call.from_user.id, error_text)
+        return
+
+    search_date, search_result = saved_request
+    header = history_header_formation(search_date, search_result) if page == 0 else ''
+    hotels = search_result['Отели']
+    shown_number = min((page + 1) * HISTORY_PAGE_SIZE, len(hotels))
+    await output_search_result(call.from_user.id, header,
+                               [HotelRecord.from_row(row) for row in hotels[page * HISTORY_PAGE_SIZE:shown_number]])
+    if shown_number < len(hotels):
+        page_text = 'Показано отелей: {shown} из {total}'.format(shown=shown_number, total=len(hotels))
+        await send_message(call.from_user.id, page_text, reply_markup=get_next_page_keyboard(request_id, page + 1))
+
+
+def history_header_formation(search_date: str, search_result: Dict[str, Any]) -> str:
+    """
+    Функция составляет заголовок сохранённого поискового запроса (HTML): дату поиска и данные запроса.
+
+    :param search_date: дата и время поискового запроса
+    :type search_date: str
+
+    :param search_result: данные поискового запроса (см. utils.history_data_formation)
+    :type search_result: Dict[str, Any]
+
+    :rtype: str
+    """
+    return '\n'.join(['<b>Дата поиска: {date}</b>'.format(date=search_date)] + html_pairs(search_result, 'Отели'))
@@ -0,0 +1,20 @@
+from engine import callback_query_handler  # noqa: D100
+
+from telebot import types
+
+from utils import get_session, set_hotels_number
+
+
+@callback_query_handler(func=lambda call: call.data.isdigit())
+async def callback_hotels_number(call: types.CallbackQuery) -> None:
+    """
+    Функция - обработчик нажатия кнопки с количеством отелей (клавиатура keyboards.size_9_keyboard).
+    Перенаправляет работу на шаг диалога 'set_hotels_number' модуля 'utils'.
+    Если поисковая сессия пользователя истекла, пользователю предлагается начать поиск заново.
+
+    :param call: объект ответа от кнопки на виртуальной клавиатуре
+    :type call: telebot.types.CallbackQuery
+    """
+    session = await get_session(call.from_user.id)
+    if session is not None:
+        await set_hotels_number(call, session)
@@ -1,11 +1,19 @@
-from config import hotels_bot  # noqa: D100
+from engine import message_handler, send_message  # noqa: D100
+
+from metrics import timed_handler
 
 from telebot import types
 
 
-@hotels_bot.message_handler(commands=['start'])
-@hotels_bot.message_handler(regexp=r'[Пп]ривет')
-def starting(message: types.Message):
+GREETING_TEXT = ('Привет! Я - бот турагентства Too Easy Travel.\n'
+                 'Скажите, что именно вас интересует, и я подберу лучшие варианты.\n'
+                 'Можете выбрать команду /help, и появится список моих возможностей.')
+
+
+@message_handler(commands=['start'])
+@message_handler(regexp=r'[Пп]ривет')
+@timed_handler('start')
+async def starting(message: types.Message):
     """
     Функция-приветствие, обработчик команды пользователя '/start' и 'Привет/привет'.
     Предлагает пользователю дать команду боту.
@@ -13,7 +21,4 @@ def starting(message: types.Message):
     :param message: сообщение пользователя
     :type message: telebot.types.Message
     """
-    greeting = ('Привет! Я - бот турагентства Too Easy Travel.\n'
-                'Скажите, что именно вас интересует, и я подберу лучшие варианты.\n'
-                'Можете выбрать команду /help, и появится список моих возможностей.')
-    hotels_bot.send_message(message.from_user.id, greeting)
+    await send_message(message.from_user.id, GREETING_TEXT)
@@ -2,5 +2,7 @@
 Пакет модулей 'keyboards' экспортирует следующие модули:
 
 size_9_keyboard - модуль экспортирует виртуальную клавиатуру 3х3 для удобства работы пользователя.
+history_keyboard - модуль экспортирует виртуальные клавиатуры для постраничного просмотра истории поиска.
 """
+from keyboards import history_keyboard # noqa F401
 from keyboards import size_9_keyboard # noqa F401
@@ -0,0 +1,42 @@
+from typing import Iterable, Tuple  # noqa: D100
+
+from telebot import types
+
+
+def get_history_keyboard(search_requests: Iterable[Tuple[int, str]]) -> types.InlineKeyboardMarkup:
+    """
+    Функция, создающая виртуальную клавиатуру со списком сохранённых поисковых запросов пользователя.
+    Каждая кнопка открывает первую страницу результатов соответствующего запроса.
+
+    :param search_requests: пары (ID запроса, дата и время запроса)
+    :type search_requests: Iterable[Tuple[int, str]]
+
+    :return: keyboard
+    :rtype: telebot.types.InlineKeyboardMarkup
+    """
+    keyboard = types.InlineKeyboardMarkup(row_width=1)
+    keys = [types.InlineKeyboardButton(text='Показать: {date}'.format(date=search_date),
+                                       callback_data='history:{id}:0'.format(id=request_id))
+            for request_id, search_date in search_requests]
+    keyboard.add(*keys)
+    return keyboard
+
+
+def get_next_page_keyboard(request_id: int, page: int) -> types.InlineKeyboardMarkup:
+    """
+    Функция, создающая виртуальную клавиатуру с кнопкой перехода к следующей странице
+    результатов сохранённого поискового запроса.
+
+    :param request_id: ID поискового запроса
+    :type request_id: int
+
+    :param page: номер следующей страницы
+    :type page: int
+
+    :return: keyboard
+    :rtype: telebot.types.InlineKeyboardMarkup
+    """
+    keyboard = types.InlineKeyboardMarkup()
+    keyboard.add(types.InlineKeyboardButton(text='Следующая страница',
+                                            callback_data='history:{id}:{page}'.format(id=request_id, page=page)))
+    return keyboard
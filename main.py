@@ -2,16 +2,55 @@
 Основной скрипт проекта, с которого производится запуск работы бота:
 устанавливаются команды, по которым происходит работа с ботом,
 и запускается бесконечное 'прослушивание' сообщений от пользователя.
+Режим работы бота выбирается переменной окружения BOT_MODE (см. модуль config).
+
+Чтобы перезапуск бота занимал как можно меньше времени, меню команд устанавливается только при его
+изменении (см. модуль set_bot_commands), а сохранённые кэши загружаются в фоновом потоке,
+пока бот уже принимает сообщения. Объект TeleBot создаётся только в режимах polling и webhook
+(config.get_hotels_bot).
 """
-from config import hotels_bot
+import threading
+
+from config import BOT_MODE, METRICS_HOST, METRICS_PORT, get_hotels_bot
+
+from engine import register_handlers, synchronous
 
 import handlers  # noqa: F401
 
 import keyboards  # noqa: F401
 
+from metrics import start_metrics_server
+
 from set_bot_commands import set_default_commands
 
+from utils import load_persisted_data
+
+
+def start_background_loading() -> None:
+    """Функция запускает фоновый поток, который загружает сохранённые кэши и базу истории поиска."""
+    threading.Thread(target=load_persisted_data, name='PersistedDataLoader', daemon=True).start()
+
 
 if __name__ == '__main__':
-    set_default_commands(hotels_bot)
-    hotels_bot.infinity_polling()
+    if METRICS_PORT:
+        start_metrics_server(METRICS_HOST, METRICS_PORT)
+    if BOT_MODE == 'async':
+        import asyncio
+
+        import async_engine
+
+        asyncio.run(async_engine.async_main())
+    elif BOT_MODE == 'webhook':
+        from webhook import run_webhook
+
+        hotels_bot = get_hotels_bot()
+        register_handlers(hotels_bot, synchronous)
+        set_default_commands(hotels_bot)
+        start_background_loading()
+        run_webhook()
+    else:
+        hotels_bot = get_hotels_bot()
+        register_handlers(hotels_bot, synchronous)
+        set_default_commands(hotels_bot)
+        start_background_loading()
+        hotels_bot.infinity_polling()
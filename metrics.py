@@ -0,0 +1,435 @@
+"""
+Модуль метрик работы бота.
+
+Собираются:
+- количество запросов к API Hotels.com, их длительность и ошибки (по коду ответа) для каждого endpoint;
+- остаток квоты RapidAPI (по заголовкам ответа X-RateLimit-*);
+- количество и длительность запросов к API Telegram (отправка сообщений и фото) и их ошибки;
+- количество вызовов и длительность обработчиков команд, длительность поиска для каждой команды;
+- статистика кэшей, объединения запросов и планировщика отправки (через функции-сборщики, register_collector).
+
+Метрики выводятся в текстовом формате Prometheus: локальным HTTP-сервером (METRICS_PORT, путь /metrics)
+и командой бота /metrics, доступной только администраторам (ADMIN_IDS).
+"""
+
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    """
+    Функция форматирует метки метрики для текстового формата Prometheus.
+
+    :param labels: метки (название - значение)
+    :type labels: Dict[str, str]
+
+    :rtype: str
+    """
+    if not labels:
+        return ''
+    escaped = ('{name}="{value}"'.format(name=name, value=str(value).replace('\\', '\\\\').replace('"', '\\"'))
+               for name, value in labels.items())
+    return '{' + ','.join(escaped) + '}'
+
+
+class Metric:
+    """
+    Базовый класс метрики с метками.
+
+    :param name: название метрики
+    :type name: str
+
+    :param documentation: описание метрики
+    :type documentation: str
+
+    :param labelnames: названия меток
+    :type labelnames: Sequence[str]
+    """
+
+    metric_type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = dict()
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def labels(self, labelvalues: Sequence[Any]) -> Dict[str, str]:
+        """
+        Метод сопоставляет значения меток их названиям.
+
+        :param labelvalues: значения меток
+        :type labelvalues: Sequence[Any]
+
+        :rtype: Dict[str, str]
+        """
+        return dict(zip(self.labelnames, (str(value) for value in labelvalues)))
+
+    def samples(self) -> List[Sample]:
+        """
+        Метод возвращает значения метрики: список троек (название, метки, значение).
+
+        :rtype: List[Sample]
+        """
+        with self._lock:
+            return [(self.name, self.labels(key), value) for key, value in self._values.items()]
+
+
+class Counter(Metric):
+    """Класс счётчика (значение только увеличивается)."""
+
+    metric_type = 'counter'
+
+    def inc(self, *labelvalues: Any, amount: float = 1) -> None:
+        """
+        Метод увеличивает счётчик с заданными значениями меток.
+
+        :param labelvalues: значения меток
+        :type labelvalues: Any
+
+        :param amount: величина увеличения
+        :type amount: float
+        """
+        key = tuple(str(value) for value in labelvalues)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """Класс метрики с текущим значением."""
+
+    metric_type = 'gauge'
+
+    def set(self, value: float, *labelvalues: Any) -> None:
+        """
+        Метод устанавливает значение метрики с заданными значениями меток.
+
+        :param value: значение
+        :type value: float
+
+        :param labelvalues: значения меток
+        :type labelvalues: Any
+        """
+        with self._lock:
+            self._values[tuple(str(label) for label in labelvalues)] = value
+
+
+class Histogram(Metric):
+    """
+    Класс гистограммы: количество наблюдений по корзинам (buckets), их сумма и количество.
+
+    :param buckets: верхние границы корзин
+    :type buckets: Sequence[float]
+    """
+
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labelvalues: Any) -> None:
+        """
+        Метод добавляет наблюдение в гистограмму с заданными значениями меток.
+
+        :param value: наблюдаемое значение (например, длительность в секундах)
+        :type value: float
+
+        :param labelvalues: значения меток
+        :type labelvalues: Any
+        """
+        key = tuple(str(label) for label in labelvalues)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, *labelvalues: Any) -> Iterator[None]:
+        """
+        Контекстный менеджер, измеряющий длительность выполнения блока кода.
+
+        :param labelvalues: значения меток
+        :type labelvalues: Any
+        """
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, *labelvalues)
+
+    def samples(self) -> List[Sample]:
+        """
+        Метод возвращает значения гистограммы в формате Prometheus (_bucket, _sum, _count).
+
+        :rtype: List[Sample]
+        """
+        samples: List[Sample] = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                labels = self.labels(key)
+                for bound, bucket_count in zip(self.buckets, counts):
+                    samples.append((self.name + '_bucket', dict(labels, le=str(bound)), bucket_count))
+                samples.append((self.name + '_bucket', dict(labels, le='+Inf'), count))
+                samples.append((self.name + '_sum', labels, total))
+                samples.append((self.name + '_count', labels, count))
+        return samples
+
+    def totals(self) -> Dict[Tuple[str, ...], Tuple[int, float]]:
+        """
+        Метод возвращает количество и сумму наблюдений для каждого набора значений меток.
+
+        :rtype: Dict[Tuple[str, ...], Tuple[int, float]]
+        """
+        with self._lock:
+            return {key: (count, total) for key, (_, total, count) in self._values.items()}
+
+
+REGISTRY: List[Metric] = []
+COLLECTORS: List[Callable[[], List[Tuple[str, str, str, List[Sample]]]]] = []
+STATS_SOURCES: Dict[str, Dict[str, Callable[[], Dict]]] = dict()
+
+API_REQUESTS = Counter('hotels4_requests_total', 'Запросы к API Hotels.com', ('endpoint',))
+API_ERRORS = Counter('hotels4_errors_total', 'Ошибки запросов к API Hotels.com', ('endpoint', 'status'))
+API_LATENCY = Histogram('hotels4_request_duration_seconds', 'Длительность запросов к API Hotels.com', ('endpoint',))
+API_QUOTA = Gauge('hotels4_quota', 'Квота RapidAPI по заголовкам X-RateLimit-*', ('kind',))
+TELEGRAM_REQUESTS = Counter('telegram_requests_total', 'Запросы к API Telegram', ('method',))
+TELEGRAM_ERRORS = Counter('telegram_errors_total', 'Ошибки запросов к API Telegram', ('method', 'status'))
+TELEGRAM_LATENCY = Histogram('telegram_request_duration_seconds', 'Длительность запросов к API Telegram', ('method',))
+HANDLER_CALLS = Counter('bot_handler_calls_total', 'Вызовы обработчиков команд', ('handler',))
+HANDLER_LATENCY = Histogram('bot_handler_duration_seconds', 'Длительность обработчиков команд', ('handler',))
+SEARCH_LATENCY = Histogram('bot_search_duration_seconds', 'Длительность поиска отелей (от ввода последнего '
+                           'ответа до вывода результатов)', ('command',))
+PREFETCH = Counter('hotels4_prefetch_total', 'Упреждающие запросы списка отелей (started - начат, used - '
+                   'использован поиском, failed - завершился ошибкой, stale - параметры поиска изменились)',
+                   ('outcome',))
+API_RETRY_TOTAL = Counter('hotels4_retries_total', 'Повторы запросов к API Hotels.com', ('endpoint',))
+API_HEDGES = Counter('hotels4_hedges_total', 'Дублирующие запросы к API Hotels.com (sent - отправлен, '
+                     'won - ответил раньше основного, denied - не отправлен: исчерпан бюджет дублей)',
+                     ('endpoint', 'outcome'))
+
+
+QUOTA_HEADERS = {'requests_limit': 'X-RateLimit-Requests-Limit',
+                 'requests_remaining': 'X-RateLimit-Requests-Remaining'}
+
+
+def record_api_call(endpoint: str, duration: float, status: Any, headers: Optional[Mapping[str, str]] = None) -> None:
+    """
+    Функция учитывает запрос к API Hotels.com: количество, длительность, ошибку (если код ответа не 200)
+    и остаток квоты RapidAPI из заголовков ответа.
+
+    :param endpoint: часть url, отвечающая за конкретный запрос
+    :type endpoint: str
+
+    :param duration: длительность запроса (в секундах)
+    :type duration: float
+
+    :param status: код ответа или вид ошибки ('network', 'invalid_json')
+    :type status: Any
+
+    :param headers: заголовки ответа
+    :type headers: Mapping[str, str] | None
+    """
+    API_REQUESTS.inc(endpoint)
+    API_LATENCY.observe(duration, endpoint)
+    if status != 200:
+        API_ERRORS.inc(endpoint, status)
+    for kind, header in QUOTA_HEADERS.items():
+        if headers and header in headers:
+            try:
+                API_QUOTA.set(float(headers[header]), kind)
+            except ValueError:
+                pass
+
+
+def record_telegram_call(method: str, duration: float, error: Optional[Exception] = None) -> None:
+    """
+    Функция учитывает запрос к API Telegram: количество, длительность и ошибку (по коду ошибки Telegram).
+
+    :param method: название метода бота (например, send_message)
+    :type method: str
+
+    :param duration: длительность запроса (в секундах)
+    :type duration: float
+
+    :param error: исключение, возникшее при запросе
+    :type error: Exception | None
+    """
+    TELEGRAM_REQUESTS.inc(method)
+    TELEGRAM_LATENCY.observe(duration, method)
+    if error is not None:
+        TELEGRAM_ERRORS.inc(method, getattr(error, 'error_code', None) or 'network')
+
+
+def register_collector(collector: Callable[[], List[Tuple[str, str, str, List[Sample]]]]) -> None:
+    """
+    Функция регистрирует сборщик метрик, значения которых вычисляются при выводе
+    (например, статистика кэша). Сборщик возвращает список четвёрок (название, тип, описание, значения).
+
+    :param collector: функция-сборщик
+    :type collector: Callable
+    """
+    COLLECTORS.append(collector)
+
+
+def register_stats(name: str, documentation: str, label: str, stats_sources: Dict[str, Callable[[], Dict]]) -> None:
+    """
+    Функция регистрирует сборщик для объектов со статистикой в виде словаря (методы stats()):
+    каждое поле статистики выводится отдельной метрикой name_<поле> с меткой label.
+    Повторная регистрация с тем же name добавляет источники к уже зарегистрированному сборщику, поэтому
+    каждая метрика выводится одним семейством (например, hotels4_singleflight синхронного и асинхронного режимов).
+
+    :param name: префикс названия метрик
+    :type name: str
+
+    :param documentation: описание метрик
+    :type documentation: str
+
+    :param label: название метки, значение которой - ключ словаря stats_sources
+    :type label: str
+
+    :param stats_sources: функции, возвращающие статистику (например, {'location': location_cache.stats})
+    :type stats_sources: Dict[str, Callable[[], Dict]]
+    """
+    if name in STATS_SOURCES:
+        STATS_SOURCES[name].update(stats_sources)
+        return
+    sources = STATS_SOURCES[name] = dict(stats_sources)
+
+    def collector() -> List[Tuple[str, str, str, List[Sample]]]:
+        families: Dict[str, List[Sample]] = dict()
+        for source_name, stats in list(sources.items()):
+            for field, value in stats().items():
+                metric_name = '{name}_{field}'.format(name=name, field=field)
+                families.setdefault(metric_name, []).append((metric_name, {label: source_name}, value))
+        return [(metric_name, 'gauge', documentation, samples) for metric_name, samples in families.items()]
+
+    register_collector(collector)
+
+
+def timed_handler(handler_name: str) -> Callable:
+    """
+    Декоратор обработчика команды: считает вызовы обработчика и измеряет их длительность.
+    Подходит и для обычных функций, и для корутинных (см. модуль engine).
+
+    :param handler_name: название обработчика в метриках
+    :type handler_name: str
+
+    :rtype: Callable
+    """
+    def decorator(function: Callable) -> Callable:
+        if inspect.iscoroutinefunction(function):
+            @wraps(function)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                HANDLER_CALLS.inc(handler_name)
+                with HANDLER_LATENCY.time(handler_name):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            HANDLER_CALLS.inc(handler_name)
+            with HANDLER_LATENCY.time(handler_name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def render() -> str:
+    """
+    Функция выводит все метрики в текстовом формате Prometheus.
+
+    :rtype: str
+    """
+    families = [(metric.name, metric.metric_type, metric.documentation, metric.samples()) for metric in REGISTRY]
+    for collector in COLLECTORS:
+        families.extend(collector())
+
+    lines = []
+    for name, metric_type, documentation, samples in families:
+        lines.append('# HELP {name} {doc}'.format(name=name, doc=documentation))
+        lines.append('# TYPE {name} {type}'.format(name=name, type=metric_type))
+        lines.extend('{name}{labels} {value}'.format(name=sample_name, labels=format_labels(labels), value=value)
+                     for sample_name, labels, value in samples)
+    return '\n'.join(lines) + '\n'
+
+
+def summary_text() -> str:
+    """
+    Функция составляет краткую сводку метрик для администратора: запросы к API Hotels.com
+    по endpoint (количество, ошибки, средняя длительность), остаток квоты, длительность поиска и обработчиков.
+
+    :rtype: str
+    """
+    errors: Dict[str, float] = dict()
+    for _, labels, value in API_ERRORS.samples():
+        errors[labels['endpoint']] = errors.get(labels['endpoint'], 0) + value
+
+    lines = ['Запросы к API Hotels.com:']
+    for (endpoint,), (count, total) in sorted(API_LATENCY.totals().items()):
+        lines.append('{endpoint}: {count} запр., ошибок {errors:g}, в среднем {mean:.2f} с'.format(
+                     endpoint=endpoint, count=count, errors=errors.get(endpoint, 0), mean=total / count))
+    lines.extend('Квота ({kind}): {value:g}'.format(kind=labels['kind'], value=value)
+                 for _, labels, value in API_QUOTA.samples())
+    for title, histogram in (('Поиск', SEARCH_LATENCY), ('Обработчики', HANDLER_LATENCY)):
+        lines.append('\n{title}:'.format(title=title))
+        lines.extend('{label}: {count}, в среднем {mean:.2f} с'.format(label=key[0], count=count, mean=total / count)
+                     for key, (count, total) in sorted(histogram.totals().items()))
+    for collector in COLLECTORS:
+        for name, _, _, samples in collector():
+            lines.extend('{name}{labels}: {value:g}'.format(name=name, labels=format_labels(labels), value=value)
+                         for _, labels, value in samples)
+    return '\n'.join(lines)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Класс обработчика HTTP-запросов к странице метрик."""
+
+    def do_GET(self) -> None:  # noqa: N802
+        """Метод отдаёт метрики в текстовом формате Prometheus."""
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        """Метод отключает вывод в консоль строки о каждом запросе."""
+
+
+def start_metrics_server(host: str, port: int) -> ThreadingHTTPServer:
+    """
+    Функция запускает в фоновом потоке HTTP-сервер, который отдаёт метрики по пути /metrics.
+
+    :param host: адрес сервера
+    :type host: str
+
+    :param port: порт сервера
+    :type port: int
+
+    :rtype: http.server.ThreadingHTTPServer
+    """
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True, name='MetricsServer').start()
+    return server
@@ -0,0 +1,411 @@
+"""
+Модуль планировщика исходящих запросов к API Telegram.
+
+Telegram ограничивает частоту отправки сообщений ботом: около TG_GLOBAL_RATE сообщений в секунду
+всего и около TG_CHAT_RATE сообщений в секунду в один чат. При превышении лимитов API возвращает
+ошибку 429 с параметром retry_after, и ответы пользователям теряются или задерживаются.
+
+Поэтому все сообщения и фото отправляются через планировщик (OutboundScheduler):
+- перед отправкой запрос получает разрешение у общего лимитера (token bucket) и лимитера своего чата;
+  в общем лимитере запрос стоит столько, сколько сообщений он создаёт (альбом - по числу фото), а в лимитере
+  чата любой запрос (в том числе альбом) стоит 1: Telegram ограничивает частоту запросов в чат, а не фото,
+  поэтому 9 альбомов по 6 фото уходят в чат примерно за 7 секунд (а не за 50, как при оплате каждого фото);
+- ожидающие разрешения запросы разных чатов обслуживаются по очереди (round-robin), поэтому
+  длинная выдача одному пользователю не задерживает ответы остальным;
+- при ошибке 429 чат блокируется на retry_after секунд, и запрос повторяется (не более TG_MAX_RETRIES раз).
+
+Сам запрос выполняется в потоке, который его отправил, - планировщик только решает, когда его можно отправить.
+Асинхронные запросы (async_call) ждут разрешения в asyncio.Future, которую поток планировщика завершает
+через цикл событий, поэтому ожидание не занимает потоков.
+Сообщения отправляются через общий планировщик outbound_scheduler (см. engine.Engine.send).
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from config import TG_CHAT_BURST, TG_CHAT_RATE, TG_GLOBAL_RATE, TG_MAX_RETRIES
+
+from metrics import record_telegram_call, register_stats
+
+from tracing import current_span
+
+
+class TokenBucket:
+    """
+    Класс лимитера частоты запросов (token bucket): токены восстанавливаются со скоростью rate в секунду
+    до capacity, каждый запрос забирает cost токенов.
+
+    :param rate: скорость восстановления токенов (запросов в секунду)
+    :type rate: float
+
+    :param capacity: максимальное количество токенов (допустимый всплеск запросов)
+    :type capacity: float
+    """
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated', 'blocked_until')
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def wait_time(self, now: float, cost: float) -> float:
+        """
+        Метод возвращает время (в секундах), через которое можно будет выполнить запрос стоимостью cost.
+        Запрос дороже capacity (например, альбом из 10 фото) выполняется при полном лимитере и уводит его в минус.
+
+        :param now: текущее время (time.monotonic)
+        :type now: float
+
+        :param cost: стоимость запроса в общем лимитере (см. acquire)
+        :type cost: float
+
+        :rtype: float
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.blocked_until > now:
+            return self.blocked_until - now
+        need = min(cost, self.capacity)
+        return 0.0 if self.tokens >= need else (need - self.tokens) / self.rate
+
+    def is_idle(self, now: float) -> bool:
+        """
+        Метод проверяет, восстановился ли лимитер полностью (такой лимитер можно удалить и создать заново).
+
+        :param now: текущее время (time.monotonic)
+        :type now: float
+
+        :rtype: bool
+        """
+        return self.blocked_until <= now and self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class _Ticket:
+    """
+    Класс запроса, ожидающего разрешения на отправку: grant вызывается потоком планировщика
+    при выдаче разрешения.
+    """
+
+    __slots__ = ('cost', 'grant')
+
+    def __init__(self, cost: float, grant: Callable[[], Any]) -> None:
+        self.cost = cost
+        self.grant = grant
+
+
+def _resolve(future: asyncio.Future) -> None:
+    """
+    Функция отмечает, что ожидающий в цикле событий запрос получил разрешение (если его ещё ждут).
+
+    :param future: ожидание разрешения
+    :type future: asyncio.Future
+    """
+    if not future.done():
+        future.set_result(None)
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """
+    Функция возвращает время ожидания из ответа API Telegram с ошибкой 429 (Too Many Requests).
+
+    :param error: исключение, возникшее при запросе к API Telegram
+    :type error: Exception
+
+    :return: время ожидания (в секундах) или None, если это не ошибка 429
+    :rtype: float | None
+    """
+    if getattr(error, 'error_code', None) != 429:
+        return None
+    result_json = getattr(error, 'result_json', None) or dict()
+    return float(result_json.get('parameters', dict()).get('retry_after', 1))
+
+
+class OutboundScheduler:
+    """
+    Класс планировщика исходящих запросов к API Telegram с общим лимитером и лимитерами чатов.
+
+    :param global_rate: общая допустимая частота запросов (в секунду)
+    :type global_rate: float
+
+    :param chat_rate: допустимая частота запросов в один чат (в секунду)
+    :type chat_rate: float
+
+    :param chat_burst: допустимый всплеск запросов в один чат
+    :type chat_burst: float
+
+    :param max_retries: максимальное количество повторов запроса после ошибки 429
+    :type max_retries: int
+    """
+
+    BUCKETS_CLEANUP_INTERVAL = 60
+
+    def __init__(self, global_rate: float, chat_rate: float, chat_burst: float, max_retries: int) -> None:
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.granted = 0
+        self.throttled = 0
+        self._chat_buckets: Dict[int, TokenBucket] = dict()
+        self._pending: Dict[int, Deque[_Ticket]] = dict()
+        self._active: Deque[int] = deque()
+        self._condition = threading.Condition()
+        self._dispatcher: Optional[threading.Thread] = None
+        self._cleaned_at = time.monotonic()
+
+    def acquire(self, chat_id: int, cost: float = 1) -> None:
+        """
+        Метод ставит запрос в очередь чата и ждёт разрешения на его отправку.
+
+        :param chat_id: ID чата
+        :type chat_id: int
+
+        :param cost: стоимость запроса в общем лимитере (количество сообщений, которые он создаёт)
+        :type cost: float
+        """
+        granted = threading.Event()
+        self._enqueue(chat_id, _Ticket(cost, granted.set))
+        granted.wait()
+
+    async def async_acquire(self, chat_id: int, cost: float = 1) -> None:
+        """
+        Асинхронный вариант метода acquire: разрешение ожидается в цикле событий, а не в потоке.
+        Если ожидание отменено, запрос удаляется из очереди чата.
+
+        :param chat_id: ID чата
+        :type chat_id: int
+
+        :param cost: стоимость запроса в общем лимитере (количество сообщений, которые он создаёт)
+        :type cost: float
+        """
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+        ticket = _Ticket(cost, lambda: loop.call_soon_threadsafe(_resolve, granted))
+        self._enqueue(chat_id, ticket)
+        try:
+            await granted
+        except asyncio.CancelledError:
+            self._withdraw(chat_id, ticket)
+            raise
+
+    def _enqueue(self, chat_id: int, ticket: _Ticket) -> None:
+        """
+        Метод ставит запрос в очередь чата (и при первом вызове запускает поток планировщика).
+
+        :param chat_id: ID чата
+        :type chat_id: int
+
+        :param ticket: запрос, ожидающий разрешения
+        :type ticket: _Ticket
+        """
+        with self._condition:
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch, daemon=True, name='OutboundScheduler')
+                self._dispatcher.start()
+            if chat_id not in self._pending:
+                self._pending[chat_id] = deque()
+                self._active.append(chat_id)
+            self._pending[chat_id].append(ticket)
+            self._condition.notify()
+
+    def _withdraw(self, chat_id: int, ticket: _Ticket) -> None:
+        """
+        Метод удаляет из очереди чата запрос, который больше не ждёт разрешения (если оно ещё не выдано).
+
+        :param chat_id: ID чата
+        :type chat_id: int
+
+        :param ticket: запрос, ожидающий разрешения
+        :type ticket: _Ticket
+        """
+        with self._condition:
+            tickets = self._pending.get(chat_id)
+            if tickets is None or ticket not in tickets:
+                return
+            tickets.remove(ticket)
+            if not tickets:
+                del self._pending[chat_id]
+                self._active.remove(chat_id)
+
+    def block(self, chat_id: int, seconds: float) -> None:
+        """
+        Метод приостанавливает отправку запросов в чат (после ошибки 429 с параметром retry_after).
+
+        :param chat_id: ID чата
+        :type chat_id: int
+
+        :param seconds: время приостановки (в секундах)
+        :type seconds: float
+        """
+        with self._condition:
+            bucket = self._chat_bucket(chat_id)
+            bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + seconds)
+            self.throttled += 1
+
+    def call(self, function: Callable[..., Any], chat_id: int, *args: Any, cost: float = 1, **kwargs: Any) -> Any:
+        """
+        Метод выполняет запрос function(chat_id, *args, **kwargs) к API Telegram, когда это позволяют лимиты.
+        После ошибки 429 запрос повторяется через retry_after секунд.
+
+        :param function: метод бота (например, hotels_bot.send_message)
+        :type function: Callable
+
+        :param chat_id: ID чата
+        :type chat_id: int
+
+        :param cost: стоимость запроса в общем лимитере (см. acquire)
+        :type cost: float
+
+        :return: результат запроса
+        """
+        with current_span('send', method=function.__name__, cost=cost):
+            for attempt in range(self.max_retries + 1):
+                self.acquire(chat_id, cost)
+                started = time.monotonic()
+                try:
+                    result = function(chat_id, *args, **kwargs)
+                except Exception as error:
+                    record_telegram_call(function.__name__, time.monotonic() - started, error)
+                    seconds = retry_after(error)
+                    if seconds is None or attempt == self.max_retries:
+                        raise
+                    self.block(chat_id, seconds)
+                else:
+                    record_telegram_call(function.__name__, time.monotonic() - started)
+                    return result
+
+    async def async_call(self,
+                         function: Callable[..., Awaitable[Any]],
+                         chat_id: int,
+                         *args: Any,
+                         cost: float = 1,
+                         **kwargs: Any) -> Any:
+        """
+        Асинхронный вариант метода call (для AsyncTeleBot): разрешение ожидается в цикле событий
+        (async_acquire), не блокируя его и не занимая потоков.
+
+        :param function: корутинный метод бота (например, async_hotels_bot.send_message)
+        :type function: Callable
+
+        :param chat_id: ID чата
+        :type chat_id: int
+
+        :param cost: стоимость запроса в общем лимитере (см. acquire)
+        :type cost: float
+
+        :return: результат запроса
+        """
+        with current_span('send', method=function.__name__, cost=cost):
+            for attempt in range(self.max_retries + 1):
+                await self.async_acquire(chat_id, cost)
+                started = time.monotonic()
+                try:
+                    result = await function(chat_id, *args, **kwargs)
+                except Exception as error:
+                    record_telegram_call(function.__name__, time.monotonic() - started, error)
+                    seconds = retry_after(error)
+                    if seconds is None or attempt == self.max_retries:
+                        raise
+                    self.block(chat_id, seconds)
+                else:
+                    record_telegram_call(function.__name__, time.monotonic() - started)
+                    return result
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Метод возвращает статистику планировщика.
+
+        :return: словарь с количеством ожидающих запросов (pending), чатов с ожидающими запросами (chats),
+            наибольшей очередью одного чата (max_chat_pending), выданных разрешений (granted)
+            и полученных ошибок 429 (throttled)
+        :rtype: Dict[str, int]
+        """
+        with self._condition:
+            queue_sizes = [len(tickets) for tickets in self._pending.values()]
+            return {'pending': sum(queue_sizes), 'chats': len(queue_sizes),
+                    'max_chat_pending': max(queue_sizes, default=0),
+                    'granted': self.granted, 'throttled': self.throttled}
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        """
+        Метод возвращает лимитер чата, создавая его при необходимости.
+
+        :param chat_id: ID чата
+        :type chat_id: int
+
+        :rtype: TokenBucket
+        """
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _dispatch(self) -> None:
+        """Метод потока планировщика: выдаёт разрешения и ждёт, пока лимиты позволят выдать следующие."""
+        with self._condition:
+            while True:
+                self._condition.wait(self._grant(time.monotonic()))
+
+    def _grant(self, now: float) -> Optional[float]:
+        """
+        Метод выдаёт разрешения ожидающим запросам, обходя чаты по очереди (за один проход - не более
+        одного разрешения на чат). Запрос забирает ticket.cost токенов общего лимитера и один токен
+        лимитера чата. Вызывается под блокировкой.
+
+        :param now: текущее время (time.monotonic)
+        :type now: float
+
+        :return: время (в секундах) до момента, когда можно будет выдать следующее разрешение,
+            или None, если ожидающих запросов нет
+        :rtype: float | None
+        """
+        while True:
+            next_wait: Optional[float] = None
+            granted_in_pass = False
+            for _ in range(len(self._active)):
+                chat_id = self._active.popleft()
+                tickets = self._pending[chat_id]
+                ticket = tickets[0]
+                chat_bucket = self._chat_bucket(chat_id)
+                wait = max(chat_bucket.wait_time(now, 1), self.global_bucket.wait_time(now, ticket.cost))
+                if wait == 0:
+                    chat_bucket.tokens -= 1
+                    self.global_bucket.tokens -= ticket.cost
+                    tickets.popleft()
+                    ticket.grant()
+                    self.granted += 1
+                    granted_in_pass = True
+                else:
+                    next_wait = wait if next_wait is None else min(next_wait, wait)
+                if tickets:
+                    self._active.append(chat_id)
+                else:
+                    del self._pending[chat_id]
+            if not granted_in_pass or not self._active:
+                break
+        if now - self._cleaned_at > self.BUCKETS_CLEANUP_INTERVAL:
+            self._cleanup(now)
+        return next_wait
+
+    def _cleanup(self, now: float) -> None:
+        """
+        Метод удаляет полностью восстановившиеся лимитеры чатов без ожидающих запросов,
+        чтобы их количество не росло с количеством пользователей.
+
+        :param now: текущее время (time.monotonic)
+        :type now: float
+        """
+        self._chat_buckets = {chat_id: bucket for chat_id, bucket in self._chat_buckets.items()
+                              if chat_id in self._pending or not bucket.is_idle(now)}
+        self._cleaned_at = now
+
+
+outbound_scheduler = OutboundScheduler(TG_GLOBAL_RATE, TG_CHAT_RATE, TG_CHAT_BURST, TG_MAX_RETRIES)
+register_stats('telegram_outbound', 'Очередь планировщика отправки сообщений', 'scheduler',
+               {'outbound': outbound_scheduler.stats})
@@ -0,0 +1,172 @@
+"""
+Модуль ранжирования отелей для команды bestdeal.
+
+Цена и расстояние от центра каждого отеля (records.ListedHotel) разбираются один раз и хранятся в числовых массивах
+таблицы кандидатов (CandidateTable). Фильтрация по предельным цене и расстоянию и оценка кандидатов
+выполняются по этим массивам, а лучшие отели выбираются с помощью кучи (heapq.nsmallest) без
+полной сортировки всех кандидатов.
+"""
+
+import heapq
+import re
+from array import array
+from typing import Iterable, List, Optional
+
+from records import ListedHotel, PropertiesPage
+
+DISTANCE_PATTERN = re.compile(r'\d+(?:[.,]\d+)?')
+
+
+def parse_distance(distance: str) -> float:
+    """
+    Функция переводит расстояние от центра из строки API (например, '10,2 км') в число.
+
+    :param distance: расстояние от центра в виде строки
+    :type distance: str
+
+    :return: расстояние от центра (в км)
+    :rtype: float
+
+    :raises AttributeError: если в строке нет числа
+    """
+    return float(DISTANCE_PATTERN.search(distance).group().replace(',', '.'))
+
+
+class CandidateTable:
+    """
+    Класс таблицы кандидатов: цены и расстояния отелей хранятся в массивах array('d'),
+    сами отели из списка отелей - в списке с теми же индексами.
+    Отели, у которых нет цены или расстояния от центра, в таблицу не попадают.
+    """
+
+    __slots__ = ('prices', 'distances', 'hotels')
+
+    def __init__(self) -> None:
+        self.prices = array('d')
+        self.distances = array('d')
+        self.hotels: List[ListedHotel] = []
+
+    def __len__(self) -> int:
+        return len(self.hotels)
+
+    def extend(self, city_hotels: Iterable[ListedHotel]) -> None:
+        """
+        Метод добавляет в таблицу отели из списка отелей, разбирая их расстояние от центра.
+
+        :param city_hotels: отели из списка отелей, полученного от API
+        :type city_hotels: Iterable[records.ListedHotel]
+        """
+        for i_hotel in city_hotels:
+            if i_hotel.price is None or i_hotel.distance is None:
+                continue
+            try:
+                distance = parse_distance(i_hotel.distance)
+            except AttributeError:
+                continue
+            self.prices.append(i_hotel.price)
+            self.distances.append(distance)
+            self.hotels.append(i_hotel)
+
+    def matches(self, max_price: float, max_distance: float) -> List[int]:
+        """
+        Метод возвращает индексы отелей, которые подходят по предельным цене и расстоянию от центра.
+
+        :param max_price: максимальная цена за ночь
+        :type max_price: float
+
+        :param max_distance: максимальное расстояние от центра
+        :type max_distance: float
+
+        :rtype: List[int]
+        """
+        prices, distances = self.prices, self.distances
+        return [index for index in range(len(prices))
+                if prices[index] <= max_price and distances[index] <= max_distance]
+
+    def top(self, number: int, max_price: float, max_distance: float, price_weight: float) -> List[ListedHotel]:
+        """
+        Метод выбирает number лучших отелей среди подходящих по цене и расстоянию от центра.
+        Оценка отеля - взвешенная сумма его цены и расстояния, нормированных на предельные значения
+        (чем меньше, тем лучше): price_weight * цена / max_price + (1 - price_weight) * расстояние / max_distance.
+
+        :param number: количество отелей
+        :type number: int
+
+        :param max_price: максимальная цена за ночь
+        :type max_price: float
+
+        :param max_distance: максимальное расстояние от центра
+        :type max_distance: float
+
+        :param price_weight: вес цены в оценке (от 0 до 1), вес расстояния равен 1 - price_weight
+        :type price_weight: float
+
+        :return: отели от лучшего к худшему
+        :rtype: List[records.ListedHotel]
+        """
+        prices, distances = self.prices, self.distances
+        price_factor = price_weight / max(max_price, 1e-9)
+        distance_factor = (1 - price_weight) / max(max_distance, 1e-9)
+        winners = heapq.nsmallest(number, self.matches(max_price, max_distance),
+                                  key=lambda index: (prices[index] * price_factor + distances[index] * distance_factor,
+                                                     index))
+        return [self.hotels[index] for index in winners]
+
+
+class HotelsSelection:
+    """
+    Класс отбора отелей для вывода из просмотренных страниц списка отелей (см. utils.search_for_matches);
+    страницы запрашивает вызывающий код.
+
+    Если заданы предельные цена и расстояние от центра (команда bestdeal), отели всех добавленных страниц
+    собираются в таблицу кандидатов, и следующая страница нужна, пока подходящих отелей меньше number;
+    иначе выводятся первые number отелей первой страницы.
+    """
+
+    __slots__ = ('number', 'max_price', 'max_distance', 'price_weight', 'viewed_pages', 'candidates')
+
+    def __init__(self,
+                 first_page: PropertiesPage,
+                 number: int,
+                 max_price: Optional[float] = None,
+                 max_distance: Optional[float] = None,
+                 price_weight: float = 0.5) -> None:
+        self.number = number
+        self.max_price = max_price
+        self.max_distance = max_distance
+        self.price_weight = price_weight
+        self.viewed_pages = [first_page]
+        self.candidates = CandidateTable() if max_price is not None and max_distance is not None else None
+        if self.candidates is not None:
+            self.candidates.extend(first_page.hotels)
+
+    def needs_more(self) -> bool:
+        """
+        Метод определяет, нужна ли следующая страница списка отелей.
+
+        :rtype: bool
+        """
+        if self.candidates is None:
+            return False
+        return len(self.candidates.matches(self.max_price, self.max_distance)) < self.number
+
+    def add(self, page: PropertiesPage) -> None:
+        """
+        Метод добавляет следующую страницу списка отелей.
+
+        :param page: страница списка отелей
+        :type page: records.PropertiesPage
+        """
+        self.viewed_pages.append(page)
+        if self.candidates is not None:
+            self.candidates.extend(page.hotels)
+
+    def hotels(self) -> List[ListedHotel]:
+        """
+        Метод возвращает отобранные отели: для bestdeal - лучшие из подходящих (см. CandidateTable.top).
+
+        :rtype: List[records.ListedHotel]
+        """
+        if self.candidates is None:
+            return self.viewed_pages[0].hotels[:self.number]
+        return self.candidates.top(self.number, self.max_price, self.max_distance, self.price_weight)
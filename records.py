@@ -0,0 +1,261 @@
+"""
+Модуль компактных записей данных, которые бот получает от API Hotels.com.
+
+Ответы API (/locations/v2/search/, /properties/list/, /properties/get-details/, /properties/get-hotel-photos/) -
+большие вложенные документы, из которых боту нужны несколько полей. Поэтому ответ декодируется из байтов
+(json_loads) и сразу же сводится к нужным полям (extract_payload), а исходный документ отбрасывается:
+объединённые запросы (singleflight), упреждающий запрос списка отелей, поисковые сессии и кэши хранят
+только компактные записи.
+
+ListedHotel - отель из списка отелей (id, название, цена за ночь, расстояние от центра).
+PropertiesPage - страница списка отелей (или отели нескольких просмотренных страниц в кэше результатов поиска).
+HotelRecord - отель в результатах поиска: его выводит пользователю модуль rendering,
+    а в историю поиска он сохраняется компактной строкой-списком (HotelRecord.as_row).
+
+Если установлена библиотека orjson, JSON декодируется ею, иначе - стандартным модулем json.
+"""
+
+import json
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from config import MAX_PHOTO_NUMBER
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+json_loads: Callable[[bytes], Any] = orjson.loads if orjson is not None else json.loads
+HOTEL_URL = 'https://www.hotels.com/ho{id}/'
+
+
+@dataclass(slots=True, frozen=True)
+class ListedHotel:
+    """
+    Класс отеля из списка отелей (/properties/list/).
+
+    hotel_id - ID отеля.
+    name - название отеля.
+    price - цена за ночь (None, если в ответе её нет).
+    distance - расстояние от центра в виде строки API, например '10,2 км' (None, если в ответе его нет).
+    """
+
+    hotel_id: int
+    name: str
+    price: Optional[float]
+    distance: Optional[str]
+
+    def as_row(self) -> List[Any]:
+        """
+        Метод возвращает отель в виде строки-списка, в котором он сохраняется в кэш результатов поиска.
+
+        :rtype: List[Any]
+        """
+        return [self.hotel_id, self.name, self.price, self.distance]
+
+
+@dataclass(slots=True, frozen=True)
+class PropertiesPage:
+    """
+    Класс страницы списка отелей (/properties/list/).
+
+    header - название города из ответа API.
+    hotels - отели страницы в порядке ответа API.
+    next_page_number - номер следующей страницы (None, если страница последняя).
+    """
+
+    header: str
+    hotels: List[ListedHotel]
+    next_page_number: Optional[int]
+
+    def as_row(self) -> List[Any]:
+        """
+        Метод возвращает страницу в виде строки-списка (её можно сохранить в JSON).
+
+        :rtype: List[Any]
+        """
+        return [self.header, [hotel.as_row() for hotel in self.hotels], self.next_page_number]
+
+    @classmethod
+    def from_row(cls, row: List[Any]) -> 'PropertiesPage':
+        """
+        Метод восстанавливает страницу из строки-списка (см. as_row).
+
+        :param row: сохранённая страница
+        :type row: List[Any]
+
+        :rtype: PropertiesPage
+        """
+        header, hotels, next_page_number = row
+        return cls(header, [ListedHotel(*hotel) for hotel in hotels], next_page_number)
+
+
+@dataclass(slots=True)
+class HotelRecord:
+    """
+    Класс отеля в результатах поиска.
+
+    hotel_id - ID отеля (None для отелей старых записей истории без ID).
+    name - название отеля.
+    price, total_price - цена за ночь и за все дни пребывания.
+    distance - расстояние от центра.
+    address - адрес (None, если его не удалось получить).
+    photos - ссылки на фото.
+    """
+
+    hotel_id: Optional[int]
+    name: str
+    price: Optional[float]
+    total_price: Optional[float]
+    distance: Optional[str]
+    address: Optional[str] = None
+    photos: List[str] = field(default_factory=list)
+
+    @property
+    def url(self) -> Optional[str]:
+        """Ссылка на страницу отеля."""
+        return HOTEL_URL.format(id=self.hotel_id) if self.hotel_id is not None else None
+
+    def card_fields(self) -> Dict[str, Any]:
+        """
+        Метод возвращает данные отеля для его карточки (кроме названия и ссылки) в порядке вывода.
+
+        :rtype: Dict[str, Any]
+        """
+        fields = {'Цена, $': self.price, 'Цена за все дни, $': self.total_price,
+                  'От центра': self.distance, 'Адрес': self.address}
+        return {header: value for header, value in fields.items() if value is not None}
+
+    def as_row(self) -> List[Any]:
+        """
+        Метод возвращает запись отеля в виде, в котором она сохраняется в историю поиска.
+
+        :rtype: List[Any]
+        """
+        return [self.hotel_id, self.name, self.price, self.total_price, self.distance, self.address, self.photos]
+
+    @classmethod
+    def from_row(cls, row: Any) -> 'HotelRecord':
+        """
+        Метод восстанавливает запись отеля из истории поиска: из строки-списка (см. as_row)
+        или из словаря, в виде которого отели сохранялись раньше.
+
+        :param row: сохранённая запись отеля
+        :type row: List[Any] | Dict[str, Any]
+
+        :rtype: HotelRecord
+        """
+        if isinstance(row, dict):
+            return cls(row.get('ID'), row.get('Название', ''), row.get('Цена, $'), row.get('Цена за все дни, $'),
+                       row.get('От центра'), row.get('Адрес'), list(row.get('Фото') or []))
+        hotel_id, name, price, total_price, distance, address, photos = row
+        return cls(hotel_id, name, price, total_price, distance, address, list(photos))
+
+
+def listed_hotel(i_hotel: Dict[str, Any]) -> ListedHotel:
+    """
+    Функция извлекает данные отеля из элемента списка отелей в ответе API.
+
+    :param i_hotel: элемент списка отелей
+    :type i_hotel: Dict[str, Any]
+
+    :rtype: ListedHotel
+    """
+    price = (i_hotel.get('ratePlan') or {}).get('price', {}).get('exactCurrent')
+    landmarks = i_hotel.get('landmarks') or ({},)
+    return ListedHotel(i_hotel['id'], i_hotel['name'], None if price is None else float(price),
+                       landmarks[0].get('distance'))
+
+
+def properties_page(payload: Dict[str, Any]) -> PropertiesPage:
+    """
+    Функция извлекает страницу списка отелей из ответа /properties/list/.
+
+    :param payload: десериализованный ответ API
+    :type payload: Dict[str, Any]
+
+    :rtype: PropertiesPage
+    """
+    body = payload['data']['body']
+    search_results = body['searchResults']
+    return PropertiesPage(body['header'], [listed_hotel(i_hotel) for i_hotel in search_results['results']],
+                          (search_results.get('pagination') or {}).get('nextPageNumber'))
+
+
+def destination_ids(payload: Dict[str, Any]) -> List[str]:
+    """
+    Функция извлекает из ответа /locations/v2/search/ destinationId найденных мест первой группы
+    (пустой список, если ничего не найдено).
+
+    :param payload: десериализованный ответ API
+    :type payload: Dict[str, Any]
+
+    :rtype: List[str]
+    """
+    suggestions = payload.get('suggestions') or ({},)
+    return [entity['destinationId'] for entity in suggestions[0].get('entities') or ()]
+
+
+def hotel_address(payload: Dict[str, Any]) -> str:
+    """
+    Функция извлекает адрес отеля из ответа /properties/get-details/.
+
+    :param payload: десериализованный ответ API
+    :type payload: Dict[str, Any]
+
+    :rtype: str
+    """
+    return payload['data']['body']['propertyDescription']['address']['fullAddress']
+
+
+def photo_urls(payload: Dict[str, Any]) -> Optional[Dict[str, List[str]]]:
+    """
+    Функция извлекает из ответа /properties/get-hotel-photos/ ссылки на фото номеров и самого отеля
+    (не более MAX_PHOTO_NUMBER каждого вида) - в таком виде ссылки хранятся в кэше photos_cache.
+    Если фото какого-то вида в ответе нет, его список пуст; номера без фото пропускаются.
+
+    :param payload: десериализованный ответ API
+    :type payload: Dict[str, Any]
+
+    :return: словарь со списками ссылок 'roomImages' и 'hotelImages'
+    :rtype: Dict[str, List[str]]
+    """
+    room_images = [room['images'][0] for room in payload.get('roomImages') or [] if room.get('images')]
+    return {
+        'roomImages': [room_image['baseUrl'].format(size='y') for room_image in room_images[:MAX_PHOTO_NUMBER]],
+        'hotelImages': [hotels_image['baseUrl'].format(size='y')
+                        for hotels_image in (payload.get('hotelImages') or [])[:MAX_PHOTO_NUMBER]]
+    }
+
+
+EXTRACTORS: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+    '/locations/v2/search/': destination_ids,
+    '/properties/list/': properties_page,
+    '/properties/get-details/': hotel_address,
+    '/properties/get-hotel-photos/': photo_urls,
+}
+
+
+def extract_payload(url_part: str, payload: Any) -> Any:
+    """
+    Функция сводит десериализованный ответ API к нужным боту полям (см. EXTRACTORS).
+    Ответы адресов, для которых извлечение не задано, возвращаются без изменений.
+
+    :param url_part: часть url, отвечающая за конкретный запрос
+    :type url_part: str
+
+    :param payload: десериализованный ответ API
+    :type payload: Any
+
+    :rtype: Any
+
+    :raises ValueError: если в ответе нет нужных полей
+    """
+    extractor = EXTRACTORS.get(url_part)
+    if extractor is None:
+        return payload
+    try:
+        return extractor(payload)
+    except (KeyError, IndexError, TypeError, AttributeError) as error:
+        raise ValueError('Unexpected {url_part} payload'.format(url_part=url_part)) from error
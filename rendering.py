@@ -0,0 +1,134 @@
+"""
+Модуль формирования сообщений с результатами поиска.
+
+Заголовок результатов и карточки отелей (records.HotelRecord; HTML-разметка, название отеля - ссылка на его страницу)
+упаковываются в как можно меньшее количество сообщений с учётом ограничения Telegram на длину
+сообщения (MESSAGE_MAX_LENGTH). Отель с фото выводится альбомом, подписью к которому служит
+его карточка (если включена настройка PHOTO_ALBUM_CAPTION и карточка не длиннее CAPTION_MAX_LENGTH).
+
+Модуль только формирует сообщения; отправляет их модуль utils через текущий движок (см. модуль engine).
+"""
+
+import html
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config import CAPTION_MAX_LENGTH, MESSAGE_MAX_LENGTH, PHOTO_ALBUM_CAPTION
+
+from records import HotelRecord
+
+PARSE_MODE = 'HTML'
+BLOCK_SEPARATOR = '\n\n'
+
+
+def html_pairs(dictionary: Dict[str, Any], *exceptions: str) -> List[str]:
+    """
+    Функция составляет список строк-пар 'заголовок: значение' из полученного словаря,
+    экранируя значения для HTML-разметки. Ключи из exceptions пропускаются.
+
+    :param dictionary: словарь, из элементов которого составляются пары
+    :type dictionary: Dict[str, Any]
+
+    :param exceptions: ключи словаря, которые следует пропускать
+    :type exceptions: str
+
+    :rtype: List[str]
+    """
+    return ['{header}: {content}'.format(header=html.escape(str(header)), content=html.escape(str(content)))
+            for header, content in dictionary.items() if header not in exceptions]
+
+
+def hotel_card(hotel: HotelRecord) -> str:
+    """
+    Функция составляет карточку отеля: название (ссылкой на страницу отеля) и остальные данные отеля.
+
+    :param hotel: запись отеля
+    :type hotel: records.HotelRecord
+
+    :rtype: str
+    """
+    name = html.escape(str(hotel.name))
+    if hotel.url:
+        name = '<a href="{link}">{name}</a>'.format(link=html.escape(hotel.url), name=name)
+    return '\n'.join(['<b>{name}</b>'.format(name=name)] + html_pairs(hotel.card_fields()))
+
+
+def split_block(block: str, limit: int) -> List[str]:
+    """
+    Функция делит блок текста длиннее limit на части по строкам
+    (строка длиннее limit разрезается).
+
+    :param block: блок текста
+    :type block: str
+
+    :param limit: максимальная длина части
+    :type limit: int
+
+    :rtype: List[str]
+    """
+    parts: List[str] = []
+    for line in block.split('\n'):
+        for start in range(0, max(len(line), 1), limit):
+            piece = line[start:start + limit]
+            if parts and len(parts[-1]) + 1 + len(piece) <= limit:
+                parts[-1] = '\n'.join((parts[-1], piece))
+            else:
+                parts.append(piece)
+    return parts
+
+
+def pack_blocks(blocks: Iterable[str], limit: int = MESSAGE_MAX_LENGTH) -> List[str]:
+    """
+    Функция упаковывает блоки текста (заголовок, карточки отелей) в как можно меньшее количество
+    сообщений не длиннее limit. Блоки не разрываются, если помещаются в одно сообщение.
+
+    :param blocks: блоки текста
+    :type blocks: Iterable[str]
+
+    :param limit: максимальная длина сообщения
+    :type limit: int
+
+    :rtype: List[str]
+    """
+    messages: List[str] = []
+    for block in blocks:
+        for part in split_block(block, limit) if len(block) > limit else (block,):
+            if messages and len(messages[-1]) + len(BLOCK_SEPARATOR) + len(part) <= limit:
+                messages[-1] = BLOCK_SEPARATOR.join((messages[-1], part))
+            else:
+                messages.append(part)
+    return messages
+
+
+def result_messages(header: str, hotels: List[HotelRecord]) -> List[Tuple[Optional[str], List[str]]]:
+    """
+    Функция формирует сообщения с результатами поиска: заголовок и карточки отелей упаковываются
+    в общие текстовые сообщения, а фото каждого отеля выводятся альбомом после его карточки
+    (или с карточкой в подписи).
+
+    :param header: заголовок результатов (HTML)
+    :type header: str
+
+    :param hotels: записи отелей
+    :type hotels: List[records.HotelRecord]
+
+    :return: список пар (текст, ссылки на фото): пара с пустым списком фото - текстовое сообщение,
+        иначе - альбом с подписью (текст может быть None)
+    :rtype: List[Tuple[str | None, List[str]]]
+    """
+    messages: List[Tuple[Optional[str], List[str]]] = []
+    blocks = [header] if header else []
+    for hotel in hotels:
+        card = hotel_card(hotel)
+        photos = hotel.photos
+        if photos and PHOTO_ALBUM_CAPTION and len(card) <= CAPTION_MAX_LENGTH:
+            messages.extend((text, []) for text in pack_blocks(blocks))
+            messages.append((card, photos))
+            blocks = []
+        elif photos:
+            messages.extend((text, []) for text in pack_blocks(blocks + [card]))
+            messages.append((None, photos))
+            blocks = []
+        else:
+            blocks.append(card)
+    messages.extend((text, []) for text in pack_blocks(blocks))
+    return messages
@@ -0,0 +1,819 @@
+"""
+Модуль устойчивости запросов к API Hotels.com.
+
+Каждый запрос к API выполняется через ResilientCaller с настройками своего адреса (API_ENDPOINTS):
+- таймаут на чтение ответа задаётся для каждого адреса (EndpointPolicy.timeout);
+- после сетевой ошибки или ответа 5xx запрос повторяется (GET-запросы к API идемпотентны)
+  с экспоненциально растущей паузой, из которой выбирается случайное время (jitter), чтобы повторы
+  разных пользователей не приходили на сервер одновременно. Ответ 429 повторяется, только если сервер
+  указал в заголовке Retry-After короткое время (не больше API_RETRY_AFTER_MAX), и именно через это время;
+- если ответ задерживается дольше обычного (квантиль API_HEDGE_QUANTILE длительности последних успешных
+  запросов к адресу), отправляется дублирующий запрос (hedged request) и используется ответ, пришедший первым.
+  Так медленные «хвосты» задержки сервера не задерживают поиск. Время до дубля отсчитывается с момента,
+  когда основной запрос получил соединение из пула (ожидание в очереди пула не повод для дубля), а доля
+  дублей ограничена бюджетом API_HEDGE_BUDGET от числа запросов (HedgeBudget), чтобы при общей деградации
+  сервера дубли не удваивали нагрузку на него и расход квоты RapidAPI. Дубль, не успевший получить соединение
+  до ответа основного запроса, не отправляется, а соединение попытки, ответившей позже, сразу возвращается в пул
+  (HedgedAttempts);
+- попытка, не получившая соединение из пула за таймаут своего адреса, завершается ошибкой PoolTimeoutError:
+  она не повторяется и не учитывается circuit breaker (сервер тут ни при чём), а пользователь не ждёт
+  освобождения пула дольше, чем ждал бы ответа сервера;
+- после API_BREAKER_THRESHOLD неудачных запросов подряд общий circuit breaker прекращает запросы
+  на API_BREAKER_COOLDOWN секунд: пока RapidAPI недоступен, запросы сразу завершаются ошибкой CircuitOpenError,
+  и пользователю сообщается о недоступности сервиса, а не приходится ждать таймаутов. Затем отправляется
+  один пробный запрос, и при его успехе запросы возобновляются.
+
+Ответы 4xx и некорректные ответы не считаются отказом сервиса (ответ 429 не учитывается circuit breaker вовсе).
+api_resilience - общий ResilientCaller запросов к API Hotels.com.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, CancelledError, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set, Tuple, Type
+
+from config import (API_BREAKER_COOLDOWN, API_BREAKER_THRESHOLD, API_ENDPOINTS, API_HEDGE_BUDGET,
+                    API_HEDGE_MIN_DELAY, API_HEDGE_MIN_SAMPLES, API_HEDGE_QUANTILE, API_RETRIES, API_RETRY_AFTER_MAX,
+                    API_RETRY_BACKOFF, API_RETRY_BACKOFF_MAX, HTTP_POOL_SIZE, HTTP_READ_TIMEOUT)
+
+from metrics import API_HEDGES, API_RETRY_TOTAL, register_stats
+
+import requests
+
+
+class ApiStatusError(ValueError):
+    """
+    Исключение для ответа API Hotels.com с кодом, отличным от 200.
+
+    :param status: код ответа
+    :type status: int
+
+    :param retry_after: время (в секундах) из заголовка Retry-After, если сервер его указал
+    :type retry_after: float | None
+    """
+
+    def __init__(self, status: int, retry_after: Optional[float] = None) -> None:
+        super().__init__(status)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Функция разбирает заголовок ответа Retry-After, заданный числом секунд (дата вместо числа не учитывается).
+
+    :param value: значение заголовка
+    :type value: str | None
+
+    :return: время ожидания (в секундах) или None
+    :rtype: float | None
+    """
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+class CircuitOpenError(Exception):
+    """Исключение для запроса, не отправленного из-за недоступности API Hotels.com (circuit breaker открыт)."""
+
+
+class PoolTimeoutError(TimeoutError):
+    """Исключение для попытки запроса, не получившей соединение из пула HTTP-клиента за таймаут адреса."""
+
+
+@dataclass(slots=True, frozen=True)
+class EndpointPolicy:
+    """
+    Класс настроек запросов к одному адресу API.
+
+    timeout - таймаут на чтение ответа (в секундах).
+    retries - количество повторов после сетевой ошибки, ответа 5xx или 429 с коротким Retry-After.
+    hedge - отправлять ли дублирующий запрос, если ответ задерживается.
+    """
+
+    timeout: float
+    retries: int
+    hedge: bool
+
+
+class CircuitBreaker:
+    """
+    Класс circuit breaker: после threshold неудачных запросов подряд запросы не отправляются cooldown секунд,
+    затем пропускается один пробный запрос. Успешный пробный запрос закрывает breaker, неудачный -
+    снова открывает его на cooldown секунд.
+
+    :param threshold: количество неудачных запросов подряд, после которого breaker открывается
+    :type threshold: int
+
+    :param cooldown: время (в секундах), через которое пропускается пробный запрос
+    :type cooldown: float
+    """
+
+    __slots__ = ('threshold', 'cooldown', 'failures', 'opened_at', 'probing', 'opened', 'rejected', '_lock')
+
+    def __init__(self, threshold: int, cooldown: float) -> None:
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.opened = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """
+        Метод проверяет, можно ли отправить запрос (при открытом breaker пропускается только пробный запрос).
+
+        :rtype: bool
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if not self.probing and time.monotonic() - self.opened_at >= self.cooldown:
+                self.probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, failed: bool) -> None:
+        """
+        Метод учитывает результат запроса.
+
+        :param failed: завершился ли запрос отказом сервиса
+        :type failed: bool
+        """
+        with self._lock:
+            if not failed:
+                self.failures = 0
+                self.opened_at = None
+                self.probing = False
+                return
+            self.failures += 1
+            if self.probing or (self.opened_at is None and self.failures >= self.threshold):
+                if self.opened_at is None:
+                    self.opened += 1
+                self.opened_at = time.monotonic()
+                self.probing = False
+
+    def release(self) -> None:
+        """Метод снимает отметку пробного запроса, который был отменён, не дождавшись ответа."""
+        with self._lock:
+            self.probing = False
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Метод возвращает статистику breaker.
+
+        :return: словарь с состоянием (open - 1, если запросы прекращены), количеством неудачных запросов подряд
+            (failures), открытий breaker (opened) и не отправленных запросов (rejected)
+        :rtype: Dict[str, int]
+        """
+        with self._lock:
+            return {'open': int(self.opened_at is not None), 'failures': self.failures,
+                    'opened': self.opened, 'rejected': self.rejected}
+
+
+class HedgeBudget:
+    """
+    Класс бюджета дублирующих запросов (token bucket): каждый запрос к адресу с дублями добавляет share токенов
+    (не более capacity), каждый дубль забирает один токен. Так дубли отправляются не более чем для доли share
+    запросов, даже если медленными стали все ответы сервера.
+
+    :param share: допустимая доля дублей от числа запросов
+    :type share: float
+
+    :param capacity: максимальное количество токенов (допустимый всплеск дублей)
+    :type capacity: float
+    """
+
+    __slots__ = ('share', 'capacity', 'tokens', 'denied', '_lock')
+
+    def __init__(self, share: float, capacity: float) -> None:
+        self.share = share
+        self.capacity = capacity
+        self.tokens = 0.0
+        self.denied = 0
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        """Метод учитывает запрос, для которого мог бы понадобиться дубль."""
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + self.share)
+
+    def withdraw(self) -> bool:
+        """
+        Метод забирает токен на отправку дубля.
+
+        :return: False, если бюджет исчерпан и дубль отправлять нельзя
+        :rtype: bool
+        """
+        with self._lock:
+            if self.tokens < 1:
+                self.denied += 1
+                return False
+            self.tokens -= 1
+            return True
+
+
+class LatencyWindow:
+    """
+    Класс окна длительностей последних успешных запросов к каждому адресу API.
+
+    :param size: количество хранимых длительностей для одного адреса
+    :type size: int
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self._samples: Dict[str, Deque[float]] = dict()
+        self._lock = threading.Lock()
+
+    def add(self, endpoint: str, seconds: float) -> None:
+        """
+        Метод добавляет длительность успешного запроса.
+
+        :param endpoint: часть url, отвечающая за конкретный запрос
+        :type endpoint: str
+
+        :param seconds: длительность запроса (в секундах)
+        :type seconds: float
+        """
+        with self._lock:
+            samples = self._samples.get(endpoint)
+            if samples is None:
+                samples = self._samples[endpoint] = deque(maxlen=self.size)
+            samples.append(seconds)
+
+    def quantile(self, endpoint: str, share: float, min_samples: int) -> Optional[float]:
+        """
+        Метод возвращает квантиль длительности запросов к адресу.
+
+        :param endpoint: часть url, отвечающая за конкретный запрос
+        :type endpoint: str
+
+        :param share: квантиль (от 0 до 1)
+        :type share: float
+
+        :param min_samples: наименьшее количество длительностей, по которым вычисляется квантиль
+        :type min_samples: int
+
+        :return: квантиль или None, если длительностей меньше min_samples
+        :rtype: float | None
+        """
+        with self._lock:
+            samples = sorted(self._samples.get(endpoint, ()))
+        if not samples or len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(share * len(samples)))]
+
+
+class HedgedAttempts:
+    """
+    Класс попыток одного запроса с дублями, которые получают соединения из общего пула (semaphore).
+    Когда результат запроса получен (settle), соединения остальных попыток сразу возвращаются в пул,
+    не дожидаясь их ответов, а попытки, ещё не получившие соединение, не отправляются.
+
+    :param semaphore: счётчик свободных соединений пула HTTP-клиента
+    :type semaphore: threading.BoundedSemaphore
+    """
+
+    __slots__ = ('settled', '_semaphore', '_held', '_lock')
+
+    def __init__(self, semaphore: threading.BoundedSemaphore) -> None:
+        self.settled = False
+        self._semaphore = semaphore
+        self._held: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def hold(self, attempt: int) -> bool:
+        """
+        Метод отмечает, что попытка получила соединение.
+
+        :param attempt: номер попытки (0 - основной запрос, 1 - дубль)
+        :type attempt: int
+
+        :return: False, если результат уже получен: тогда соединение возвращается в пул, и запрос не отправляется
+        :rtype: bool
+        """
+        with self._lock:
+            if not self.settled:
+                self._held.add(attempt)
+                return True
+        self._semaphore.release()
+        return False
+
+    def release(self, attempt: int) -> None:
+        """
+        Метод возвращает в пул соединение завершившейся попытки, если оно не было возвращено раньше.
+
+        :param attempt: номер попытки
+        :type attempt: int
+        """
+        with self._lock:
+            if attempt not in self._held:
+                return
+            self._held.discard(attempt)
+        self._semaphore.release()
+
+    def settle(self) -> None:
+        """Метод отмечает, что результат запроса получен, и возвращает в пул соединения остальных попыток."""
+        with self._lock:
+            self.settled = True
+            held = len(self._held)
+            self._held.clear()
+        for _ in range(held):
+            self._semaphore.release()
+
+
+class ResilientCaller:
+    """
+    Класс выполнения запросов к API с повторами, дублирующими запросами и circuit breaker.
+
+    :param endpoints: настройки адресов (timeout, retries, hedge)
+    :type endpoints: Dict[str, Dict[str, Any]]
+
+    :param default_policy: настройки адресов, которых нет в endpoints
+    :type default_policy: EndpointPolicy
+
+    :param breaker: общий circuit breaker
+    :type breaker: CircuitBreaker
+
+    :param backoff, backoff_max: начальная и наибольшая пауза перед повтором (в секундах)
+    :type backoff, backoff_max: float
+
+    :param hedge_quantile: квантиль длительности запросов, после которой отправляется дублирующий запрос
+    :type hedge_quantile: float
+
+    :param hedge_min_samples: количество успешных запросов к адресу, необходимое для отправки дублей
+    :type hedge_min_samples: int
+
+    :param hedge_min_delay: наименьшее время до отправки дублирующего запроса (в секундах)
+    :type hedge_min_delay: float
+
+    :param pool_size: количество потоков для запросов с дублями (синхронный режим)
+    :type pool_size: int
+
+    :param hedge_budget: бюджет дублирующих запросов
+    :type hedge_budget: HedgeBudget
+
+    :param retry_after_max: наибольшее время из Retry-After ответа 429, при котором запрос повторяется (в секундах)
+    :type retry_after_max: float
+
+    :param connections: количество соединений в пуле HTTP-клиента: попытка запроса считается начавшейся,
+        когда получила одно из них
+    :type connections: int
+    """
+
+    LATENCY_WINDOW_SIZE = 200
+
+    def __init__(self,
+                 endpoints: Dict[str, Dict[str, Any]],
+                 default_policy: EndpointPolicy,
+                 breaker: CircuitBreaker,
+                 backoff: float,
+                 backoff_max: float,
+                 hedge_quantile: float,
+                 hedge_min_samples: int,
+                 hedge_min_delay: float,
+                 pool_size: int,
+                 hedge_budget: HedgeBudget,
+                 retry_after_max: float,
+                 connections: int) -> None:
+        self.policies = {endpoint: EndpointPolicy(**settings) for endpoint, settings in endpoints.items()}
+        self.default_policy = default_policy
+        self.breaker = breaker
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.pool_size = pool_size
+        self.hedge_budget = hedge_budget
+        self.retry_after_max = retry_after_max
+        self.connections = connections
+        self.latencies = LatencyWindow(self.LATENCY_WINDOW_SIZE)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(connections)
+        self._async_slots: Optional[asyncio.Semaphore] = None
+
+    def policy(self, endpoint: str) -> EndpointPolicy:
+        """
+        Метод возвращает настройки запросов к адресу.
+
+        :param endpoint: часть url, отвечающая за конкретный запрос
+        :type endpoint: str
+
+        :rtype: EndpointPolicy
+        """
+        return self.policies.get(endpoint, self.default_policy)
+
+    def hedge_delay(self, endpoint: str) -> Optional[float]:
+        """
+        Метод возвращает время, через которое отправляется дублирующий запрос к адресу.
+
+        :param endpoint: часть url, отвечающая за конкретный запрос
+        :type endpoint: str
+
+        :return: время (в секундах) или None, если дубли к адресу не отправляются
+            или успешных запросов к нему пока слишком мало
+        :rtype: float | None
+        """
+        if not self.policy(endpoint).hedge:
+            return None
+        delay = self.latencies.quantile(endpoint, self.hedge_quantile, self.hedge_min_samples)
+        return None if delay is None else max(delay, self.hedge_min_delay)
+
+    def backoff_delay(self, attempt: int) -> float:
+        """
+        Метод возвращает паузу перед повтором: случайное время от 0 до backoff * 2 ** attempt
+        (но не более backoff_max).
+
+        :param attempt: номер неудачной попытки (с 0)
+        :type attempt: int
+
+        :rtype: float
+        """
+        return random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt))
+
+    @staticmethod
+    def is_failure(error: Exception, network_errors: Tuple[Type[BaseException], ...]) -> bool:
+        """
+        Метод проверяет, является ли ошибка отказом сервиса (сетевая ошибка или ответ 5xx):
+        такие запросы повторяются и учитываются circuit breaker.
+
+        :param error: исключение, возникшее при запросе
+        :type error: Exception
+
+        :param network_errors: классы сетевых ошибок HTTP-клиента
+        :type network_errors: Tuple[Type[BaseException], ...]
+
+        :rtype: bool
+        """
+        if isinstance(error, ApiStatusError):
+            return error.status >= 500
+        return isinstance(error, network_errors)
+
+    def retry_delay(self,
+                    error: Exception,
+                    attempt: int,
+                    network_errors: Tuple[Type[BaseException], ...]) -> Optional[float]:
+        """
+        Метод возвращает паузу перед повтором запроса после ошибки: для отказа сервиса - backoff_delay,
+        для ответа 429 - время из Retry-After, если оно не больше retry_after_max.
+
+        :param error: исключение, возникшее при запросе
+        :type error: Exception
+
+        :param attempt: номер неудачной попытки (с 0)
+        :type attempt: int
+
+        :param network_errors: классы сетевых ошибок HTTP-клиента
+        :type network_errors: Tuple[Type[BaseException], ...]
+
+        :return: пауза (в секундах) или None, если запрос не повторяется
+        :rtype: float | None
+        """
+        if isinstance(error, ApiStatusError) and error.status == 429:
+            if error.retry_after is None or error.retry_after > self.retry_after_max:
+                return None
+            return error.retry_after
+        return self.backoff_delay(attempt) if self.is_failure(error, network_errors) else None
+
+    def record(self, error: Exception, network_errors: Tuple[Type[BaseException], ...]) -> None:
+        """
+        Метод учитывает в circuit breaker неудачную попытку запроса (ответ 429 не учитывается:
+        сервер доступен, но ограничивает частоту запросов).
+
+        :param error: исключение, возникшее при запросе
+        :type error: Exception
+
+        :param network_errors: классы сетевых ошибок HTTP-клиента
+        :type network_errors: Tuple[Type[BaseException], ...]
+        """
+        if isinstance(error, ApiStatusError) and error.status == 429:
+            self.breaker.release()
+        else:
+            self.breaker.record(self.is_failure(error, network_errors))
+
+    def call(self,
+             endpoint: str,
+             function: Callable[..., Any],
+             *args: Any,
+             network_errors: Tuple[Type[BaseException], ...] = (requests.RequestException,)) -> Any:
+        """
+        Метод выполняет запрос function(*args) к адресу endpoint с повторами, дублирующими запросами
+        и проверкой circuit breaker.
+
+        :param endpoint: часть url, отвечающая за конкретный запрос
+        :type endpoint: str
+
+        :param function: функция, выполняющая одну попытку запроса
+        :type function: Callable
+
+        :param network_errors: классы сетевых ошибок HTTP-клиента
+        :type network_errors: Tuple[Type[BaseException], ...]
+
+        :return: результат запроса
+
+        :raises CircuitOpenError: если запросы к API прекращены
+        :raises PoolTimeoutError: если запрос не получил соединение из пула за таймаут адреса
+        """
+        retries = self.policy(endpoint).retries
+        for attempt in range(retries + 1):
+            if not self.breaker.allow():
+                raise CircuitOpenError(endpoint)
+            try:
+                result = self._hedged(endpoint, function, args)
+            except PoolTimeoutError:
+                self.breaker.release()
+                raise
+            except Exception as error:
+                self.record(error, network_errors)
+                delay = self.retry_delay(error, attempt, network_errors)
+                if delay is None or attempt == retries:
+                    raise
+            else:
+                self.breaker.record(False)
+                return result
+            API_RETRY_TOTAL.inc(endpoint)
+            time.sleep(delay)
+
+    async def async_call(self,
+                         endpoint: str,
+                         network_errors: Tuple[Type[BaseException], ...],
+                         function: Callable[..., Awaitable[Any]],
+                         *args: Any) -> Any:
+        """
+        Асинхронный вариант метода call: дублирующий запрос выполняется в отдельной задаче,
+        и запрос, ответивший позже, отменяется.
+
+        :param endpoint: часть url, отвечающая за конкретный запрос
+        :type endpoint: str
+
+        :param network_errors: классы сетевых ошибок HTTP-клиента
+        :type network_errors: Tuple[Type[BaseException], ...]
+
+        :param function: корутинная функция, выполняющая одну попытку запроса
+        :type function: Callable
+
+        :return: результат запроса
+
+        :raises CircuitOpenError: если запросы к API прекращены
+        :raises PoolTimeoutError: если запрос не получил соединение из пула за таймаут адреса
+        """
+        retries = self.policy(endpoint).retries
+        for attempt in range(retries + 1):
+            if not self.breaker.allow():
+                raise CircuitOpenError(endpoint)
+            try:
+                result = await self._async_hedged(endpoint, function, args)
+            except (asyncio.CancelledError, PoolTimeoutError):
+                self.breaker.release()
+                raise
+            except Exception as error:
+                self.record(error, network_errors)
+                delay = self.retry_delay(error, attempt, network_errors)
+                if delay is None or attempt == retries:
+                    raise
+            else:
+                self.breaker.record(False)
+                return result
+            API_RETRY_TOTAL.inc(endpoint)
+            await asyncio.sleep(delay)
+
+    def _timed(self,
+               endpoint: str,
+               function: Callable[..., Any],
+               args: Tuple[Any, ...],
+               deadline: float,
+               attempts: Optional[HedgedAttempts] = None,
+               attempt: int = 0,
+               started: Optional[threading.Event] = None) -> Any:
+        """
+        Метод выполняет одну попытку запроса, получив одно из соединений пула HTTP-клиента, и запоминает
+        длительность успешной попытки (без ожидания соединения).
+
+        :param endpoint: часть url, отвечающая за конкретный запрос
+        :type endpoint: str
+
+        :param function: функция, выполняющая попытку запроса
+        :type function: Callable
+
+        :param args: аргументы функции
+        :type args: Tuple[Any, ...]
+
+        :param deadline: время (time.monotonic), до которого попытка должна получить соединение
+        :type deadline: float
+
+        :param attempts: попытки запроса с дублями, к которым относится эта попытка
+        :type attempts: HedgedAttempts | None
+
+        :param attempt: номер попытки в attempts
+        :type attempt: int
+
+        :param started: событие, которое устанавливается, когда попытка получила соединение
+        :type started: threading.Event | None
+
+        :return: результат запроса
+
+        :raises PoolTimeoutError: если попытка не получила соединение до deadline
+        :raises concurrent.futures.CancelledError: если результат уже получен другой попыткой
+        """
+        if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            raise PoolTimeoutError(endpoint)
+        if attempts is not None and not attempts.hold(attempt):
+            raise CancelledError()
+        try:
+            if started is not None:
+                started.set()
+            request_started = time.monotonic()
+            result = function(*args)
+            self.latencies.add(endpoint, time.monotonic() - request_started)
+        finally:
+            if attempts is None:
+                self._slots.release()
+            else:
+                attempts.release(attempt)
+        return result
+
+    async def _async_timed(self,
+                           endpoint: str,
+                           function: Callable[..., Awaitable[Any]],
+                           args: Tuple[Any, ...],
+                           deadline: float,
+                           started: Optional[asyncio.Event] = None) -> Any:
+        """
+        Асинхронный вариант метода _timed (соединение попытки возвращается в пул и при её отмене).
+
+        :param endpoint: часть url, отвечающая за конкретный запрос
+        :type endpoint: str
+
+        :param function: корутинная функция, выполняющая попытку запроса
+        :type function: Callable
+
+        :param args: аргументы функции
+        :type args: Tuple[Any, ...]
+
+        :param deadline: время (time.monotonic), до которого попытка должна получить соединение
+        :type deadline: float
+
+        :param started: событие, которое устанавливается, когда попытка получила соединение
+        :type started: asyncio.Event | None
+
+        :return: результат запроса
+
+        :raises PoolTimeoutError: если попытка не получила соединение до deadline
+        """
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.connections)
+        try:
+            await asyncio.wait_for(self._async_slots.acquire(), max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            raise PoolTimeoutError(endpoint) from None
+        try:
+            if started is not None:
+                started.set()
+            request_started = time.monotonic()
+            result = await function(*args)
+            self.latencies.add(endpoint, time.monotonic() - request_started)
+        finally:
+            self._async_slots.release()
+        return result
+
+    def _executor(self) -> ThreadPoolExecutor:
+        """
+        Метод возвращает пул потоков для запросов с дублями, создавая его при первом обращении.
+
+        :rtype: concurrent.futures.ThreadPoolExecutor
+        """
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix='hotels4-hedge')
+            return self._pool
+
+    def _hedged(self, endpoint: str, function: Callable[..., Any], args: Tuple[Any, ...]) -> Any:
+        """
+        Метод выполняет попытку запроса; если ответ задерживается дольше hedge_delay после того, как запрос
+        получил соединение, и бюджет дублей не исчерпан, отправляет дублирующий запрос и возвращает первый
+        успешный ответ. Дубль, ещё ждущий соединения, не отправляется, а уже отправленный запрос, ответивший
+        позже, завершается в фоне (запрос requests прервать нельзя), но его соединение сразу возвращается в пул.
+        Соединение ждётся не дольше таймаута адреса.
+
+        :param endpoint: часть url, отвечающая за конкретный запрос
+        :type endpoint: str
+
+        :param function: функция, выполняющая попытку запроса
+        :type function: Callable
+
+        :param args: аргументы функции
+        :type args: Tuple[Any, ...]
+
+        :return: результат запроса
+
+        :raises PoolTimeoutError: если запрос не получил соединение из пула за таймаут адреса
+        """
+        deadline = time.monotonic() + self.policy(endpoint).timeout
+        delay = self.hedge_delay(endpoint)
+        if delay is None:
+            return self._timed(endpoint, function, args, deadline)
+        self.hedge_budget.deposit()
+        executor = self._executor()
+        attempts, started = HedgedAttempts(self._slots), threading.Event()
+        primary = executor.submit(self._timed, endpoint, function, args, deadline, attempts, 0, started)
+        try:
+            if not started.wait(max(0.0, deadline - time.monotonic())):
+                raise PoolTimeoutError(endpoint)
+            if wait((primary,), timeout=delay).done:
+                return primary.result()
+            if not self.hedge_budget.withdraw():
+                API_HEDGES.inc(endpoint, 'denied')
+                return primary.result()
+            API_HEDGES.inc(endpoint, 'sent')
+            hedge = executor.submit(self._timed, endpoint, function, args, deadline, attempts, 1)
+            pending = {primary, hedge}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                winner: Optional[Future] = next((future for future in done if future.exception() is None), None)
+                if winner is not None:
+                    if winner is hedge:
+                        API_HEDGES.inc(endpoint, 'won')
+                    return winner.result()
+            return primary.result()
+        finally:
+            attempts.settle()
+
+    async def _async_hedged(self,
+                            endpoint: str,
+                            function: Callable[..., Awaitable[Any]],
+                            args: Tuple[Any, ...]) -> Any:
+        """
+        Асинхронный вариант метода _hedged: запрос, ответивший позже, отменяется.
+
+        :param endpoint: часть url, отвечающая за конкретный запрос
+        :type endpoint: str
+
+        :param function: корутинная функция, выполняющая попытку запроса
+        :type function: Callable
+
+        :param args: аргументы функции
+        :type args: Tuple[Any, ...]
+
+        :return: результат запроса
+
+        :raises PoolTimeoutError: если запрос не получил соединение из пула за таймаут адреса
+        """
+        deadline = time.monotonic() + self.policy(endpoint).timeout
+        delay = self.hedge_delay(endpoint)
+        if delay is None:
+            return await self._async_timed(endpoint, function, args, deadline)
+        self.hedge_budget.deposit()
+        started = asyncio.Event()
+        primary = asyncio.ensure_future(self._async_timed(endpoint, function, args, deadline, started))
+        start_waiter = asyncio.ensure_future(started.wait())
+        hedge: Optional[asyncio.Future] = None
+        try:
+            await asyncio.wait((primary, start_waiter), timeout=max(0.0, deadline - time.monotonic()),
+                               return_when=asyncio.FIRST_COMPLETED)
+            if primary.done():
+                return primary.result()
+            if not start_waiter.done():
+                raise PoolTimeoutError(endpoint)
+            done, _ = await asyncio.wait((primary,), timeout=delay)
+            if done:
+                return primary.result()
+            if not self.hedge_budget.withdraw():
+                API_HEDGES.inc(endpoint, 'denied')
+                return await primary
+            API_HEDGES.inc(endpoint, 'sent')
+            hedge = asyncio.ensure_future(self._async_timed(endpoint, function, args, deadline))
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if task.exception() is None), None)
+                if winner is not None:
+                    if winner is hedge:
+                        API_HEDGES.inc(endpoint, 'won')
+                    return winner.result()
+            return primary.result()
+        finally:
+            for task in (primary, start_waiter, hedge):
+                if task is not None:
+                    task.cancel()
+
+
+HEDGE_BUDGET_BURST = 10
+api_resilience = ResilientCaller(API_ENDPOINTS, EndpointPolicy(HTTP_READ_TIMEOUT, API_RETRIES, False),
+                                 CircuitBreaker(API_BREAKER_THRESHOLD, API_BREAKER_COOLDOWN),
+                                 API_RETRY_BACKOFF, API_RETRY_BACKOFF_MAX,
+                                 API_HEDGE_QUANTILE, API_HEDGE_MIN_SAMPLES, API_HEDGE_MIN_DELAY,
+                                 2 * HTTP_POOL_SIZE, HedgeBudget(API_HEDGE_BUDGET, HEDGE_BUDGET_BURST),
+                                 API_RETRY_AFTER_MAX, HTTP_POOL_SIZE)
+register_stats('hotels4_circuit', 'Состояние circuit breaker запросов к API Hotels.com', 'api',
+               {'hotels4': api_resilience.breaker.stats})
@@ -0,0 +1,179 @@
+"""
+Модуль хранилища поисковых сессий пользователей.
+
+SearchSession - данные одного поискового запроса пользователя (ответы на вопросы бота) и его результаты.
+StayDates - даты пребывания в отеле.
+SessionStore - хранилище сессий с ограниченным размером: сессия удаляется, если пользователь
+не продолжал диалог дольше заданного времени (idle TTL), а при переполнении хранилища удаляется
+сессия, к которой дольше всего не обращались. Благодаря этому объём памяти, занятый сессиями,
+не растёт с количеством пользователей, когда-либо начинавших поиск.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, List, Optional
+
+
+@dataclass(slots=True)
+class StayDates:
+    """
+    Класс дат пребывания в отеле.
+
+    dates_of_stay - даты пребывания в том виде, в котором их ввёл пользователь.
+    check_in, check_out - даты заезда и выезда (гггг-мм-дд).
+    days_of_stay - количество оплачиваемых суток.
+    """
+
+    dates_of_stay: str
+    check_in: str
+    check_out: str
+    days_of_stay: int
+
+
+@dataclass(slots=True)
+class SearchSession:
+    """
+    Класс поисковой сессии пользователя.
+
+    search_command - команда поиска ('Lowprice', 'Highprice', 'Bestdeal').
+    search_pattern - порядок сортировки отелей в запросе к API.
+    city, destination_id - название города, введённое пользователем, и его destinationId.
+    hotels_number - количество отелей, которые нужно вывести.
+    dates - даты пребывания.
+    photo_number - количество фото по каждому отелю (0 - фото не выводятся).
+    max_distance, max_price - предельные расстояние от центра и цена (только для 'Bestdeal').
+    result_city - название города из ответа API.
+    hotels - найденные отели (records.HotelRecord).
+    next_step - имя следующего шага диалога (см. utils.DIALOG_STEPS) или None, если бот не ждёт ответа.
+    trace - трасса поиска (tracing.Trace) или None, если поиск не трассируется.
+    prefetch - упреждающий запрос первой страницы списка отелей, начатый после ввода дат:
+        пара (параметры запроса, фоновая задача движка, см. engine.Engine.spawn) или None.
+    """
+
+    search_command: str
+    search_pattern: str
+    city: Optional[str] = None
+    destination_id: Optional[str] = None
+    hotels_number: int = 0
+    dates: Optional[StayDates] = None
+    photo_number: int = 0
+    max_distance: float = 0.0
+    max_price: float = 0.0
+    result_city: Optional[str] = None
+    hotels: List[Any] = field(default_factory=list)
+    next_step: Optional[str] = None
+    trace: Any = None
+    prefetch: Any = None
+
+    def close(self) -> None:
+        """
+        Метод отменяет фоновую работу сессии (упреждающий запрос списка отелей), если пользователь
+        не дошёл до поиска: начал новый поиск или перестал отвечать. Уже выполняющийся в потоке
+        запрос завершается, но его результат никому не передаётся.
+        """
+        if self.prefetch is not None:
+            self.prefetch[1].cancel()
+            self.prefetch = None
+
+
+class SessionStore:
+    """
+    Класс потокобезопасного хранилища поисковых сессий по ID пользователя.
+
+    :param maxsize: максимальное количество сессий
+    :type maxsize: int
+
+    :param ttl: время (в секундах) без обращений к сессии, после которого сессия удаляется
+    :type ttl: float
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._sessions: 'OrderedDict[int, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def start(self, user_id: int, search_command: str, search_pattern: str) -> SearchSession:
+        """
+        Метод создаёт для пользователя новую поисковую сессию (прежняя сессия пользователя удаляется
+        и закрывается, см. SearchSession.close).
+
+        :param user_id: ID пользователя
+        :type user_id: int
+
+        :param search_command: команда поиска
+        :type search_command: str
+
+        :param search_pattern: порядок сортировки отелей в запросе к API
+        :type search_pattern: str
+
+        :return: session - новая сессия
+        :rtype: SearchSession
+        """
+        session = SearchSession(search_command, search_pattern)
+        with self._lock:
+            previous = self._sessions.pop(user_id, None)
+            if previous is not None:
+                previous[1].close()
+            self._sessions[user_id] = (time.monotonic() + self.ttl, session)
+            self._sessions.move_to_end(user_id)
+            self._evict()
+        return session
+
+    def get(self, user_id: int) -> Optional[SearchSession]:
+        """
+        Метод возвращает сессию пользователя и продлевает её время жизни.
+
+        :param user_id: ID пользователя
+        :type user_id: int
+
+        :return: сессия пользователя или None, если сессии нет или она истекла
+        :rtype: SearchSession | None
+        """
+        with self._lock:
+            self._evict()
+            entry = self._sessions.get(user_id)
+            if entry is None:
+                return None
+            self._sessions[user_id] = (time.monotonic() + self.ttl, entry[1])
+            self._sessions.move_to_end(user_id)
+            return entry[1]
+
+    def pop(self, user_id: int, session: Optional[SearchSession] = None) -> Optional[SearchSession]:
+        """
+        Метод удаляет сессию пользователя (например, по окончании поиска).
+        Если передана session, удаляется только она: пока завершался прежний поиск, пользователь мог
+        начать новый, и его сессия не должна удаляться вместе с завершённым поиском.
+
+        :param user_id: ID пользователя
+        :type user_id: int
+
+        :param session: сессия, которую нужно удалить (если None - удаляется любая сессия пользователя)
+        :type session: SearchSession | None
+
+        :return: удалённая сессия или None
+        :rtype: SearchSession | None
+        """
+        with self._lock:
+            entry = self._sessions.get(user_id)
+            if entry is None or (session is not None and entry[1] is not session):
+                return None
+            del self._sessions[user_id]
+        return entry[1]
+
+    def _evict(self) -> None:
+        """
+        Метод удаляет (и закрывает) истёкшие сессии и сессии сверх максимального размера хранилища.
+        Сессии упорядочены по времени последнего обращения, поэтому истёкшие всегда находятся в начале.
+        """
+        now = time.monotonic()
+        while self._sessions:
+            expires_at, _ = next(iter(self._sessions.values()))
+            if expires_at > now and len(self._sessions) <= self.maxsize:
+                break
+            self._sessions.popitem(last=False)[1][1].close()
@@ -1,17 +1,80 @@
-from config import ORIGINAL_COMMANDS  # noqa: D100
+"""
+Модуль установки меню команд бота.
+
+Меню устанавливается запросом set_my_commands только тогда, когда список команд (ORIGINAL_COMMANDS)
+или бот изменились с прошлой установки: отпечаток (digest) установленного меню хранится в файле
+COMMANDS_DIGEST_FILE, и при совпадении отпечатка запуск бота обходится без этого запроса.
+"""
+
+import hashlib
+import json
+import os
+
+from config import COMMANDS_DIGEST_FILE, ORIGINAL_COMMANDS
 
 from telebot import TeleBot
 from telebot.types import BotCommand
 
 
+def commands_digest(bot_token: str) -> str:
+    """
+    Функция вычисляет отпечаток меню команд бота: хэш списка команд и ID бота (сам токен не сохраняется).
+
+    :param bot_token: токен бота
+    :type bot_token: str
+
+    :rtype: str
+    """
+    bot_id = (bot_token or '').partition(':')[0]
+    payload = json.dumps([bot_id, ORIGINAL_COMMANDS], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def commands_changed(bot_token: str) -> bool:
+    """
+    Функция проверяет, нужно ли устанавливать меню команд: отпечаток установленного меню отсутствует
+    или не совпадает с текущим.
+
+    :param bot_token: токен бота
+    :type bot_token: str
+
+    :rtype: bool
+    """
+    try:
+        with open(COMMANDS_DIGEST_FILE, 'r', encoding='utf-8') as digest_file:
+            return digest_file.read().strip() != commands_digest(bot_token)
+    except OSError:
+        return True
+
+
+def remember_commands(bot_token: str) -> None:
+    """
+    Функция сохраняет отпечаток установленного меню команд. Ошибка записи не прерывает запуск бота:
+    в этом случае меню будет установлено заново при следующем запуске.
+
+    :param bot_token: токен бота
+    :type bot_token: str
+    """
+    tmp_path = '{path}.tmp'.format(path=COMMANDS_DIGEST_FILE)
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as digest_file:
+            digest_file.write(commands_digest(bot_token))
+        os.replace(tmp_path, COMMANDS_DIGEST_FILE)
+    except OSError:
+        pass
+
+
 def set_default_commands(bot: TeleBot) -> None:
     """
     Функция устанавливает меню - список команд, через которых пользователь может работать
-    с ботом.
+    с ботом, если меню изменилось с прошлой установки.
 
     :param bot: бот, которому устанавливается список команд
     :type bot: telebot.TeleBot
     """
+    if not commands_changed(bot.token):
+        return
     bot.set_my_commands(
         [BotCommand(*command) for command in ORIGINAL_COMMANDS]
     )
+    remember_commands(bot.token)
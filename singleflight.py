@@ -0,0 +1,153 @@
+"""
+Модуль объединения одинаковых одновременных запросов (singleflight).
+
+Если несколько пользователей одновременно ищут отели в одном городе на одни даты, бот отправляет
+к API Hotels.com одинаковые запросы. Объединение запросов позволяет выполнить такой запрос один раз:
+первый вызов с заданным ключом выполняет запрос, а остальные вызовы с тем же ключом, пришедшие
+до его завершения, ждут и получают тот же результат (или копию того же исключения, см. waiter_error).
+Результат общий для всех вызовов, поэтому изменять его нельзя.
+
+SingleFlight - объединение вызовов в потоках (синхронный режим бота).
+AsyncSingleFlight - объединение вызовов в корутинах (асинхронный режим бота, см. модуль async_engine).
+"""
+
+import asyncio
+import copy
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+def waiter_error(error: Exception) -> Exception:
+    """
+    Функция возвращает для ожидающего вызова копию исключения общего запроса: Python дописывает traceback
+    к исключению при каждом raise, и одно исключение, поднятое в нескольких вызовах, смешало бы их traceback.
+    Копия того же класса с теми же атрибутами обрабатывается так же, как исходное исключение;
+    если исключение нельзя скопировать, возвращается оно само.
+
+    :param error: исключение общего запроса
+    :type error: Exception
+
+    :rtype: Exception
+    """
+    try:
+        return copy.copy(error)
+    except Exception:
+        return error
+
+
+class _Call:
+    """Класс выполняющегося вызова: результат или исключение и событие его завершения."""
+
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Any = None
+
+
+class _BaseFlight:
+    """
+    Базовый класс объединения вызовов со счётчиками:
+    calls - общее количество вызовов, executions - количество реально выполненных запросов.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, Any] = dict()
+        self.calls = 0
+        self.executions = 0
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Метод возвращает статистику объединения вызовов.
+
+        :return: словарь с количеством вызовов (calls), выполненных запросов (executions),
+            сэкономленных запросов (saved) и запросов, выполняющихся в данный момент (in_flight)
+        :rtype: Dict[str, int]
+        """
+        return {'calls': self.calls, 'executions': self.executions,
+                'saved': self.calls - self.executions, 'in_flight': len(self._calls)}
+
+
+class SingleFlight(_BaseFlight):
+    """Класс потокобезопасного объединения одинаковых одновременных вызовов."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, function: Callable[..., Any], *args: Any) -> Any:
+        """
+        Метод выполняет function(*args), если вызов с ключом key ещё не выполняется,
+        иначе ждёт завершения уже выполняющегося вызова и возвращает его результат.
+
+        :param key: ключ вызова (одинаковые запросы должны иметь одинаковый ключ)
+        :type key: Hashable
+
+        :param function: функция, выполняющая запрос
+        :type function: Callable
+
+        :return: результат function(*args)
+
+        :raises Exception: исключение, возникшее при выполнении function(*args)
+            (в ожидающих вызовах - его копия, исходное исключение - в __cause__)
+        """
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+
+        if is_leader:
+            try:
+                call.result = function(*args)
+            except Exception as error:
+                call.error = error
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.event.set()
+            return call.result
+
+        call.event.wait()
+        if call.error is not None:
+            raise waiter_error(call.error) from call.error
+        return call.result
+
+
+class AsyncSingleFlight(_BaseFlight):
+    """Класс объединения одинаковых одновременных вызовов корутин в одном цикле событий."""
+
+    async def do(self, key: Hashable, function: Callable[..., Awaitable[Any]], *args: Any) -> Any:
+        """
+        Метод выполняет корутину function(*args), если вызов с ключом key ещё не выполняется,
+        иначе ждёт завершения уже выполняющегося вызова и возвращает его результат.
+        Отмена одного из ожидающих вызовов не отменяет общий запрос.
+
+        :param key: ключ вызова (одинаковые запросы должны иметь одинаковый ключ)
+        :type key: Hashable
+
+        :param function: корутинная функция, выполняющая запрос
+        :type function: Callable
+
+        :return: результат function(*args)
+
+        :raises Exception: исключение, возникшее при выполнении function(*args)
+            (в ожидающих вызовах - его копия, исходное исключение - в __cause__)
+        """
+        self.calls += 1
+        task = self._calls.get(key)
+        is_leader = task is None
+        if is_leader:
+            task = self._calls[key] = asyncio.ensure_future(function(*args))
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+            self.executions += 1
+        try:
+            return await asyncio.shield(task)
+        except Exception as error:
+            if is_leader:
+                raise
+            raise waiter_error(error) from error
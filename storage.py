@@ -0,0 +1,170 @@
+"""
+Модуль хранилища истории поисковых запросов пользователей.
+
+История хранится во встроенной базе данных SQLite (файл HISTORY_DB_FILE): каждый поисковый запрос -
+отдельная строка таблицы search_requests с индексом по ID пользователя и дате запроса.
+Благодаря этому сохранение запроса и чтение истории одного пользователя не требуют чтения
+и перезаписи данных всех пользователей, а каждое сохранение выполняется в отдельной транзакции.
+
+При первом обращении к хранилищу в базу однократно переносятся данные из прежнего
+файла истории LEGACY_HISTORY_FILE (search_requests.json). Перенос можно запустить и вручную:
+python storage.py
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import HISTORY_DB_FILE, HISTORY_LIMIT, LEGACY_HISTORY_FILE
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_requests (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    search_date TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS search_requests_user_date ON search_requests (user_id, search_date);
+"""
+SCHEMA_VERSION = 1
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Функция возвращает соединение с базой истории для текущего потока
+    (у каждого потока-обработчика своё соединение).
+    При первом вызове создаётся схема базы и переносятся данные из прежнего JSON-файла.
+
+    :return: соединение с базой данных
+    :rtype: sqlite3.Connection
+    """
+    global _initialized
+    connection = getattr(_local, 'connection', None)
+    if connection is None:
+        connection = sqlite3.connect(HISTORY_DB_FILE, timeout=30, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        _local.connection = connection
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                connection.executescript(SCHEMA)
+                migrate_from_json(LEGACY_HISTORY_FILE, connection)
+                _initialized = True
+    return connection
+
+
+def save_search_request(user_id: str, search_date: str, request_data: Dict[str, Any]) -> None:
+    """
+    Функция сохраняет поисковый запрос пользователя. В одной транзакции с добавлением нового запроса
+    удаляются самые ранние запросы пользователя сверх лимита HISTORY_LIMIT.
+
+    :param user_id: ID пользователя
+    :type user_id: str
+
+    :param search_date: дата и время поискового запроса
+    :type search_date: str
+
+    :param request_data: данные поискового запроса и его результаты
+    :type request_data: Dict[str, Any]
+    """
+    connection = get_connection()
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        connection.execute('INSERT INTO search_requests (user_id, search_date, data) VALUES (?, ?, ?)',
+                           (user_id, search_date, json.dumps(request_data, ensure_ascii=False)))
+        connection.execute('DELETE FROM search_requests WHERE user_id = ? AND id NOT IN ('
+                           'SELECT id FROM search_requests WHERE user_id = ? '
+                           'ORDER BY search_date DESC, id DESC LIMIT ?)',
+                           (user_id, user_id, HISTORY_LIMIT))
+    except sqlite3.Error:
+        connection.execute('ROLLBACK')
+        raise
+    connection.execute('COMMIT')
+
+
+def get_search_request_summaries(user_id: str) -> List[Tuple[int, str, Dict[str, Any]]]:
+    """
+    Функция возвращает краткие данные сохранённых поисковых запросов пользователя
+    (от самого раннего к последнему) - без списка найденных отелей, который вырезается на стороне базы.
+
+    :param user_id: ID пользователя
+    :type user_id: str
+
+    :return: список кортежей (ID запроса, дата и время запроса, данные запроса без отелей)
+    :rtype: List[Tuple[int, str, Dict[str, Any]]]
+    """
+    rows = get_connection().execute('SELECT id, search_date, json_remove(data, \'$."Отели"\') '
+                                    'FROM search_requests WHERE user_id = ? ORDER BY search_date, id',
+                                    (user_id,))
+    return [(request_id, search_date, json.loads(summary)) for request_id, search_date, summary in rows]
+
+
+def get_search_request(user_id: str, request_id: int) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """
+    Функция возвращает полные данные одного сохранённого поискового запроса пользователя.
+
+    :param user_id: ID пользователя
+    :type user_id: str
+
+    :param request_id: ID поискового запроса
+    :type request_id: int
+
+    :return: кортеж (дата и время запроса, данные запроса) или None, если запрос не найден
+    :rtype: Tuple[str, Dict[str, Any]] | None
+    """
+    row = get_connection().execute('SELECT search_date, data FROM search_requests WHERE id = ? AND user_id = ?',
+                                   (request_id, user_id)).fetchone()
+    if row is None:
+        return None
+    return row[0], json.loads(row[1])
+
+
+def migrate_from_json(json_path: str, connection: sqlite3.Connection) -> int:
+    """
+    Функция однократно переносит историю поиска из прежнего JSON-файла в базу.
+    Факт переноса фиксируется в версии схемы базы (PRAGMA user_version), поэтому
+    повторный вызов ничего не делает.
+
+    :param json_path: путь к JSON-файлу с историей
+    :type json_path: str
+
+    :param connection: соединение с базой данных
+    :type connection: sqlite3.Connection
+
+    :return: количество перенесённых запросов
+    :rtype: int
+    """
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        if connection.execute('PRAGMA user_version').fetchone()[0] >= SCHEMA_VERSION:
+            connection.execute('COMMIT')
+            return 0
+        all_requests_data = dict()
+        if os.path.exists(json_path):
+            with open(json_path, 'r', encoding='utf-8') as req_file:
+                all_requests_data = json.load(req_file)
+
+        rows = [(user_id, search_date, json.dumps(request_data, ensure_ascii=False))
+                for user_id, user_requests in all_requests_data.items()
+                for search_date, request_data in list(user_requests.items())[-HISTORY_LIMIT:]]
+        connection.executemany('INSERT INTO search_requests (user_id, search_date, data) VALUES (?, ?, ?)',
+                               rows)
+        connection.execute('PRAGMA user_version = {version}'.format(version=SCHEMA_VERSION))
+    except (sqlite3.Error, OSError, ValueError):
+        connection.execute('ROLLBACK')
+        raise
+    connection.execute('COMMIT')
+    return len(rows)
+
+
+if __name__ == '__main__':
+    get_connection()
+    print('История поиска перенесена в {db_file}'.format(db_file=HISTORY_DB_FILE))
@@ -0,0 +1,10 @@
+"""
+Общие настройки тестов: модули бота импортируются из корня проекта, а config получает фиктивный токен,
+чтобы тесты не зависели от файла .env.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('BOT_TOKEN', '1:test-token')
@@ -0,0 +1,75 @@
+"""Тесты кэша с ограниченным размером и временем жизни записей (модуль cache)."""
+
+import json
+
+from cache import TTLCache
+
+
+def test_least_recently_used_entry_is_evicted() -> None:
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+
+    cache.set('c', 3)
+
+    assert 'a' in cache and 'c' in cache
+    assert 'b' not in cache
+    assert len(cache) == 2
+
+
+def test_expired_entry_is_a_miss() -> None:
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1, ttl=-1)
+
+    assert 'a' not in cache
+    assert cache.get('a', 'default') == 'default'
+    assert cache.stats() == {'hits': 0, 'misses': 1, 'size': 0}
+
+
+def test_entry_ttl_overrides_cache_ttl() -> None:
+    cache = TTLCache(maxsize=2, ttl=-1)
+    cache.set('a', 1, ttl=60)
+
+    assert cache.get('a') == 1
+    assert cache.stats()['hits'] == 1
+
+
+def test_cache_survives_restart(tmp_path) -> None:
+    path = str(tmp_path / 'cache.json')
+    cache = TTLCache(maxsize=10, ttl=60, path=path)
+    cache.load()
+    cache.set('city', ['1506246'])
+    cache.set('expired', ['1'], ttl=-1)
+    cache.flush()
+
+    restarted = TTLCache(maxsize=10, ttl=60, path=path)
+    restarted.load()
+
+    assert restarted.get('city') == ['1506246']
+    assert 'expired' not in restarted
+    assert len(restarted) == 1
+
+
+def test_entries_set_before_load_are_kept_and_saved(tmp_path) -> None:
+    path = tmp_path / 'cache.json'
+    path.write_text(json.dumps([['old', 2 ** 40, 'saved'], ['city', 2 ** 40, 'stale']]), encoding='utf-8')
+    cache = TTLCache(maxsize=10, ttl=60, path=str(path))
+    cache.set('city', 'fresh')
+
+    cache.load()
+
+    assert cache.get('city') == 'fresh'
+    assert cache.get('old') == 'saved'
+    saved = {key: value for key, _, value in json.loads(path.read_text(encoding='utf-8'))}
+    assert saved == {'old': 'saved', 'city': 'fresh'}
+
+
+def test_corrupted_file_is_ignored(tmp_path) -> None:
+    path = tmp_path / 'cache.json'
+    path.write_text('{not json', encoding='utf-8')
+    cache = TTLCache(maxsize=10, ttl=60, path=str(path))
+
+    cache.load()
+
+    assert len(cache) == 0
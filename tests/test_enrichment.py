@@ -0,0 +1,49 @@
+"""Тесты параллельного формирования записей отобранных отелей (utils.hotels_enrichment)."""
+
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from engine import run_sync
+
+from records import ListedHotel
+
+import utils
+
+
+def listed_hotels(number: int) -> list:
+    return [ListedHotel(hotel_id, 'Hotel {id}'.format(id=hotel_id), 10.0 * hotel_id, '1 км')
+            for hotel_id in range(1, number + 1)]
+
+
+SESSION = SimpleNamespace(dates=SimpleNamespace(days_of_stay=3), photo_number=0, trace=None)
+
+
+def test_hotels_are_enriched_in_parallel_and_keep_their_order(monkeypatch) -> None:
+    barrier = threading.Barrier(3, timeout=5)
+
+    async def fake_filling(user_id: int, session: SimpleNamespace, i_hotel: ListedHotel) -> object:
+        barrier.wait()
+        time.sleep(0.01 * (3 - i_hotel.hotel_id))
+        return utils.hotel_base_formation(session, i_hotel)
+
+    monkeypatch.setattr(utils, 'hotel_info_filling', fake_filling)
+
+    hotels = run_sync(utils.hotels_enrichment(1, SESSION, listed_hotels(3)))
+
+    assert [hotel.hotel_id for hotel in hotels] == [1, 2, 3]
+    assert [hotel.total_price for hotel in hotels] == [30.0, 60.0, 90.0]
+
+
+def test_enrichment_error_is_raised(monkeypatch) -> None:
+    async def fake_filling(user_id: int, session: SimpleNamespace, i_hotel: ListedHotel) -> object:
+        if i_hotel.hotel_id == 2:
+            raise ValueError('Unexpected payload')
+        return utils.hotel_base_formation(session, i_hotel)
+
+    monkeypatch.setattr(utils, 'hotel_info_filling', fake_filling)
+
+    with pytest.raises(ValueError):
+        run_sync(utils.hotels_enrichment(1, SESSION, listed_hotels(3)))
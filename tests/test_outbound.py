@@ -0,0 +1,87 @@
+"""Тесты лимитеров и планировщика исходящих запросов к API Telegram (модуль outbound)."""
+
+from outbound import OutboundScheduler, TokenBucket, _Ticket, retry_after
+
+
+def test_token_bucket_refills_at_rate() -> None:
+    bucket = TokenBucket(rate=2, capacity=4)
+    bucket.updated = 100.0
+    bucket.tokens = 0
+
+    assert bucket.wait_time(100.0, 1) == 0.5
+    assert bucket.wait_time(101.0, 1) == 0
+    assert bucket.tokens == 2
+    assert bucket.wait_time(110.0, 1) == 0
+    assert bucket.tokens == 4
+
+
+def test_request_above_capacity_waits_for_full_bucket() -> None:
+    bucket = TokenBucket(rate=1, capacity=3)
+    bucket.updated = 100.0
+    bucket.tokens = 3
+
+    assert bucket.wait_time(100.0, 10) == 0
+
+
+def test_blocked_bucket_waits_until_unblocked() -> None:
+    bucket = TokenBucket(rate=1, capacity=3)
+    bucket.updated = 100.0
+    bucket.blocked_until = 105.0
+
+    assert bucket.wait_time(100.0, 1) == 5.0
+
+
+def scheduler_with_tickets(requests: list, global_rate: float = 30) -> tuple:
+    """
+    Планировщик без потока-диспетчера с ожидающими запросами requests (пары ID чата и стоимость).
+    Возвращает планировщик и список, в который записываются (ID чата, стоимость) выданных разрешений.
+    """
+    scheduler = OutboundScheduler(global_rate, chat_rate=1, chat_burst=3, max_retries=0)
+    scheduler._dispatcher = object()
+    granted = []
+    for chat_id, cost in requests:
+        scheduler._enqueue(chat_id, _Ticket(cost, lambda chat_id=chat_id, cost=cost: granted.append((chat_id, cost))))
+    return scheduler, granted
+
+
+def test_album_costs_one_request_in_chat_bucket() -> None:
+    scheduler, granted = scheduler_with_tickets([(1, 6)] * 5)
+    now = scheduler._chat_bucket(1).updated
+
+    next_wait = scheduler._grant(now)
+
+    assert granted == [(1, 6)] * 3
+    assert scheduler._chat_bucket(1).tokens == 0
+    assert scheduler.global_bucket.tokens == 30 - 18
+    assert next_wait is not None and 0 < next_wait <= 1
+
+
+def test_album_costs_photos_in_global_bucket() -> None:
+    scheduler, granted = scheduler_with_tickets([(1, 6), (2, 6), (3, 6)], global_rate=10)
+    now = scheduler.global_bucket.updated
+
+    scheduler._grant(now)
+
+    assert granted == [(1, 6)]
+    assert scheduler.global_bucket.tokens == 4
+
+
+def test_chats_are_served_round_robin() -> None:
+    scheduler, granted = scheduler_with_tickets([(1, 1), (1, 1), (2, 1), (1, 1), (2, 1)])
+    now = max(scheduler._chat_bucket(1).updated, scheduler._chat_bucket(2).updated)
+
+    scheduler._grant(now)
+
+    assert [chat_id for chat_id, _ in granted] == [1, 2, 1, 2, 1]
+
+
+class TooManyRequests(Exception):
+    """Ошибка 429 API Telegram."""
+
+    error_code = 429
+    result_json = {'parameters': {'retry_after': 7}}
+
+
+def test_retry_after_reads_telegram_parameter() -> None:
+    assert retry_after(TooManyRequests()) == 7.0
+    assert retry_after(ValueError()) is None
@@ -0,0 +1,59 @@
+"""Тесты ранжирования отелей для команды bestdeal (модуль ranking)."""
+
+from ranking import CandidateTable, HotelsSelection, parse_distance
+
+from records import ListedHotel, PropertiesPage
+
+
+def hotel(hotel_id: int, price: float, distance: str) -> ListedHotel:
+    return ListedHotel(hotel_id, 'Hotel {hotel_id}'.format(hotel_id=hotel_id), price, distance)
+
+
+def test_parse_distance_accepts_comma_and_point() -> None:
+    assert parse_distance('10,2 км') == 10.2
+    assert parse_distance('0.5 miles') == 0.5
+    assert parse_distance('3 км') == 3
+
+
+def test_hotels_without_price_or_distance_are_skipped() -> None:
+    table = CandidateTable()
+
+    table.extend([hotel(1, 100, '1 км'), ListedHotel(2, 'No price', None, '1 км'),
+                  ListedHotel(3, 'No distance', 100, None), hotel(4, 100, 'в центре')])
+
+    assert [i_hotel.hotel_id for i_hotel in table.hotels] == [1]
+
+
+def test_top_orders_by_weighted_score() -> None:
+    table = CandidateTable()
+    table.extend([hotel(1, 90, '1 км'), hotel(2, 10, '9 км'), hotel(3, 40, '4 км'), hotel(4, 20, '2 км')])
+
+    assert [i_hotel.hotel_id for i_hotel in table.top(3, 100, 10, 0.5)] == [4, 3, 1]
+    assert [i_hotel.hotel_id for i_hotel in table.top(2, 100, 10, 1)] == [2, 4]
+    assert [i_hotel.hotel_id for i_hotel in table.top(2, 100, 10, 0)] == [1, 4]
+
+
+def test_top_skips_hotels_over_the_limits_and_keeps_api_order_on_ties() -> None:
+    table = CandidateTable()
+    table.extend([hotel(1, 50, '5 км'), hotel(2, 150, '1 км'), hotel(3, 50, '5 км'), hotel(4, 10, '11 км')])
+
+    assert [i_hotel.hotel_id for i_hotel in table.top(5, 100, 10, 0.5)] == [1, 3]
+
+
+def test_selection_needs_pages_until_enough_matches() -> None:
+    first_page = PropertiesPage('Город', [hotel(1, 50, '1 км'), hotel(2, 500, '1 км')], 2)
+    selection = HotelsSelection(first_page, 2, max_price=100, max_distance=5)
+
+    assert selection.needs_more()
+    selection.add(PropertiesPage('Город', [hotel(3, 20, '1 км')], None))
+
+    assert not selection.needs_more()
+    assert [i_hotel.hotel_id for i_hotel in selection.hotels()] == [3, 1]
+
+
+def test_selection_without_limits_takes_first_page_in_api_order() -> None:
+    first_page = PropertiesPage('Город', [hotel(1, 500, '1 км'), hotel(2, 10, '1 км'), hotel(3, 1, '1 км')], 2)
+    selection = HotelsSelection(first_page, 2)
+
+    assert not selection.needs_more()
+    assert [i_hotel.hotel_id for i_hotel in selection.hotels()] == [1, 2]
@@ -0,0 +1,59 @@
+"""Тесты извлечения нужных боту полей из ответов API Hotels.com (модуль records)."""
+
+import pytest
+
+from records import PropertiesPage, extract_payload
+
+from utils import photos_selection
+
+
+def photos_payload(room_number: int, hotel_number: int) -> dict:
+    """Ответ /properties/get-hotel-photos/ с заданным количеством фото номеров и самого отеля."""
+    return {'roomImages': [{'images': [{'baseUrl': 'room{index}_{{size}}'.format(index=index)}]}
+                           for index in range(room_number)],
+            'hotelImages': [{'baseUrl': 'hotel{index}_{{size}}'.format(index=index)} for index in range(hotel_number)]}
+
+
+def test_photo_urls_keep_both_lists() -> None:
+    photo_urls = extract_payload('/properties/get-hotel-photos/', photos_payload(2, 1))
+
+    assert photo_urls == {'roomImages': ['room0_y', 'room1_y'], 'hotelImages': ['hotel0_y']}
+
+
+@pytest.mark.parametrize('room_number, hotel_number', [(0, 2), (2, 0), (0, 0)])
+def test_photo_urls_with_empty_list(room_number: int, hotel_number: int) -> None:
+    photo_urls = extract_payload('/properties/get-hotel-photos/', photos_payload(room_number, hotel_number))
+
+    assert len(photo_urls['roomImages']) == room_number
+    assert len(photo_urls['hotelImages']) == hotel_number
+
+
+def test_unexpected_payload_raises_value_error() -> None:
+    with pytest.raises(ValueError):
+        extract_payload('/properties/get-details/', {'data': {}})
+
+
+def test_properties_page_round_trip() -> None:
+    payload = {'data': {'body': {'header': 'Москва', 'searchResults': {
+        'pagination': {'nextPageNumber': 2},
+        'results': [{'id': 1, 'name': 'H1', 'ratePlan': {'price': {'exactCurrent': 10.5}},
+                     'landmarks': [{'distance': '1,5 км'}]}]}}}}
+    page = extract_payload('/properties/list/', payload)
+
+    assert PropertiesPage.from_row(page.as_row()) == page
+    assert page.next_page_number == 2
+
+
+@pytest.mark.parametrize('photo_number, room_number, hotel_number, expected', [
+    (1, 3, 3, ['room0']),
+    (3, 3, 3, ['room0', 'room1', 'hotel0']),
+    (3, 3, 0, ['room0', 'room1', 'room2']),
+    (3, 0, 3, ['hotel0', 'hotel1', 'hotel2']),
+    (1, 0, 2, ['hotel0']),
+    (4, 1, 1, ['room0', 'hotel0']),
+])
+def test_photos_selection(photo_number: int, room_number: int, hotel_number: int, expected: list) -> None:
+    photo_urls = {'roomImages': ['room{index}'.format(index=index) for index in range(room_number)],
+                  'hotelImages': ['hotel{index}'.format(index=index) for index in range(hotel_number)]}
+
+    assert photos_selection(photo_urls, photo_number) == expected
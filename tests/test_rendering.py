@@ -0,0 +1,68 @@
+"""Тесты формирования сообщений с результатами поиска (модуль rendering)."""
+
+import rendering
+from rendering import hotel_card, pack_blocks, result_messages, split_block
+
+from records import HotelRecord
+
+
+def test_blocks_are_packed_up_to_the_limit() -> None:
+    blocks = ['a' * 4, 'b' * 4, 'c' * 4]
+
+    assert pack_blocks(blocks, limit=10) == ['aaaa\n\nbbbb', 'cccc']
+    assert pack_blocks(blocks, limit=9) == ['aaaa', 'bbbb', 'cccc']
+
+
+def test_long_block_is_split_by_lines() -> None:
+    block = '\n'.join(['a' * 4, 'b' * 4, 'c' * 4])
+
+    assert split_block(block, limit=9) == ['aaaa\nbbbb', 'cccc']
+    assert pack_blocks(['x', block], limit=9) == ['x', 'aaaa\nbbbb', 'cccc']
+
+
+def test_line_longer_than_limit_is_cut() -> None:
+    messages = pack_blocks(['a' * 25], limit=10)
+
+    assert messages == ['a' * 10, 'a' * 10, 'a' * 5]
+
+
+def test_no_message_exceeds_the_limit() -> None:
+    blocks = ['{index}\n{text}'.format(index=index, text='x' * (index * 7 % 30)) for index in range(50)]
+
+    messages = pack_blocks(blocks, limit=40)
+
+    assert all(len(message) <= 40 for message in messages)
+    assert ''.join(messages).replace('\n', '') == ''.join(blocks).replace('\n', '')
+
+
+def test_hotel_card_escapes_html() -> None:
+    card = hotel_card(HotelRecord(1, 'A & <B>', 10.0, 60.0, '1 км', address='<street>'))
+
+    assert card.splitlines() == ['<b><a href="https://www.hotels.com/ho1/">A &amp; &lt;B&gt;</a></b>',
+                                 'Цена, $: 10.0', 'Цена за все дни, $: 60.0', 'От центра: 1 км',
+                                 'Адрес: &lt;street&gt;']
+
+
+def test_hotels_without_photos_share_one_message() -> None:
+    hotels = [HotelRecord(1, 'A', 10.0, 60.0, '1 км'), HotelRecord(2, 'B', 20.0, 120.0, '2 км')]
+
+    messages = result_messages('<b>Результаты</b>', hotels)
+
+    assert len(messages) == 1
+    text, photos = messages[0]
+    assert photos == [] and text.count('<b>') == 3
+
+
+def test_hotel_with_photos_gets_an_album(monkeypatch) -> None:
+    hotels = [HotelRecord(1, 'A', 10.0, 60.0, '1 км'), HotelRecord(2, 'B', 20.0, 120.0, '2 км', photos=['p1', 'p2']),
+              HotelRecord(3, 'C', 30.0, 180.0, '3 км')]
+
+    monkeypatch.setattr(rendering, 'PHOTO_ALBUM_CAPTION', True)
+    assert [(text is not None, photos) for text, photos in result_messages('header', hotels)] == [
+        (True, []), (True, ['p1', 'p2']), (True, [])]
+
+    monkeypatch.setattr(rendering, 'PHOTO_ALBUM_CAPTION', False)
+    messages = result_messages('header', hotels)
+    assert [photos for _, photos in messages] == [[], ['p1', 'p2'], []]
+    assert messages[1][0] is None
+    assert 'B</a>' in messages[0][0]
@@ -0,0 +1,180 @@
+"""Тесты повторов, дублирующих запросов и circuit breaker запросов к API Hotels.com (модуль resilience)."""
+
+import asyncio
+import threading
+import time
+
+from resilience import (ApiStatusError, CircuitBreaker, CircuitOpenError, EndpointPolicy, HedgeBudget,
+                        PoolTimeoutError, ResilientCaller)
+
+import pytest
+
+import requests
+
+
+ENDPOINT = '/properties/list/'
+
+
+def make_caller(timeout: float = 1.0,
+                retries: int = 0,
+                hedge: bool = False,
+                threshold: int = 3,
+                connections: int = 2) -> ResilientCaller:
+    """Вызов без пауз перед повторами, с дублями после первого же успешного запроса и полным бюджетом дублей."""
+    caller = ResilientCaller({ENDPOINT: {'timeout': timeout, 'retries': retries, 'hedge': hedge}},
+                             EndpointPolicy(timeout, retries, False), CircuitBreaker(threshold, cooldown=60),
+                             backoff=0, backoff_max=0, hedge_quantile=0.5, hedge_min_samples=1,
+                             hedge_min_delay=0.05, pool_size=4, hedge_budget=HedgeBudget(1, 10),
+                             retry_after_max=1, connections=connections)
+    caller.hedge_budget.tokens = 10
+    return caller
+
+
+def test_breaker_opens_after_threshold_failures() -> None:
+    breaker = CircuitBreaker(threshold=2, cooldown=60)
+
+    breaker.record(True)
+    assert breaker.allow()
+    breaker.record(True)
+
+    assert not breaker.allow()
+    assert breaker.stats() == {'open': 1, 'failures': 2, 'opened': 1, 'rejected': 1}
+
+
+def test_breaker_lets_one_probe_through_after_cooldown() -> None:
+    breaker = CircuitBreaker(threshold=1, cooldown=60)
+    breaker.record(True)
+    breaker.opened_at -= 60
+
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    breaker.record(False)
+    assert breaker.allow()
+    assert breaker.stats()['open'] == 0
+
+
+def test_failed_probe_reopens_breaker() -> None:
+    breaker = CircuitBreaker(threshold=1, cooldown=60)
+    breaker.record(True)
+    breaker.opened_at -= 60
+    assert breaker.allow()
+
+    breaker.record(True)
+
+    assert not breaker.allow()
+    assert breaker.stats()['opened'] == 1
+
+
+def test_released_probe_can_be_retried() -> None:
+    breaker = CircuitBreaker(threshold=1, cooldown=60)
+    breaker.record(True)
+    breaker.opened_at -= 60
+    assert breaker.allow()
+
+    breaker.release()
+
+    assert breaker.allow()
+
+
+def test_network_errors_are_retried_and_open_breaker() -> None:
+    caller = make_caller(retries=1, threshold=2)
+    calls = []
+
+    def fail() -> None:
+        calls.append(1)
+        raise requests.ConnectionError()
+
+    with pytest.raises(requests.ConnectionError):
+        caller.call(ENDPOINT, fail)
+    assert len(calls) == 2
+    with pytest.raises(CircuitOpenError):
+        caller.call(ENDPOINT, fail)
+    assert len(calls) == 2
+
+
+def test_client_errors_are_not_retried() -> None:
+    caller = make_caller(retries=2)
+    calls = []
+
+    def fail() -> None:
+        calls.append(1)
+        raise ApiStatusError(404)
+
+    with pytest.raises(ApiStatusError):
+        caller.call(ENDPOINT, fail)
+    assert len(calls) == 1
+    assert caller.breaker.stats()['failures'] == 0
+
+
+def test_retry_after_is_honoured_only_when_short() -> None:
+    caller = make_caller()
+
+    assert caller.retry_delay(ApiStatusError(429, 0.5), 0, ()) == 0.5
+    assert caller.retry_delay(ApiStatusError(429, 5), 0, ()) is None
+    assert caller.retry_delay(ApiStatusError(429), 0, ()) is None
+
+
+def test_hedge_wins_when_primary_is_slow() -> None:
+    caller = make_caller(hedge=True)
+    caller.latencies.add(ENDPOINT, 0.01)
+    release_primary = threading.Event()
+    attempts = []
+
+    def request() -> str:
+        attempts.append(1)
+        if len(attempts) == 1:
+            release_primary.wait(5)
+            return 'primary'
+        return 'hedge'
+
+    try:
+        assert caller.call(ENDPOINT, request) == 'hedge'
+        assert len(attempts) == 2
+        assert caller._slots.acquire(blocking=False) and caller._slots.acquire(blocking=False)
+    finally:
+        release_primary.set()
+
+
+def test_request_without_free_connection_times_out() -> None:
+    caller = make_caller(timeout=0.2, connections=1)
+    caller._slots.acquire()
+
+    started = time.monotonic()
+    with pytest.raises(PoolTimeoutError):
+        caller.call(ENDPOINT, lambda: 'result')
+
+    assert time.monotonic() - started < 1
+    assert caller.breaker.stats()['failures'] == 0
+
+
+def test_hedged_request_without_free_connection_times_out() -> None:
+    caller = make_caller(timeout=0.2, hedge=True, connections=1)
+    caller.latencies.add(ENDPOINT, 0.01)
+    caller._slots.acquire()
+
+    started = time.monotonic()
+    with pytest.raises(PoolTimeoutError):
+        caller.call(ENDPOINT, lambda: 'result')
+
+    assert time.monotonic() - started < 1
+    caller._slots.release()
+    assert caller.call(ENDPOINT, lambda: 'result') == 'result'
+
+
+def test_async_hedged_request_without_free_connection_times_out() -> None:
+    caller = make_caller(timeout=0.2, hedge=True, connections=1)
+    caller.latencies.add(ENDPOINT, 0.01)
+
+    async def request() -> str:
+        return 'result'
+
+    async def scenario() -> None:
+        caller._async_slots = asyncio.Semaphore(1)
+        await caller._async_slots.acquire()
+        with pytest.raises(PoolTimeoutError):
+            await caller.async_call(ENDPOINT, (asyncio.TimeoutError,), request)
+        caller._async_slots.release()
+        assert await caller.async_call(ENDPOINT, (asyncio.TimeoutError,), request) == 'result'
+
+    asyncio.run(scenario())
@@ -0,0 +1,74 @@
+"""Тесты хранилища поисковых сессий (модуль sessions)."""
+
+import time
+
+from sessions import SessionStore
+
+
+class FakeTask:
+    """Фоновая задача, которая запоминает, что её отменили."""
+
+    def __init__(self) -> None:
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+
+def test_start_replaces_and_closes_previous_session() -> None:
+    store = SessionStore(maxsize=10, ttl=60)
+    first = store.start(1, 'Lowprice', 'PRICE')
+    prefetch = FakeTask()
+    first.prefetch = ({}, prefetch)
+
+    second = store.start(1, 'Bestdeal', 'PRICE')
+
+    assert store.get(1) is second
+    assert prefetch.cancelled
+    assert first.prefetch is None
+
+
+def test_expired_session_is_removed(monkeypatch) -> None:
+    store = SessionStore(maxsize=10, ttl=60)
+    now = time.monotonic()
+    monkeypatch.setattr(time, 'monotonic', lambda: now)
+    store.start(1, 'Lowprice', 'PRICE')
+
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 30)
+    assert store.get(1) is not None
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 80)
+    assert store.get(1) is not None
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 141)
+    assert store.get(1) is None
+    assert len(store) == 0
+
+
+def test_least_recently_used_session_is_evicted() -> None:
+    store = SessionStore(maxsize=2, ttl=60)
+    store.start(1, 'Lowprice', 'PRICE')
+    store.start(2, 'Lowprice', 'PRICE')
+    store.get(1)
+    store.start(3, 'Lowprice', 'PRICE')
+
+    assert store.get(2) is None
+    assert store.get(1) is not None
+    assert store.get(3) is not None
+
+
+def test_pop_removes_only_finished_session() -> None:
+    store = SessionStore(maxsize=10, ttl=60)
+    finished = store.start(1, 'Lowprice', 'PRICE')
+    current = store.start(1, 'Highprice', 'PRICE_HIGHEST_FIRST')
+
+    assert store.pop(1, finished) is None
+    assert store.get(1) is current
+    assert store.pop(1, current) is current
+    assert store.get(1) is None
+
+
+def test_pop_without_session_removes_any_session() -> None:
+    store = SessionStore(maxsize=10, ttl=60)
+    session = store.start(1, 'Lowprice', 'PRICE')
+
+    assert store.pop(1) is session
+    assert store.pop(1) is None
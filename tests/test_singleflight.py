@@ -0,0 +1,115 @@
+"""Тесты объединения одинаковых одновременных запросов (модуль singleflight)."""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from resilience import ApiStatusError
+
+from singleflight import AsyncSingleFlight, SingleFlight
+
+import pytest
+
+
+THREADS = 8
+
+
+def run_together(flight: SingleFlight, function) -> list:
+    """
+    Выполняет flight.do с одним ключом в THREADS потоках, которые стартуют одновременно (threading.Barrier);
+    function выполняется, только когда все потоки уже вызвали flight.do.
+    Возвращает результаты или исключения вызовов.
+    """
+    barrier = threading.Barrier(THREADS)
+
+    def leader_function() -> object:
+        while flight.calls < THREADS:
+            time.sleep(0.001)
+        return function()
+
+    def worker() -> object:
+        barrier.wait()
+        try:
+            return flight.do('key', leader_function)
+        except Exception as error:
+            return error
+
+    with ThreadPoolExecutor(THREADS) as executor:
+        return list(executor.map(lambda _: worker(), range(THREADS)))
+
+
+def test_concurrent_calls_are_coalesced() -> None:
+    flight = SingleFlight()
+    result = object()
+
+    results = run_together(flight, lambda: result)
+
+    assert all(item is result for item in results)
+    assert flight.stats() == {'calls': THREADS, 'executions': 1, 'saved': THREADS - 1, 'in_flight': 0}
+
+
+def test_each_waiter_gets_its_own_copy_of_the_error() -> None:
+    flight = SingleFlight()
+    error = ApiStatusError(503, retry_after=2)
+
+    def fail() -> None:
+        raise error
+
+    errors = run_together(flight, fail)
+
+    assert flight.executions == 1
+    assert sum(item is error for item in errors) == 1
+    copies = [item for item in errors if item is not error]
+    assert len({id(item) for item in copies}) == THREADS - 1
+    for item in copies:
+        assert isinstance(item, ApiStatusError)
+        assert (item.status, item.retry_after) == (503, 2)
+        assert item.__cause__ is error
+        assert item.__traceback__ is not error.__traceback__
+
+
+def test_calls_after_completion_run_again() -> None:
+    flight = SingleFlight()
+
+    assert flight.do('key', lambda: 1) == 1
+    assert flight.do('key', lambda: 2) == 2
+    assert flight.executions == 2
+
+
+def test_async_waiters_get_copies_of_the_error() -> None:
+    flight = AsyncSingleFlight()
+    error = ValueError('Unexpected payload')
+
+    async def fail() -> None:
+        await asyncio.sleep(0.01)
+        raise error
+
+    async def scenario() -> list:
+        return await asyncio.gather(*(flight.do('key', fail) for _ in range(3)), return_exceptions=True)
+
+    errors = asyncio.run(scenario())
+
+    assert flight.executions == 1
+    assert errors[0] is error
+    assert all(isinstance(item, ValueError) and item.__cause__ is error for item in errors[1:])
+    assert errors[1] is not errors[2]
+
+
+def test_async_waiter_cancellation_does_not_cancel_the_request() -> None:
+    flight = AsyncSingleFlight()
+
+    async def request() -> str:
+        await asyncio.sleep(0.01)
+        return 'result'
+
+    async def scenario() -> str:
+        leader = asyncio.ensure_future(flight.do('key', request))
+        waiter = asyncio.ensure_future(flight.do('key', request))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return await leader
+
+    assert asyncio.run(scenario()) == 'result'
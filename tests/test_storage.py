@@ -0,0 +1,90 @@
+"""Тесты хранилища истории поисковых запросов в SQLite (модуль storage)."""
+
+import json
+import sqlite3
+import threading
+from typing import Iterator
+
+import pytest
+
+import storage
+
+
+LEGACY_HISTORY = {
+    '1': {'2022-09-13 14:52:58': {'Команда поиска': 'Lowprice', 'Город': 'Город', 'Отели': [{'Название': 'A'}]},
+          '2022-09-14 10:00:00': {'Команда поиска': 'Bestdeal', 'Город': 'Город', 'Отели': []}},
+    '2': {'2022-09-15 12:00:00': {'Команда поиска': 'Highprice', 'Город': 'Город', 'Отели': []}},
+}
+
+
+def memory_connection() -> sqlite3.Connection:
+    """Соединение с пустой базой в памяти со схемой хранилища."""
+    connection = sqlite3.connect(':memory:', isolation_level=None)
+    connection.executescript(storage.SCHEMA)
+    return connection
+
+
+@pytest.fixture
+def history_db(tmp_path, monkeypatch) -> Iterator[str]:
+    """Хранилище с отдельной базой и прежним файлом истории LEGACY_HISTORY во временном каталоге."""
+    legacy_path = tmp_path / 'search_requests.json'
+    legacy_path.write_text(json.dumps(LEGACY_HISTORY, ensure_ascii=False), encoding='utf-8')
+    monkeypatch.setattr(storage, 'HISTORY_DB_FILE', str(tmp_path / 'history.db'))
+    monkeypatch.setattr(storage, 'LEGACY_HISTORY_FILE', str(legacy_path))
+    monkeypatch.setattr(storage, '_local', threading.local())
+    monkeypatch.setattr(storage, '_initialized', False)
+    yield str(tmp_path / 'history.db')
+    storage._local.connection.close()
+
+
+def test_migration_runs_once(tmp_path) -> None:
+    legacy_path = tmp_path / 'search_requests.json'
+    legacy_path.write_text(json.dumps(LEGACY_HISTORY, ensure_ascii=False), encoding='utf-8')
+    connection = memory_connection()
+
+    assert storage.migrate_from_json(str(legacy_path), connection) == 3
+    assert storage.migrate_from_json(str(legacy_path), connection) == 0
+
+    assert connection.execute('SELECT COUNT(*) FROM search_requests').fetchone()[0] == 3
+    assert connection.execute('PRAGMA user_version').fetchone()[0] == storage.SCHEMA_VERSION
+
+
+def test_migration_without_legacy_file_is_recorded(tmp_path) -> None:
+    connection = memory_connection()
+
+    assert storage.migrate_from_json(str(tmp_path / 'missing.json'), connection) == 0
+
+    assert connection.execute('PRAGMA user_version').fetchone()[0] == storage.SCHEMA_VERSION
+
+
+def test_failed_migration_is_rolled_back(tmp_path) -> None:
+    legacy_path = tmp_path / 'search_requests.json'
+    legacy_path.write_text('{not json', encoding='utf-8')
+    connection = memory_connection()
+
+    with pytest.raises(ValueError):
+        storage.migrate_from_json(str(legacy_path), connection)
+
+    assert connection.execute('PRAGMA user_version').fetchone()[0] == 0
+    assert not connection.in_transaction
+
+
+def test_history_is_migrated_on_first_use(history_db) -> None:
+    summaries = storage.get_search_request_summaries('1')
+
+    assert [search_date for _, search_date, _ in summaries] == ['2022-09-13 14:52:58', '2022-09-14 10:00:00']
+    assert all('Отели' not in summary for _, _, summary in summaries)
+    _, request_data = storage.get_search_request('1', summaries[0][0])
+    assert request_data['Отели'] == [{'Название': 'A'}]
+    assert storage.get_search_request('2', summaries[0][0]) is None
+
+
+def test_only_latest_requests_are_kept(history_db, monkeypatch) -> None:
+    monkeypatch.setattr(storage, 'HISTORY_LIMIT', 2)
+
+    for day in range(3):
+        storage.save_search_request('3', '2022-10-0{day} 12:00:00'.format(day=day + 1), {'Город': day})
+
+    summaries = storage.get_search_request_summaries('3')
+    assert [summary['Город'] for _, _, summary in summaries] == [1, 2]
+    assert len(storage.get_search_request_summaries('1')) == 2
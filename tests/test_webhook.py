@@ -0,0 +1,126 @@
+"""Тесты распределения обновлений в режиме вебхука (модуль webhook)."""
+
+import json
+import threading
+from http.server import ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Iterator
+
+import pytest
+
+import requests
+
+import webhook
+from webhook import UpdateDispatcher, WebhookHandler, update_owner, update_user_id
+
+
+def message_update(update_id: int, user_id: int) -> dict:
+    return {'update_id': update_id, 'message': {'message_id': 1, 'from': {'id': user_id}, 'text': '/help'}}
+
+
+def test_update_user_id_is_taken_from_the_sender() -> None:
+    callback_update = {'update_id': 5, 'callback_query': {'id': '1', 'from': {'id': 42}, 'data': '3'}}
+
+    assert update_user_id(message_update(1, 42)) == 42
+    assert update_user_id(callback_update) == 42
+    assert update_user_id({'update_id': 7, 'poll': {'id': '1'}}) == 7
+
+
+def test_owner_is_chosen_by_user_id(monkeypatch) -> None:
+    monkeypatch.setattr(webhook, 'WEBHOOK_PEERS', ['http://a', 'http://b', 'http://c'])
+
+    assert update_owner(message_update(1, 42)) == 0
+    assert update_owner(message_update(2, 43)) == 1
+
+    monkeypatch.setattr(webhook, 'WEBHOOK_PEERS', [])
+    assert update_owner(message_update(1, 43)) == webhook.WEBHOOK_INSTANCE
+
+
+def test_updates_of_one_user_go_to_one_queue() -> None:
+    dispatcher = UpdateDispatcher(workers=3, queue_size=10)
+
+    for update_id in range(4):
+        assert dispatcher.submit(message_update(update_id, 4))
+    assert dispatcher.submit(message_update(10, 5))
+
+    assert [update_queue.qsize() for update_queue in dispatcher.queues] == [0, 4, 1]
+    assert [dispatcher.queues[1].get()['update_id'] for _ in range(4)] == [0, 1, 2, 3]
+    assert dispatcher.depth() == 1
+
+
+def test_full_queue_rejects_update() -> None:
+    dispatcher = UpdateDispatcher(workers=1, queue_size=1)
+
+    assert dispatcher.submit(message_update(1, 1))
+    assert not dispatcher.submit(message_update(2, 1))
+    assert dispatcher.rejected == 1
+
+
+@pytest.fixture
+def server(monkeypatch) -> Iterator[SimpleNamespace]:
+    """HTTP-сервер вебхука на свободном порту с диспетчером без потоков-обработчиков (очередь на одно обновление)."""
+    monkeypatch.setattr(webhook, 'WEBHOOK_SECRET', '')
+    monkeypatch.setattr(webhook, 'WEBHOOK_PEERS', [])
+    monkeypatch.setattr(webhook, 'WEBHOOK_INSTANCE', 0)
+    dispatcher = UpdateDispatcher(workers=1, queue_size=1)
+    handler_class = type('BoundWebhookHandler', (WebhookHandler,), {'dispatcher': dispatcher})
+    http_server = ThreadingHTTPServer(('127.0.0.1', 0), handler_class)
+    thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+    thread.start()
+    url = 'http://127.0.0.1:{port}{path}'.format(port=http_server.server_address[1], path=webhook.WEBHOOK_PATH)
+    yield SimpleNamespace(url=url, dispatcher=dispatcher)
+    http_server.shutdown()
+    http_server.server_close()
+
+
+def post(url: str, update_data: dict, **kwargs) -> requests.Response:
+    return requests.post(url, data=json.dumps(update_data), timeout=5, **kwargs)
+
+
+def test_update_is_queued_until_the_queue_is_full(server) -> None:
+    assert post(server.url, message_update(1, 1)).status_code == 200
+    response = post(server.url, message_update(2, 1))
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert server.dispatcher.queues[0].get_nowait()['update_id'] == 1
+
+
+def test_invalid_requests_are_rejected(server, monkeypatch) -> None:
+    assert requests.post(server.url + 'x', data='{}', timeout=5).status_code == 404
+    assert requests.post(server.url, data='not json', timeout=5).status_code == 400
+    assert requests.post(server.url, data='[1]', timeout=5).status_code == 400
+
+    monkeypatch.setattr(webhook, 'WEBHOOK_MAX_BODY_SIZE', 10)
+    assert post(server.url, message_update(1, 1)).status_code == 413
+
+    monkeypatch.setattr(webhook, 'WEBHOOK_SECRET', 'secret')
+    assert post(server.url, message_update(1, 1)).status_code == 403
+    assert server.dispatcher.depth() == 0
+
+
+def test_update_of_another_instance_is_forwarded(server, monkeypatch) -> None:
+    forwarded = []
+
+    def fake_post(url: str, data: bytes, headers: dict, timeout: tuple) -> SimpleNamespace:
+        forwarded.append((url, json.loads(data)['update_id'], headers[webhook.FORWARDED_HEADER]))
+        return SimpleNamespace(status_code=200)
+
+    monkeypatch.setattr(webhook, 'WEBHOOK_PEERS', ['http://a', 'http://b'])
+    monkeypatch.setattr(webhook.peer_session, 'post', fake_post)
+
+    assert post(server.url, message_update(1, 3)).status_code == 200
+    assert post(server.url, message_update(2, 4)).status_code == 200
+
+    assert forwarded == [('http://b', 1, '1')]
+    assert server.dispatcher.forwarded == 1
+    assert server.dispatcher.queues[0].get_nowait()['update_id'] == 2
+
+
+def test_forwarded_update_is_not_forwarded_again(server, monkeypatch) -> None:
+    monkeypatch.setattr(webhook, 'WEBHOOK_PEERS', ['http://a', 'http://b'])
+
+    response = post(server.url, message_update(1, 3), headers={webhook.FORWARDED_HEADER: '1'})
+
+    assert response.status_code == 421
+    assert server.dispatcher.misrouted == 1
@@ -0,0 +1,255 @@
+"""
+Модуль трассировки поисковых запросов.
+
+Каждый поиск получает трассу (Trace) с уникальным trace_id в момент вызова команды (/lowprice, /highprice,
+/bestdeal). В трассу записываются интервалы (span) этапов поиска: шаги диалога (city_definition, set_hotels_number,
+set_dates, set_photo_need_and_search, distance_definition, price_definition), search_for_matches, каждый
+address_adding и photo_adding, каждый запрос к API Hotels.com, каждая отправка в Telegram (вместе с ожиданием
+лимитов планировщика outbound) и saving_search_request.
+
+Трассируется доля поисков TRACE_SAMPLE_RATE (решение принимается при вызове команды, для остальных
+поисков интервалы не записываются). Если время работы бота над поиском (сумма длительностей шагов диалога,
+без времени, пока бот ждал ответа пользователя) не меньше TRACE_SLOW_THRESHOLD, трасса по завершении
+поиска дописывается строкой JSON в файл TRACE_FILE.
+
+Текущая трасса потока хранится в контекстной переменной current_trace: её устанавливает декоратор traced,
+а используют функции, которые не получают поисковую сессию (отправка сообщений, запросы к API).
+В асинхронном режиме (async_engine) записываются те же интервалы. Трассы дописываются в файл в отдельном
+потоке (_trace_writer), поэтому закрытие трассы не задерживает обработчики и цикл событий.
+"""
+
+import contextvars
+import inspect
+import json
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from functools import wraps
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional
+
+from config import TRACE_FILE, TRACE_SAMPLE_RATE, TRACE_SLOW_THRESHOLD
+
+from telebot import logger
+
+
+class Trace:
+    """
+    Класс трассы одного поиска.
+
+    :param command: команда поиска
+    :type command: str
+
+    :param user_id: ID пользователя
+    :type user_id: int
+    """
+
+    __slots__ = ('trace_id', 'command', 'user_id', 'started_at', 'started', 'busy', 'spans', 'completed', '_lock')
+
+    def __init__(self, command: str, user_id: int) -> None:
+        self.trace_id = uuid.uuid4().hex
+        self.command = command
+        self.user_id = user_id
+        self.started_at = datetime.now().isoformat(timespec='milliseconds')
+        self.started = time.perf_counter()
+        self.busy = 0.0
+        self.spans: List[Dict[str, Any]] = list()
+        self.completed = False
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, step: bool = False, **attributes: Any) -> Iterator[None]:
+        """
+        Метод записывает интервал выполнения блока кода.
+
+        :param name: название интервала
+        :type name: str
+
+        :param step: интервал - шаг диалога (его длительность входит во время работы бота над поиском)
+        :type step: bool
+
+        :param attributes: дополнительные данные интервала
+        """
+        started = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as exception:
+            error = type(exception).__name__
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            span = dict(name=name, start=round(started - self.started, 6), duration=round(duration, 6),
+                        thread=threading.current_thread().name, **attributes)
+            if error:
+                span['error'] = error
+            with self._lock:
+                self.spans.append(span)
+                if step:
+                    self.busy += duration
+
+    def record(self) -> Dict[str, Any]:
+        """
+        Метод составляет запись трассы для файла TRACE_FILE.
+
+        :rtype: Dict[str, Any]
+        """
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span['start'])
+        return {'trace_id': self.trace_id, 'command': self.command, 'user_id': self.user_id,
+                'started_at': self.started_at, 'busy': round(self.busy, 6),
+                'elapsed': round(time.perf_counter() - self.started, 6), 'spans': spans}
+
+
+current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar('current_trace', default=None)
+_trace_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='trace-writer')
+
+
+def start_trace(command: str, user_id: int) -> Optional[Trace]:
+    """
+    Функция начинает трассу поиска, если поиск попал в выборку (TRACE_SAMPLE_RATE).
+
+    :param command: команда поиска
+    :type command: str
+
+    :param user_id: ID пользователя
+    :type user_id: int
+
+    :return: трасса или None, если поиск не трассируется
+    :rtype: Trace | None
+    """
+    if TRACE_SAMPLE_RATE <= 0 or random.random() >= TRACE_SAMPLE_RATE:
+        return None
+    return Trace(command, user_id)
+
+
+def complete_trace(trace: Optional[Trace]) -> None:
+    """
+    Функция отмечает, что поиск завершён: трасса будет закрыта по окончании текущего шага диалога.
+
+    :param trace: трасса поиска
+    :type trace: Trace | None
+    """
+    if trace is not None:
+        trace.completed = True
+
+
+def finish_trace(trace: Trace) -> None:
+    """
+    Функция закрывает трассу: медленная трасса (TRACE_SLOW_THRESHOLD) дописывается в файл TRACE_FILE
+    в потоке _trace_writer (строки записываются по одной, в порядке закрытия трасс).
+
+    :param trace: трасса поиска
+    :type trace: Trace
+    """
+    if trace.busy < TRACE_SLOW_THRESHOLD:
+        return
+    _trace_writer.submit(write_trace_line, json.dumps(trace.record(), ensure_ascii=False))
+
+
+def write_trace_line(line: str) -> None:
+    """
+    Функция дописывает строку трассы в файл TRACE_FILE; ошибка записи выводится в лог.
+
+    :param line: запись трассы (JSON)
+    :type line: str
+    """
+    try:
+        with open(TRACE_FILE, 'a', encoding='utf-8') as file:
+            file.write(line + '\n')
+    except OSError:
+        logger.exception('Не удалось записать трассу в файл %s', TRACE_FILE)
+
+
+def span(trace: Optional[Trace], name: str, **attributes: Any) -> ContextManager[None]:
+    """
+    Функция возвращает контекстный менеджер интервала трассы (если трассы нет - пустой).
+
+    :param trace: трасса поиска
+    :type trace: Trace | None
+
+    :param name: название интервала
+    :type name: str
+
+    :param attributes: дополнительные данные интервала
+
+    :rtype: ContextManager[None]
+    """
+    if trace is None:
+        return nullcontext()
+    return trace.span(name, **attributes)
+
+
+def current_span(name: str, **attributes: Any) -> ContextManager[None]:
+    """
+    Функция возвращает контекстный менеджер интервала текущей трассы потока (current_trace).
+
+    :param name: название интервала
+    :type name: str
+
+    :param attributes: дополнительные данные интервала
+
+    :rtype: ContextManager[None]
+    """
+    return span(current_trace.get(), name, **attributes)
+
+
+def traced(name: str,
+           trace_of: Callable[..., Optional[Trace]],
+           step: bool = False,
+           attributes_of: Optional[Callable[..., Dict[str, Any]]] = None) -> Callable:
+    """
+    Декоратор записывает выполнение функции интервалом трассы и на время выполнения делает трассу
+    текущей (current_trace); декорировать можно и корутинные функции (асинхронный режим). Если step=True,
+    функция - шаг диалога: после шага, завершившего поиск (см. complete_trace), трасса закрывается.
+
+    :param name: название интервала
+    :type name: str
+
+    :param trace_of: функция, возвращающая трассу по позиционным аргументам декорируемой функции (*args)
+    :type trace_of: Callable
+
+    :param step: декорируемая функция - шаг диалога
+    :type step: bool
+
+    :param attributes_of: функция, возвращающая дополнительные данные интервала по позиционным аргументам
+        декорируемой функции (*args)
+    :type attributes_of: Callable | None
+
+    :rtype: Callable
+    """
+    @contextmanager
+    def activated(trace: Trace, args: tuple) -> Iterator[None]:
+        token = current_trace.set(trace)
+        try:
+            attributes = attributes_of(*args) if attributes_of else {}
+            with trace.span(name, step=step, **attributes):
+                yield
+        finally:
+            current_trace.reset(token)
+            if step and trace.completed:
+                finish_trace(trace)
+
+    def decorator(function: Callable) -> Callable:
+        if inspect.iscoroutinefunction(function):
+            @wraps(function)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                trace = trace_of(*args)
+                if trace is None:
+                    return await function(*args, **kwargs)
+                with activated(trace, args):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            trace = trace_of(*args)
+            if trace is None:
+                return function(*args, **kwargs)
+            with activated(trace, args):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,190 @@
+"""
+Модуль транспортного уровня бота.
+
+Все запросы к API Hotels.com (hotels4.p.rapidapi.com) и к API Telegram (api.telegram.org)
+проходят через общие HTTP-сессии, каждая из которых держит пул keep-alive соединений.
+Благодаря этому TCP+TLS соединение с хостом устанавливается один раз и затем переиспользуется,
+а не открывается заново при каждом запросе.
+
+api_session - сессия для запросов к API Hotels.com (с заголовками RapidAPI).
+tg_session - сессия, через которую работает клиент API Telegram (telebot.apihelper).
+api_flights - объединение одинаковых одновременных запросов к API Hotels.com (см. модуль singleflight):
+    одинаковые запросы разных пользователей разделяют один запрос к серверу и его результат.
+
+Запросы к API Hotels.com выполняются с таймаутом, повторами, дублирующими запросами и circuit breaker
+по настройкам своего адреса (см. модуль resilience).
+
+Ответы API Hotels.com декодируются из байтов и сразу сводятся к компактным записям (см. модуль records).
+"""
+
+import time
+from typing import Any, Dict, Optional
+
+from config import HTTP_CONNECT_TIMEOUT, HTTP_POOL_SIZE, HTTP_READ_TIMEOUT, headers, main_url
+
+from metrics import API_ERRORS, record_api_call, register_stats
+
+from records import extract_payload, json_loads
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from resilience import ApiStatusError, api_resilience, parse_retry_after
+
+from singleflight import SingleFlight
+
+from telebot import apihelper
+
+from tracing import current_span
+
+
+def create_session(pool_size: int, session_headers: Optional[Dict[str, str]] = None) -> requests.Session:
+    """
+    Функция создаёт HTTP-сессию с пулом keep-alive соединений заданного размера.
+
+    :param pool_size: максимальное количество одновременно открытых соединений с хостом
+    :type pool_size: int
+
+    :param session_headers: заголовки, которые будут отправляться с каждым запросом сессии
+    :type session_headers: Dict[str, str] | None
+
+    :return: session - HTTP-сессия
+    :rtype: requests.Session
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    if session_headers:
+        session.headers.update(session_headers)
+    return session
+
+
+api_session = create_session(HTTP_POOL_SIZE, headers)
+tg_session = create_session(HTTP_POOL_SIZE)
+
+apihelper.session = tg_session
+apihelper.SESSION_TIME_TO_LIVE = None
+apihelper.CONNECT_TIMEOUT = HTTP_CONNECT_TIMEOUT
+apihelper.READ_TIMEOUT = HTTP_READ_TIMEOUT
+
+api_flights = SingleFlight()
+register_stats('hotels4_singleflight', 'Объединение одинаковых запросов к API Hotels.com', 'engine',
+               {'sync': api_flights.stats})
+
+
+def api_get(url_part: str, querystring: Dict[str, str]) -> requests.Response:
+    """
+    Функция отправляет GET-запрос к API Hotels.com через общую сессию с пулом соединений
+    (с таймаутом на чтение ответа из настроек адреса, см. модуль resilience).
+
+    :param url_part: часть url, отвечающая за конкретный запрос
+    :type url_part: str
+
+    :param querystring: параметры запроса
+    :type querystring: Dict[str, str]
+
+    :return: response - ответ сервера
+    :rtype: requests.Response
+
+    :raises requests.RequestException: если соединение не удалось установить
+        или ответ не был получен за отведённое время
+    """
+    return api_session.get(main_url + url_part, params=querystring,
+                           timeout=(HTTP_CONNECT_TIMEOUT, api_resilience.policy(url_part).timeout))
+
+
+def request_key(url_part: str, querystring: Dict[str, Any]) -> tuple:
+    """
+    Функция формирует ключ запроса к API Hotels.com, не зависящий от порядка параметров.
+
+    :param url_part: часть url, отвечающая за конкретный запрос
+    :type url_part: str
+
+    :param querystring: параметры запроса
+    :type querystring: Dict[str, Any]
+
+    :rtype: tuple
+    """
+    return url_part, tuple(sorted((key, str(value)) for key, value in querystring.items()))
+
+
+def fetch_once(url_part: str, querystring: Dict[str, str]) -> Any:
+    """
+    Функция выполняет одну попытку GET-запроса к API Hotels.com и возвращает нужные боту данные ответа
+    (см. records.extract_payload).
+
+    :param url_part: часть url, отвечающая за конкретный запрос
+    :type url_part: str
+
+    :param querystring: параметры запроса
+    :type querystring: Dict[str, str]
+
+    :rtype: Any
+
+    :raises resilience.ApiStatusError: если код ответа не равен 200
+    :raises ValueError: если в ответе нет нужных полей
+    :raises json.decoder.JSONDecodeError: если формат ответа от сервера некорректен
+    :raises requests.RequestException: если соединение не удалось установить
+        или ответ не был получен за отведённое время
+    """
+    started = time.monotonic()
+    try:
+        response = api_get(url_part, querystring)
+    except requests.RequestException:
+        record_api_call(url_part, time.monotonic() - started, 'network')
+        raise
+    record_api_call(url_part, time.monotonic() - started, response.status_code, response.headers)
+    if response.status_code != 200:
+        raise ApiStatusError(response.status_code, parse_retry_after(response.headers.get('Retry-After')))
+    try:
+        return extract_payload(url_part, json_loads(response.content))
+    except ValueError:
+        API_ERRORS.inc(url_part, 'invalid_json')
+        raise
+
+
+def fetch_json(url_part: str, querystring: Dict[str, str]) -> Any:
+    """
+    Функция отправляет GET-запрос к API Hotels.com (с повторами, дублирующими запросами и circuit breaker,
+    см. модуль resilience) и возвращает нужные боту данные ответа.
+
+    :param url_part: часть url, отвечающая за конкретный запрос
+    :type url_part: str
+
+    :param querystring: параметры запроса
+    :type querystring: Dict[str, str]
+
+    :rtype: Any
+
+    :raises resilience.CircuitOpenError: если запросы к API прекращены из-за его недоступности
+    :raises ValueError: если код ответа не равен 200 или в ответе нет нужных полей
+    :raises json.decoder.JSONDecodeError: если формат ответа от сервера некорректен
+    :raises requests.RequestException: если соединение не удалось установить
+        или ответ не был получен за отведённое время
+    """
+    return api_resilience.call(url_part, fetch_once, url_part, querystring)
+
+
+def api_get_json(url_part: str, querystring: Dict[str, str]) -> Any:
+    """
+    Функция fetch_json с объединением одинаковых одновременных запросов: если такой же запрос
+    уже выполняется для другого пользователя, функция дожидается его и возвращает тот же результат.
+    Результат может быть общим для нескольких пользователей, поэтому изменять его нельзя.
+
+    :param url_part: часть url, отвечающая за конкретный запрос
+    :type url_part: str
+
+    :param querystring: параметры запроса
+    :type querystring: Dict[str, str]
+
+    :rtype: Any
+
+    :raises resilience.CircuitOpenError: если запросы к API прекращены из-за его недоступности
+    :raises ValueError: если код ответа не равен 200 или в ответе нет нужных полей
+    :raises json.decoder.JSONDecodeError: если формат ответа от сервера некорректен
+    :raises requests.RequestException: если соединение не удалось установить
+        или ответ не был получен за отведённое время
+    """
+    with current_span('hotels4', endpoint=url_part):
+        return api_flights.do(request_key(url_part, querystring), fetch_json, url_part, querystring)
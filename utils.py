@@ -1,87 +1,200 @@
 """
 Модуль, который занимается обработкой данных, получаемых от пользователя в чате с ботом, и выводит
 результаты поиска отелей.
+
+Шаги поискового диалога и поиска - корутинные функции, которые обращаются к API Hotels.com и Telegram
+только через текущий движок (см. модуль engine), поэтому одни и те же шаги выполняются и в синхронном
+режиме бота (polling, webhook), и в асинхронном (async_engine).
+Имя следующего шага диалога хранится в поисковой сессии пользователя (next_step): ответ пользователя
+передаётся этому шагу обработчиком handlers.dialog (см. DIALOG_STEPS).
 """
 
+import asyncio
 import json
 import re
+import time
 from datetime import datetime
-from operator import itemgetter
-from typing import Any, Dict, List, Union
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from cache import TTLCache
+
+from config import (BESTDEAL_MAX_PAGES, BESTDEAL_PRICE_WEIGHT, BESTDEAL_TIME_BUDGET, HOTEL_ADDRESS_CACHE_TTL,
+                    HOTEL_CACHE_SIZE, HOTEL_PHOTOS_CACHE_TTL, LOCATION_CACHE_FILE, LOCATION_CACHE_SIZE,
+                    LOCATION_CACHE_TTL, MAX_PHOTO_NUMBER, MEDIA_GROUP_MAX_SIZE, RESULT_CACHE_FILE, RESULT_CACHE_SIZE,
+                    RESULT_CACHE_TTL, RESULT_STREAMING, search_sessions)
 
-from config import BOT_TOKEN, headers, hotels_bot, main_url, search_data, search_result, tg_api_url
+from engine import get_engine, send_message
 
 from keyboards.size_9_keyboard import get_keyboard
 
-import requests
+from metrics import PREFETCH, SEARCH_LATENCY, register_stats
+
+from ranking import HotelsSelection
+
+from records import HotelRecord, ListedHotel, PropertiesPage
+
+from rendering import PARSE_MODE, html_pairs, result_messages
+
+from resilience import CircuitOpenError
+
+from sessions import SearchSession, StayDates
+
+from storage import get_connection, save_search_request
 
 from telebot import types
 
+from tracing import Trace, complete_trace, span, start_trace, traced
+
+
+location_cache = TTLCache(LOCATION_CACHE_SIZE, LOCATION_CACHE_TTL, LOCATION_CACHE_FILE)
+address_cache = TTLCache(HOTEL_CACHE_SIZE, HOTEL_ADDRESS_CACHE_TTL)
+photos_cache = TTLCache(HOTEL_CACHE_SIZE, HOTEL_PHOTOS_CACHE_TTL)
+result_cache = TTLCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL, RESULT_CACHE_FILE)
+register_stats('cache', 'Статистика кэшей ответов API Hotels.com', 'cache',
+               {'location': location_cache.stats, 'address': address_cache.stats, 'photos': photos_cache.stats,
+                'result': result_cache.stats})
+RESULT_CACHE_KEY_PARAMS = ('destinationId', 'checkIn', 'checkOut', 'sortOrder', 'locale', 'currency')
+
+DATES_QUESTION = ('Укажите даты заезда-выезда (формат: гггг-мм-дд - гггг-мм-дд).\n'
+                  'Например 2022-10-15 - 2022-10-21')
+PHOTO_QUESTION = '\n'.join(('Показывать ли фото для каждого отеля (да/нет)?',
+                            'Если да, то сколько (через пробел, макс.фото = 6)?',
+                            'Например:\nНет\n*или*\nДа 5'))
+DISTANCE_QUESTION = '\n'.join(('Введите предельное расстояние отеля от центра города (в км)',
+                               'Например:\n5\n*или*\n9,3'))
+PRICE_QUESTION = '\n'.join(('Введите максимальную стоимость номера за одну ночь (в $)',
+                            'Например:\n50\n*или*\n220,5'))
+INPUT_ERROR_TEXT = 'Что-то не так. Введите ответ как показано в примере выше'
+SERVICE_UNAVAILABLE_TEXT = ('Сервис поиска отелей временно недоступен.\n'
+                            'Пожалуйста, попробуйте начать поиск через несколько минут')
+INVALID_RESPONSE_TEXT = ('Некорректный ответ от сервера.\n'
+                         'Пожалуйста, подождите и попробуйте начать поиск снова')
+SESSION_EXPIRED_TEXT = ('Поисковый запрос устарел.\n'
+                        'Пожалуйста, начните поиск снова с ввода команды или /help')
+LOCATION_ERROR_TEXT = '\n'.join(('Что-то не так с ответом сервера по запросу локации...',
+                                 'Попробуйте подождать и попробовать снова.'))
+LOCATION_RESPONSE_ERROR_TEXT = ('От сервера пришёл некорректный ответ.\n'
+                                'Пожалуйста, попробуйте снова, начав с ввода команды или /help')
+CITY_INPUT_ERROR_TEXT = ('Некорректный ввод.\n'
+                         'Пожалуйста, попробуйте ввести название города снова')
+HOTELS_NUMBER_QUESTION = 'Сколько отелей показать?'
+DATES_ERROR_TEXT = 'Даты введены некорректно. Попробуйте снова.'
+SEARCH_START_TEXT = 'Приступаю к поиску'
+MATCHES_ERROR_TEXT = 'Что-то не так с ответом сервера по деталям отеля...'
+END_SEARCHING_ERROR_TEXT = 'Попробуйте подождать и попробовать снова.'
+
+
+def load_persisted_data() -> None:
+    """
+    Функция загружает сохранённые на диск кэши (destinationId городов и, если задан RESULT_CACHE_FILE,
+    результатов поиска) и открывает базу истории поиска.
+    При запуске бота вызывается в фоновом потоке (см. модуль main), чтобы бот начинал принимать
+    сообщения, не дожидаясь чтения файлов.
+    """
+    location_cache.load()
+    result_cache.load()
+    get_connection()
+
 
-def empty_dictionary(user_id: int) -> None:
+async def empty_dictionary(user_id: int, search_command: str, search_pattern: str) -> SearchSession:
     """
-    Функция очищает словари search_data и search_result для конкретного пользователя (по его ID).
-    Это требуется для того, чтобы новые данные при новом поисковом запросе не накладывались
+    Функция создаёт новую поисковую сессию для конкретного пользователя (по его ID) в хранилище search_sessions,
+    удаляя прежнюю. Это требуется для того, чтобы новые данные при новом поисковом запросе не накладывались
     на старые и не было путаницы между данных разных пользователей.
+
+    :param user_id: ID пользователя
+    :type user_id: int
+
+    :param search_command: команда поиска
+    :type search_command: str
+
+    :param search_pattern: порядок сортировки отелей в запросе к API
+    :type search_pattern: str
+
+    :return: новая поисковая сессия
+    :rtype: sessions.SearchSession
     """
-    try:
-        search_data[user_id].clear()
-        search_result[user_id].clear()
-    except KeyError:
-        search_data.setdefault(user_id, dict())
-        search_result.setdefault(user_id, dict())
+    session = await get_engine().blocking(search_sessions.start, user_id, search_command, search_pattern)
+    session.trace = start_trace(search_command, user_id)
+    return session
 
 
-def info_pairs_formation(dictionary: Dict[str, Union[str, float, list]], *exceptions: str) -> List[str]:
+def session_trace(*args: Any) -> Optional[Trace]:
     """
-    Функция составляет список строк-пар 'заголовок: значение' из полученного словаря.
-    Если есть слова-исключения, то функция пропускает эти ключи в словаре.
+    Функция возвращает трассу поиска (см. модуль tracing) по аргументам шагов диалога (message, session),
+    функций, дополняющих данные отеля (user_id, session, hotel), и saving_search_request (user_id, session):
+    у всех них поисковая сессия - второй аргумент.
 
-    :param dictionary: словарь, из элементов которого составляются пары
-    :type dictionary: Dict[str, str | float | list]
+    :rtype: tracing.Trace | None
+    """
+    return args[1].trace
 
-    :param exceptions: ключи словаря, которые следует пропускать
-    :type exceptions: str
 
-    :return: info - список строковых пар
-    :rtype: List[str]
+def hotel_attributes(*args: Any) -> Dict[str, Any]:
+    """
+    Функция возвращает данные интервала трассы по аргументам функций, дополняющих данные отеля
+    (user_id, session, hotel): ID отеля.
+
+    :rtype: Dict[str, Any]
     """
-    info = ['{header}: {content}'.format(header=header, content=content)
-            for header, content in dictionary.items() if header not in exceptions]
-    return info
+    return {'hotel_id': args[2].hotel_id}
 
 
-def output_each_hotel_info(message: types.Message, hotels_list: List[dict]) -> None:
+async def get_session(user_id: int) -> Optional[SearchSession]:
     """
-    Функция обрабатывает получаемый список словарей и в качестве сообщения пользователю выводит
-    информацию по каждому отелю, в том числе фотографии.
+    Функция возвращает поисковую сессию пользователя.
+    Если сессия истекла (пользователь долго не отвечал) или поиск уже завершён, пользователю
+    присылается сообщение с просьбой начать поиск заново.
+
+    :param user_id: ID пользователя
+    :type user_id: int
+
+    :return: поисковая сессия или None
+    :rtype: sessions.SearchSession | None
+    """
+    session = await get_engine().blocking(search_sessions.get, user_id)
+    if session is None:
+        await send_message(user_id, SESSION_EXPIRED_TEXT)
+    return session
 
-    :param message: сообщение пользователя
-    :type message: telebot.types.Message
 
-    :param hotels_list: список словарей (один словарь - один отель)
-    :type hotels_list: List[dict]
+async def output_search_result(user_id: int, header: str, hotels_list: List[HotelRecord]) -> None:
     """
-    for hotel in hotels_list:
-        hotel_info = info_pairs_formation(hotel, 'Фото', 'ID')
-        hotels_bot.send_message(message.from_user.id, '\n'.join(hotel_info))
-        if hotel['Фото']:
-            for image_url in hotel['Фото']:
-                send_photo(message.from_user.id, image_url)
+    Функция выводит пользователю заголовок результатов и информацию по каждому отелю, в том числе фотографии.
+    Заголовок и карточки отелей упаковываются в как можно меньшее количество сообщений
+    (см. rendering.result_messages), фото каждого отеля отправляются одним альбомом.
 
+    :param user_id: ID пользователя
+    :type user_id: int
 
-def get_request_data(message: types.Message,
-                     url_part: str,
-                     querystring: Dict[str, str],
-                     error_text: str) -> Dict[str, Any]:
+    :param header: заголовок результатов (HTML)
+    :type header: str
+
+    :param hotels_list: записи отелей
+    :type hotels_list: List[records.HotelRecord]
     """
-    Функция отправляет запрос через API на получение данных.
+    for text, photos in result_messages(header, hotels_list):
+        if photos:
+            await send_photo_album(user_id, photos, caption=text)
+        else:
+            await send_message(user_id, text, parse_mode=PARSE_MODE, disable_web_page_preview=True)
+
+
+async def get_request_data(user_id: int,
+                           url_part: str,
+                           querystring: Dict[str, str],
+                           error_text: Optional[str]) -> Any:
+    """
+    Функция отправляет запрос через API на получение данных (через текущий движок, см. engine.Engine.fetch).
     В случае, если статус ответа не "200", вызывается и обрабатывается исключение.
 
-    Функция возвращает десериализованный json-объект (словарь).
+    Функция возвращает нужные боту данные ответа (см. records.EXTRACTORS): список destinationId,
+    страницу списка отелей, адрес отеля или ссылки на его фото; при ошибке - None.
+    Одинаковые одновременные запросы разных пользователей объединяются в один запрос к серверу
+    (см. модуль singleflight), поэтому изменять полученные данные нельзя.
 
-    :param message: сообщение пользователя
-    :type message: telebot.types.Message
+    :param user_id: ID пользователя
+    :type user_id: int
 
     :param url_part: часть url, отвечающая за конкретный запрос
     :type url_part: str
@@ -90,32 +203,37 @@ def get_request_data(message: types.Message,
     :type querystring: Dict[str, str]
 
     :param error_text: текст, который будет выведен пользователю в случае возникновения
-        исключения (если код ответа не равен 200)
-    :type error_text: str
+        исключения (если код ответа не равен 200); если None, ошибка пользователю не выводится
+    :type error_text: str | None
 
-    :return: json.loads(response.text) - десериализованный json-объект (словарь)
-    :rtype: Dict[str, Any]
+    :return: данные ответа или None
+    :rtype: Any
 
-    :raises ValueError: если код ответа не равен 200, вызывается исключение;
+    :raises ValueError: если код ответа не равен 200 или в ответе нет нужных полей, вызывается исключение;
+        обработка: пользователю в чате присылается сообщение об ошибке
+
+    :raises engine.Engine.network_errors: если соединение не удалось установить или истёк таймаут;
         обработка: пользователю в чате присылается сообщение об ошибке
 
     :raises json.decoder.JSONDecodeError: если формат ответа от сервера некорректен;
         обработка: пользователю в чате присылается сообщение об ошибке с просьбой начать поиск снова
+
+    :raises resilience.CircuitOpenError: если запросы к API прекращены из-за его недоступности;
+        обработка: пользователю в чате присылается сообщение о недоступности сервиса
     """
-    url = main_url + url_part
+    engine = get_engine()
     try:
-        response = requests.get(url, headers=headers, params=querystring)
-        if response.status_code != 200:
-            raise ValueError
-    except ValueError:
-        hotels_bot.send_message(message.from_user.id, error_text)
-    else:
-        try:
-            return json.loads(response.text)
-        except json.decoder.JSONDecodeError:
-            error_text = ('Некорректный ответ от сервера.\n'
-                          'Пожалуйста, подождите и попробуйте начать поиск снова')
-            hotels_bot.send_message(message.from_user.id, error_text)
+        return await engine.fetch(url_part, querystring)
+    except CircuitOpenError:
+        if error_text:
+            await send_message(user_id, SERVICE_UNAVAILABLE_TEXT)
+    except json.decoder.JSONDecodeError:
+        if error_text:
+            await send_message(user_id, INVALID_RESPONSE_TEXT)
+    except (ValueError,) + engine.network_errors:
+        if error_text:
+            await send_message(user_id, error_text)
+    return None
 
 
 def days_calculation(check_in: datetime, check_out: datetime) -> int:
@@ -140,222 +258,689 @@ def days_calculation(check_in: datetime, check_out: datetime) -> int:
     return delta
 
 
-def hotel_info_filling(message: types.Message, i_hotel: Dict[str, Any]) -> None:
+def hotel_base_formation(session: SearchSession, i_hotel: ListedHotel) -> HotelRecord:
     """
-    Функция создаёт словарь для отеля и заполняет его нужными данными.
-    В качестве источника данных для функции выступает полученный от API словарь по конкретному отелю.
-    В итоге созданный словарь добавляется в список отелей словаря с результатами поиска.
+    Функция создаёт запись отеля и заполняет её данными, которые не требуют дополнительных
+    запросов к API: названием, ценой, расстоянием от центра и ID.
 
-    :param message: сообщение пользователя
-    :type message: telebot.types.Message
+    :param session: поисковая сессия пользователя
+    :type session: sessions.SearchSession
+
+    :param i_hotel: отель из списка отелей, полученного от API
+    :type i_hotel: records.ListedHotel
 
-    :param i_hotel: словарь, полученный от API, с данными отеля, которые нужно обработать
-    :type i_hotel: Dict[str, Any]
+    :return: hotel - запись отеля
+    :rtype: records.HotelRecord
     """
-    hotel = dict()
-    hotel['Название'] = i_hotel['name']
-    hotel['Цена, $'] = i_hotel['ratePlan']['price']['exactCurrent']
-    hotel['Цена за все дни, $'] = round(hotel['Цена, $']
-                                        * search_data[message.from_user.id]['dates']['days_of_stay'], 2)
-    hotel['От центра'] = i_hotel['landmarks'][0]['distance']
-    hotel['ID'] = i_hotel['id']
-    address_adding(message, hotel)
-    hotel['Ссылка на отель'] = 'https://www.hotels.com/ho{id}/'.format(id=i_hotel['id'])
+    total_price = None if i_hotel.price is None else round(i_hotel.price * session.dates.days_of_stay, 2)
+    return HotelRecord(i_hotel.hotel_id, i_hotel.name, i_hotel.price, total_price, i_hotel.distance)
 
-    hotel['Фото'] = []
-    if search_data[message.from_user.id]['photo_number'] != 'none':
-        photo_adding(message, hotel)
 
+async def hotel_info_filling(user_id: int, session: SearchSession, i_hotel: ListedHotel) -> HotelRecord:
+    """
+    Функция создаёт запись отеля и заполняет её нужными данными (адресом и, если нужно, фото).
+    Функция выполняется фоновыми задачами движка (см. engine.Engine.spawn), поэтому не изменяет общий
+    список отелей, а возвращает созданную запись.
+
+    :param user_id: ID пользователя
+    :type user_id: int
+
+    :param session: поисковая сессия пользователя
+    :type session: sessions.SearchSession
+
+    :param i_hotel: отель из списка отелей, полученного от API
+    :type i_hotel: records.ListedHotel
+
+    :return: hotel - запись отеля
+    :rtype: records.HotelRecord
+    """
+    hotel = hotel_base_formation(session, i_hotel)
+    await address_adding(user_id, session, hotel)
+    if session.photo_number:
+        await photo_adding(user_id, session, hotel)
+    return hotel
+
+
+async def hotels_enrichment(user_id: int,
+                            session: SearchSession,
+                            city_hotels: List[ListedHotel]) -> List[HotelRecord]:
+    """
+    Функция параллельно (фоновыми задачами движка: в пуле потоков enrichment_pool или задачами asyncio,
+    не более ENRICHMENT_WORKERS одновременно) формирует записи по каждому отелю из списка,
+    включая запросы адреса и фото к API Hotels.com. Порядок отелей сохраняется.
+
+    :param user_id: ID пользователя
+    :type user_id: int
+
+    :param session: поисковая сессия пользователя
+    :type session: sessions.SearchSession
+
+    :param city_hotels: отобранные отели из списка отелей, полученного от API
+    :type city_hotels: List[records.ListedHotel]
+
+    :return: записи отелей
+    :rtype: List[records.HotelRecord]
+    """
+    engine = get_engine()
+    hotel_tasks = [engine.spawn(hotel_info_filling, user_id, session, i_hotel) for i_hotel in city_hotels]
     try:
-        search_result[message.from_user.id]['Отели'].append(hotel)
-    except KeyError('Отели'):
-        search_result[message.from_user.id]['Отели'] = []
-        search_result[message.from_user.id]['Отели'].append(hotel)
+        return [await hotel_task for hotel_task in hotel_tasks]
+    finally:
+        for hotel_task in hotel_tasks:
+            hotel_task.cancel()
 
 
-def photo_adding(message: types.Message, hotel: Dict[str, Union[str, list]]) -> None:
+async def stream_search_result(user_id: int,
+                               session: SearchSession,
+                               city_hotels: List[ListedHotel]) -> List[HotelRecord]:
     """
-    Функция добавляет ссылки на фото отеля в словарь конкретного отеля.
-    В начале процесса отправляется запрос к API Hotels.com.
-    В случае, если запрос к API будет неуспешным, пользователю в чат будет выведено соответствующее сообщение и
-    фото добавлены не будут.
+    Функция выводит результаты поиска по мере готовности (режим RESULT_STREAMING): заголовок отправляется сразу,
+    а карточка каждого отеля (и его фото) - как только сформирована запись этого отеля и всех отелей перед ним.
+    Записи отелей формируются параллельно фоновыми задачами движка, как в hotels_enrichment,
+    а порядок вывода совпадает с порядком отелей в списке.
+
+    :param user_id: ID пользователя
+    :type user_id: int
+
+    :param session: поисковая сессия пользователя
+    :type session: sessions.SearchSession
+
+    :param city_hotels: отобранные отели из списка отелей, полученного от API
+    :type city_hotels: List[records.ListedHotel]
+
+    :return: записи отелей
+    :rtype: List[records.HotelRecord]
+    """
+    engine = get_engine()
+    hotel_tasks = [engine.spawn(hotel_info_filling, user_id, session, i_hotel) for i_hotel in city_hotels]
+    hotels: List[HotelRecord] = []
+    try:
+        await output_search_result(user_id, result_header_formation(session, found=bool(city_hotels)), [])
+        for hotel_task in hotel_tasks:
+            hotels.append(await hotel_task)
+            await output_search_result(user_id, '', hotels[-1:])
+    finally:
+        for hotel_task in hotel_tasks:
+            hotel_task.cancel()
+    return hotels
+
+
+@traced('photo_adding', session_trace, attributes_of=hotel_attributes)
+async def photo_adding(user_id: int, session: SearchSession, hotel: HotelRecord) -> None:
+    """
+    Функция добавляет ссылки на фото отеля в запись конкретного отеля.
+    Ссылки на фото берутся из кэша photos_cache (по ID отеля); если их там нет,
+    отправляется запрос к API Hotels.com, и полученные ссылки сохраняются в кэш (в том числе пустые списки,
+    чтобы отель без фото не запрашивался при каждом поиске).
+    В случае, если запрос к API будет неуспешным или у отеля нет ни фото номеров, ни фото самого отеля,
+    пользователю в чат будет выведено соответствующее сообщение и фото добавлены не будут.
 
     Если пользователь ранее указывал требуемое количество фотографий n не равное 1, то
     добавляется n-1 фото номеров отеля и одно фото самого отеля. Если n=1, то добавляется
     только фото произвольного номера отеля.
 
-    :param message: сообщение пользователя
-    :type message: telebot.types.Message
+    :param user_id: ID пользователя
+    :type user_id: int
+
+    :param session: поисковая сессия пользователя
+    :type session: sessions.SearchSession
 
-    :param hotel: формируемый словарь конкретного отеля
-    :type hotel: Dict[str, str | list]
+    :param hotel: формируемая запись конкретного отеля
+    :type hotel: records.HotelRecord
 
     :raises ValueError: если код ответа не равен 200, вызывается исключение;
         обработка: пользователю в чате присылается сообщение об ошибке
     """
-    photo_url_part = '/properties/get-hotel-photos/'
-    querystring = {"id": hotel['ID']}
-    photo_error_text = ('Что-то не так с ответом сервера по фото отеля {name}...'.format(
-                        name=hotel['Название']),
-                        'Фото выведены не будут.')
-    photo_error_text = '\n'.join(photo_error_text)
-    photo_data = get_request_data(message, photo_url_part, querystring, photo_error_text)
-    if all((photo_data, photo_data['roomImages'], photo_data['hotelImages'])):
-        photo_num = 0
-        for r_count, room in enumerate(photo_data['roomImages'], 1):
-            image_url = room['images'][0]['baseUrl'].format(size='y')
-            hotel['Фото'].append(image_url)
-            if (r_count == search_data[message.from_user.id]['photo_number'] - 1) or (
-                    search_data[message.from_user.id]['photo_number'] == 1):
-                photo_num = r_count
-                break
-        if search_data[message.from_user.id]['photo_number'] != 1:
-            for h_count, hotels_image in enumerate(photo_data['hotelImages'], 1):
-                image_url = hotels_image['baseUrl'].format(size='y')
-                hotel['Фото'].append(image_url)
-                if h_count == search_data[message.from_user.id]['photo_number'] - photo_num:
-                    break
-    else:
-        hotels_bot.send_message(message.from_user.id, photo_error_text)
+    engine = get_engine()
+    photo_urls = await engine.blocking(photos_cache.get, hotel.hotel_id)
+    if photo_urls is None:
+        photo_url_part = '/properties/get-hotel-photos/'
+        querystring = {"id": hotel.hotel_id}
+        photo_urls = await get_request_data(user_id, photo_url_part, querystring, photo_error_text(hotel))
+        if photo_urls is None:
+            return
+        await engine.blocking(photos_cache.set, hotel.hotel_id, photo_urls)
+    photos = photos_selection(photo_urls, session.photo_number)
+    if not photos:
+        await send_message(user_id, photo_error_text(hotel))
+    hotel.photos.extend(photos)
+
+
+def photos_selection(photo_urls: Dict[str, List[str]], photo_number: int) -> List[str]:
+    """
+    Функция выбирает photo_number ссылок на фото отеля: если photo_number не равно 1, то
+    n-1 фото номеров отеля и одно фото самого отеля, иначе - только фото произвольного номера.
+    Если фото какого-то вида не хватает, недостающие фото берутся из другого списка.
 
+    :param photo_urls: словарь со списками ссылок 'roomImages' и 'hotelImages'
+    :type photo_urls: Dict[str, List[str]]
 
-def address_adding(message: types.Message, hotel: Dict[str, Union[str, list]]) -> None:
+    :param photo_number: требуемое количество фото
+    :type photo_number: int
+
+    :rtype: List[str]
     """
-    Функция добавляет адрес в словарь конкретного отеля.
-    В начале процесса отправляется запрос к API Hotels.com.
+    room_number = 1 if photo_number == 1 else photo_number - 1
+    photos = photo_urls['roomImages'][:room_number]
+    photos += photo_urls['hotelImages'][:photo_number - len(photos)]
+    return photos + photo_urls['roomImages'][room_number:room_number + photo_number - len(photos)]
+
+
+@traced('address_adding', session_trace, attributes_of=hotel_attributes)
+async def address_adding(user_id: int, session: SearchSession, hotel: HotelRecord) -> None:
+    """
+    Функция добавляет адрес в запись конкретного отеля.
+    Адрес берётся из кэша address_cache (по ID отеля); если его там нет,
+    отправляется запрос к API Hotels.com, и полученный адрес сохраняется в кэш.
     В случае, если запрос к API будет неуспешным, пользователю в чат будет выведено соответствующее сообщение и
-    элемент 'Адрес' в формируемый словарь добавлен не будет.
+    адрес в формируемую запись добавлен не будет.
 
-    :param message: сообщение пользователя
-    :type message: telebot.types.Message
+    :param user_id: ID пользователя
+    :type user_id: int
 
-    :param hotel: формируемый словарь конкретного отеля
-    :type hotel: Dict[str, str | list]
+    :param session: поисковая сессия пользователя
+    :type session: sessions.SearchSession
+
+    :param hotel: формируемая запись конкретного отеля
+    :type hotel: records.HotelRecord
 
     :raises ValueError: если код ответа не равен 200, вызывается исключение;
         обработка: пользователю в чате присылается сообщение об ошибке
     """
-    details_url_part = '/properties/get-details/'
-    querystring = {"id": hotel['ID'],
-                   "checkIn": search_data[message.from_user.id]['dates']['check_in'],
-                   "checkOut": search_data[message.from_user.id]['dates']['check_out'],
-                   "adults1": "1",
-                   "currency": "USD",
-                   "locale": "ru_RU"}
-    details_error_text = ('Что-то не так с ответом сервера по адресу отеля {name}...'.format(
-                          name=hotel['Название']),
-                          'Точный адрес выведен не будет.')
-    details_error_text = '\n'.join(details_error_text)
-    details_data = get_request_data(message, details_url_part, querystring, details_error_text)
-    if details_data:
-        hotel['Адрес'] = details_data['data']['body']['propertyDescription']['address']['fullAddress']
+    engine = get_engine()
+    address = await engine.blocking(address_cache.get, hotel.hotel_id)
+    if address is None:
+        details_url_part = '/properties/get-details/'
+        querystring = details_querystring_formation(session, hotel.hotel_id)
+        address = await get_request_data(user_id, details_url_part, querystring, details_error_text(hotel))
+        if not address:
+            return
+        await engine.blocking(address_cache.set, hotel.hotel_id, address)
+    hotel.address = address
+
+
+def details_error_text(hotel: HotelRecord) -> str:
+    """
+    Функция составляет сообщение об ошибке запроса адреса отеля.
+
+    :param hotel: формируемая запись отеля
+    :type hotel: records.HotelRecord
+
+    :rtype: str
+    """
+    return '\n'.join(('Что-то не так с ответом сервера по адресу отеля {name}...'.format(name=hotel.name),
+                      'Точный адрес выведен не будет.'))
+
+
+def photo_error_text(hotel: HotelRecord) -> str:
+    """
+    Функция составляет сообщение об ошибке запроса фото отеля.
+
+    :param hotel: формируемая запись отеля
+    :type hotel: records.HotelRecord
+
+    :rtype: str
+    """
+    return '\n'.join(('Что-то не так с ответом сервера по фото отеля {name}...'.format(name=hotel.name),
+                      'Фото выведены не будут.'))
+
+
+def details_querystring_formation(session: SearchSession, hotel_id: int) -> Dict[str, str]:
+    """
+    Функция составляет параметры запроса деталей отеля (/properties/get-details/).
+
+    :param session: поисковая сессия пользователя
+    :type session: sessions.SearchSession
 
+    :param hotel_id: ID отеля
+    :type hotel_id: int
 
-def send_photo(user_id: str, img_url: str) -> None:
+    :rtype: Dict[str, str]
+    """
+    return {"id": hotel_id,
+            "checkIn": session.dates.check_in,
+            "checkOut": session.dates.check_out,
+            "adults1": "1",
+            "currency": "USD",
+            "locale": "ru_RU"}
+
+
+async def send_photo(user_id: int, img_url: str, caption: Optional[str] = None) -> bool:
     """
     Функция осуществляет запрос к Telegram API для получения фото в чате по ID пользователя.
+    Запрос отправляется через текущий движок с учётом лимитов Telegram на частоту отправки (см. модуль outbound).
+    Если Telegram не смог получить фото по ссылке, фото просто пропускается.
 
     :param user_id: ID пользователя
-    :type user_id: str
+    :type user_id: int
 
     :param img_url: web-ссылка на фотографию
     :type img_url: str
+
+    :param caption: подпись к фото
+    :type caption: str | None
+
+    :return: отправлено ли фото
+    :rtype: bool
     """
-    requests.get('{tg_api_url}{token}/sendPhoto?chat_id={user_id}&photo={img_url}'.format(
-                 tg_api_url=tg_api_url,
-                 token=BOT_TOKEN,
-                 user_id=user_id,
-                 img_url=img_url))
+    engine = get_engine()
+    try:
+        await engine.send('send_photo', user_id, img_url, caption=caption, parse_mode=PARSE_MODE)
+    except engine.telegram_errors:
+        return False
+    return True
 
 
-def search_result_output(message: types.Message) -> None:
+async def send_photo_album(user_id: int, image_urls: List[str], caption: Optional[str] = None) -> None:
     """
-    Функция отвечает за вывод пользователю сообщения в чат с результатами поиска отелей.
-    Если по заданным ранее критериям найти ничего не удалось, пользователю будет отправлено
-    соответствующее сообщение.
-    В итоге результаты поиска сохраняются в search_requests.json по id пользователя.
+    Функция отправляет фото пользователю альбомами (sendMediaGroup) по MEDIA_GROUP_MAX_SIZE фото в каждом,
+    то есть одним запросом к Telegram API вместо отдельного запроса на каждое фото.
+    Подпись (если есть) прикрепляется к первому фото первого альбома.
+    Если Telegram отклоняет альбом (например, не смог получить одно из фото по ссылке),
+    фото этого альбома отправляются по одному, и недоступные фото пропускаются.
+    Подпись при этом отправляется отдельным сообщением, чтобы карточка отеля не потерялась.
 
-    :param message: сообщение пользователя
-    :type message: telebot.types.Message
+    :param user_id: ID пользователя
+    :type user_id: int
+
+    :param image_urls: web-ссылки на фотографии
+    :type image_urls: List[str]
+
+    :param caption: подпись к альбому
+    :type caption: str | None
     """
-    hotels_bot.send_message(message.from_user.id, 'Результаты поиска')
-    initial_data = '\n'.join(('Даты: {dates}'.format(dates=search_data[message.from_user.id]['dates']['dates_of_stay']),
-                              'Город: {city}'.format(city=search_result[message.from_user.id]['Город'])))
-    hotels_bot.send_message(message.from_user.id, initial_data)
+    engine = get_engine()
+    for start in range(0, len(image_urls), MEDIA_GROUP_MAX_SIZE):
+        album_urls = image_urls[start:start + MEDIA_GROUP_MAX_SIZE]
+        album_caption = caption if start == 0 else None
+        if len(album_urls) == 1:
+            if not await send_photo(user_id, album_urls[0], caption=album_caption) and album_caption:
+                await send_message(user_id, album_caption, parse_mode=PARSE_MODE)
+            continue
+        media = [types.InputMediaPhoto(img_url) for img_url in album_urls]
+        media[0].caption = album_caption
+        media[0].parse_mode = PARSE_MODE
+        try:
+            await engine.send('send_media_group', user_id, media, cost=len(media))
+        except engine.telegram_errors:
+            if album_caption:
+                await send_message(user_id, album_caption, parse_mode=PARSE_MODE)
+            for img_url in album_urls:
+                await send_photo(user_id, img_url)
 
-    selected_hotels = search_result[message.from_user.id]['Отели']
-    if not selected_hotels:
-        hotels_error_text = 'По выбранным критериям ничего найти не удалось('
-        hotels_bot.send_message(message.from_user.id, hotels_error_text)
 
-    output_each_hotel_info(message, selected_hotels)
-    user_id = str(message.from_user.id)
-    saving_search_request(user_id)
+async def search_result_output(user_id: int, session: SearchSession, city_hotels: List[ListedHotel]) -> None:
+    """
+    Функция отвечает за получение данных отобранных отелей (адреса и фото) и вывод пользователю сообщения в чат
+    с результатами поиска отелей: по мере готовности каждого отеля (stream_search_result), если включён
+    режим RESULT_STREAMING, иначе - после получения данных всех отелей.
+    Если по заданным ранее критериям найти ничего не удалось, об этом сообщается в заголовке результатов.
+    В итоге результаты поиска сохраняются в историю поиска по id пользователя, а поисковая сессия удаляется
+    из хранилища (если пользователь за время поиска не начал новый, см. sessions.SessionStore.pop).
 
+    :param user_id: ID пользователя
+    :type user_id: int
+
+    :param session: поисковая сессия пользователя
+    :type session: sessions.SearchSession
 
-def search_for_matches(message: types.Message) -> None:
+    :param city_hotels: отобранные отели из списка отелей, полученного от API
+    :type city_hotels: List[records.ListedHotel]
     """
-    Функция, выполняющая поиск отелей по заданным ранее критериям.
-    В начале процесса отправляется запрос к API Hotels.com.
-    В случае, если запрос к API будет неуспешным, пользователю в чат будет выведено соответствующее сообщение и
-    процесс работы поисковой функции будет прекращён.
-    В итоге результаты поиска сохраняются в search_requests.json по id пользователя.
+    engine = get_engine()
+    if RESULT_STREAMING:
+        session.hotels = await stream_search_result(user_id, session, city_hotels)
+    else:
+        session.hotels = await hotels_enrichment(user_id, session, city_hotels)
+        await output_search_result(user_id, result_header_formation(session), session.hotels)
+    await engine.blocking(saving_search_request, str(user_id), session)
+    await engine.blocking(search_sessions.pop, user_id, session)
 
-    :param message: сообщение пользователя
-    :type message: telebot.types.Message
 
-    :raises ValueError: если код ответа не равен 200, вызывается исключение;
-        обработка: пользователю в чате присылается сообщение об ошибке
+def result_header_formation(session: SearchSession, found: Optional[bool] = None) -> str:
+    """
+    Функция составляет заголовок результатов поиска (HTML): даты, город и, если ничего не найдено,
+    сообщение об этом.
+
+    :param session: поисковая сессия пользователя
+    :type session: sessions.SearchSession
+
+    :param found: найдены ли отели (если None - определяется по session.hotels)
+    :type found: bool | None
+
+    :rtype: str
+    """
+    header = ['<b>Результаты поиска</b>']
+    header.extend(html_pairs({'Даты': session.dates.dates_of_stay, 'Город': session.result_city}))
+    if not (bool(session.hotels) if found is None else found):
+        header.append('По выбранным критериям ничего найти не удалось(')
+    return '\n'.join(header)
+
+
+async def properties_pages(user_id: int,
+                           querystring: Dict[str, str],
+                           max_pages: int,
+                           error_text: str,
+                           first_page: Optional[PropertiesPage] = None) -> AsyncIterator[PropertiesPage]:
+    """
+    Генератор страниц списка отелей (/properties/list/), начиная с первой.
+    Пока вызывающий код обрабатывает очередную страницу, следующая уже запрашивается фоновой задачей движка.
+    Если первая страница уже получена (first_page: результат упреждающего запроса или отели просмотренных
+    ранее страниц из кэша результатов поиска), повторно она не запрашивается, и перебор продолжается
+    с её next_page_number. Страницы перестают запрашиваться, когда у API больше нет страниц, номер следующей
+    страницы больше max_pages или истёк бюджет времени BESTDEAL_TIME_BUDGET. Если вызывающий код прекращает
+    перебор раньше, ещё не завершённый запрос следующей страницы отменяется.
+
+    Ошибка ответа сервера выводится пользователю только для первой страницы; при ошибке на следующих
+    страницах перебор просто прекращается.
+
+    :param user_id: ID пользователя
+    :type user_id: int
+
+    :param querystring: параметры запроса (номер страницы подставляется генератором)
+    :type querystring: Dict[str, str]
+
+    :param max_pages: наибольший номер запрашиваемой страницы
+    :type max_pages: int
+
+    :param error_text: текст, который будет выведен пользователю при ошибке запроса первой страницы
+    :type error_text: str
+
+    :param first_page: уже полученная первая страница (см. take_prefetch и cached_result)
+    :type first_page: records.PropertiesPage | None
+
+    :return: страницы списка отелей
+    :rtype: AsyncIterator[records.PropertiesPage]
     """
+    engine = get_engine()
     properties_url_part = '/properties/list/'
-    querystring = {
-        "destinationId": search_data[message.from_user.id]['destination_id'],
+    deadline = time.monotonic() + BESTDEAL_TIME_BUDGET
+    page_task = None
+    try:
+        properties_data = first_page or await get_request_data(user_id, properties_url_part,
+                                                               dict(querystring, pageNumber='1'), error_text)
+        while properties_data:
+            next_page_number = next_page_to_fetch(properties_data, max_pages, deadline)
+            if next_page_number:
+                page_task = engine.spawn(get_request_data, user_id, properties_url_part,
+                                         dict(querystring, pageNumber=str(next_page_number)), None)
+            yield properties_data
+            if not next_page_number:
+                return
+            properties_data = await page_task
+            page_task = None
+    finally:
+        if page_task is not None:
+            page_task.cancel()
+
+
+def next_page_to_fetch(properties_data: PropertiesPage, max_pages: int, deadline: float) -> Optional[int]:
+    """
+    Функция определяет, какую страницу списка отелей запросить после properties_data: страниц больше
+    не запрашивают, когда у API их больше нет, номер следующей страницы больше max_pages или истёк бюджет
+    времени (deadline по часам time.monotonic).
+
+    :param properties_data: последняя полученная страница списка отелей
+    :type properties_data: records.PropertiesPage
+
+    :param max_pages: наибольший номер запрашиваемой страницы
+    :type max_pages: int
+
+    :param deadline: момент окончания бюджета времени BESTDEAL_TIME_BUDGET
+    :type deadline: float
+
+    :return: номер следующей страницы или None
+    :rtype: int | None
+    """
+    next_page_number = properties_data.next_page_number
+    if next_page_number and properties_data.hotels and next_page_number <= max_pages and time.monotonic() < deadline:
+        return next_page_number
+    return None
+
+
+def max_search_pages(session: SearchSession) -> int:
+    """
+    Функция возвращает наибольший номер страницы списка отелей, которую можно запросить при поиске:
+    для команды "bestdeal" - BESTDEAL_MAX_PAGES, для остальных команд - 1.
+
+    :param session: поисковая сессия пользователя
+    :type session: sessions.SearchSession
+
+    :rtype: int
+    """
+    return BESTDEAL_MAX_PAGES if session.search_command == 'Bestdeal' else 1
+
+
+def hotels_selection(session: SearchSession, first_page: PropertiesPage) -> HotelsSelection:
+    """
+    Функция начинает отбор отелей для вывода (см. ranking.HotelsSelection) с первой страницы списка отелей:
+    для команды "bestdeal" - по предельным цене и расстоянию от центра из поисковой сессии.
+
+    :param session: поисковая сессия пользователя
+    :type session: sessions.SearchSession
+
+    :param first_page: первая страница списка отелей
+    :type first_page: records.PropertiesPage
+
+    :rtype: ranking.HotelsSelection
+    """
+    if session.search_command == 'Bestdeal':
+        return HotelsSelection(first_page, session.hotels_number, session.max_price, session.max_distance,
+                               BESTDEAL_PRICE_WEIGHT)
+    return HotelsSelection(first_page, session.hotels_number)
+
+
+def properties_querystring_formation(session: SearchSession) -> Dict[str, str]:
+    """
+    Функция составляет параметры запроса списка отелей (/properties/list/) для первой страницы.
+
+    :param session: поисковая сессия пользователя
+    :type session: sessions.SearchSession
+
+    :rtype: Dict[str, str]
+    """
+    return {
+        "destinationId": session.destination_id,
         "pageNumber": "1",
         "pageSize": "25",
-        "checkIn": search_data[message.from_user.id]['dates']['check_in'],
-        "checkOut": search_data[message.from_user.id]['dates']['check_out'],
+        "checkIn": session.dates.check_in,
+        "checkOut": session.dates.check_out,
         "adults1": "1",
-        "sortOrder": search_data[message.from_user.id]['search_pattern'],
+        "sortOrder": session.search_pattern,
         "locale": "ru_RU",
         "currency": "USD"}
-    matches_error_text = ('Что-то не так с ответом сервера по деталям отеля...')
 
-    properties_data = get_request_data(message, properties_url_part, querystring, matches_error_text)
-    if properties_data:
-        search_result[message.from_user.id]['Город'] = properties_data['data']['body']['header']
-        search_result[message.from_user.id]['Отели'] = list()
-        city_hotels: List[Any] = properties_data['data']['body']['searchResults']['results']
-
-        if search_data[message.from_user.id]['search_command'] == 'Bestdeal':
-            for i_hotel in city_hotels:
-                price = i_hotel['ratePlan']['price']['exactCurrent']
-                distance = float(re.match(r'\d+\.*,*\d*',
-                                 i_hotel['landmarks'][0]['distance']).group().replace(',', '.'))
-                if (price <= search_data[message.from_user.id]['max_price']) and (
-                    distance <= search_data[message.from_user.id]['max_distance']):  # noqa: E125
-                    hotel_info_filling(message, i_hotel)
-                    if len(search_result[message.from_user.id]['Отели']) == search_data[message.from_user.id]['hotels_number']:
-                        break
-            search_result[message.from_user.id]['Отели'] = sorted(search_result[message.from_user.id]['Отели'],
-                                                                  key=itemgetter('От центра', 'Цена, $'))
 
-        else:
-            for count, i_hotel in enumerate(city_hotels, 1):
-                hotel_info_filling(message, i_hotel)
-                if count == search_data[message.from_user.id]['hotels_number']:
+async def start_prefetch(user_id: int, session: SearchSession) -> None:
+    """
+    Функция начинает упреждающий запрос первой страницы списка отелей: после ввода дат известны все параметры
+    запроса (город, даты, порядок сортировки), и, пока пользователь отвечает на оставшиеся вопросы,
+    страница запрашивается фоновой задачей движка. Ошибка упреждающего запроса пользователю
+    не выводится - поиск в этом случае просто запросит страницу заново (см. take_prefetch).
+    Прежний упреждающий запрос сессии (если даты вводятся повторно) отменяется. Если результаты такого поиска
+    уже есть в кэше результатов поиска (result_cache), запрос не отправляется.
+
+    :param user_id: ID пользователя
+    :type user_id: int
+
+    :param session: поисковая сессия пользователя
+    :type session: sessions.SearchSession
+    """
+    engine = get_engine()
+    session.close()
+    querystring = properties_querystring_formation(session)
+    if await engine.blocking(result_cache.__contains__, result_cache_key(querystring)):
+        return
+    session.prefetch = (querystring, engine.spawn(get_request_data, user_id, '/properties/list/', querystring, None))
+    PREFETCH.inc('started')
+
+
+async def take_prefetch(session: SearchSession, querystring: Dict[str, str]) -> Optional[PropertiesPage]:
+    """
+    Функция забирает из поисковой сессии результат упреждающего запроса первой страницы списка отелей
+    (при необходимости дожидаясь его). Результат не используется, если параметры поиска изменились
+    после начала запроса или запрос завершился ошибкой.
+
+    :param session: поисковая сессия пользователя
+    :type session: sessions.SearchSession
+
+    :param querystring: параметры запроса списка отелей
+    :type querystring: Dict[str, str]
+
+    :return: первая страница списка отелей или None, если её нужно запросить заново
+    :rtype: records.PropertiesPage | None
+    """
+    if session.prefetch is None:
+        return None
+    prefetch_querystring, page_task = session.prefetch
+    session.prefetch = None
+    if prefetch_querystring != querystring:
+        page_task.cancel()
+        PREFETCH.inc('stale')
+        return None
+    try:
+        properties_data = await page_task
+    except asyncio.CancelledError:
+        if not page_task.cancelled():
+            raise
+        properties_data = None
+    PREFETCH.inc('used' if properties_data else 'failed')
+    return properties_data or None
+
+
+def result_cache_key(querystring: Dict[str, str]) -> str:
+    """
+    Функция формирует ключ кэша результатов поиска по параметрам запроса списка отелей: город, даты,
+    порядок сортировки, локаль и валюта. Количество отелей, фото и фильтры bestdeal в ключ не входят -
+    они применяются к отелям из кэша для каждого пользователя отдельно.
+
+    :param querystring: параметры запроса списка отелей
+    :type querystring: Dict[str, str]
+
+    :rtype: str
+    """
+    return ':'.join(str(querystring[param]) for param in RESULT_CACHE_KEY_PARAMS)
+
+
+def cached_result(querystring: Dict[str, str]) -> Optional[PropertiesPage]:
+    """
+    Функция возвращает из кэша результатов поиска отели, найденные недавним поиском с теми же параметрами.
+
+    :param querystring: параметры запроса списка отелей
+    :type querystring: Dict[str, str]
+
+    :return: отели всех просмотренных тогда страниц списка отелей (в порядке ответа API) или None
+    :rtype: records.PropertiesPage | None
+    """
+    row = result_cache.get(result_cache_key(querystring))
+    return None if row is None else PropertiesPage.from_row(row)
+
+
+def remember_result(querystring: Dict[str, str], viewed_pages: List[PropertiesPage]) -> None:
+    """
+    Функция сохраняет в кэш результатов поиска отели всех просмотренных страниц списка отелей одной записью.
+    Номер следующей страницы берётся у последней из них, чтобы поиск bestdeal с более строгими фильтрами
+    мог продолжить перебор страниц.
+
+    :param querystring: параметры запроса списка отелей
+    :type querystring: Dict[str, str]
+
+    :param viewed_pages: просмотренные страницы
+    :type viewed_pages: List[records.PropertiesPage]
+    """
+    hotels = [hotel for page in viewed_pages for hotel in page.hotels]
+    result_cache.set(result_cache_key(querystring),
+                     PropertiesPage(viewed_pages[0].header, hotels, viewed_pages[-1].next_page_number).as_row())
+
+
+async def search_for_matches(user_id: int, session: SearchSession) -> None:
+    """
+    Функция, выполняющая поиск отелей по заданным ранее критериям.
+    В начале процесса отправляется запрос к API Hotels.com.
+    В случае, если запрос к API будет неуспешным, пользователю в чат будет выведено соответствующее сообщение и
+    процесс работы поисковой функции будет прекращён.
+    Первая страница списка отелей обычно уже получена упреждающим запросом после ввода дат (см. start_prefetch).
+    Если такой же поиск (город, даты, порядок сортировки) недавно выполнялся, отели берутся из кэша результатов
+    поиска (см. cached_result), и количество отелей и фильтры пользователя применяются к ним без запросов к API.
+    Для команды "bestdeal" страницы списка отелей перебираются (не более BESTDEAL_MAX_PAGES), пока не будет
+    найдено нужное количество отелей, подходящих по цене и расстоянию от центра. Затем среди всех подходящих
+    отелей с просмотренных страниц выбираются лучшие (см. модуль ranking), и адреса и фото запрашиваются
+    только для них.
+    В итоге результаты поиска сохраняются в историю поиска по id пользователя.
+
+    :param user_id: ID пользователя
+    :type user_id: int
+
+    :param session: поисковая сессия пользователя
+    :type session: sessions.SearchSession
+
+    :raises ValueError: если код ответа не равен 200, вызывается исключение;
+        обработка: пользователю в чате присылается сообщение об ошибке
+    """
+    engine = get_engine()
+    querystring = properties_querystring_formation(session)
+    cached_page = await engine.blocking(cached_result, querystring)
+    if cached_page is not None:
+        session.close()
+    pages = properties_pages(user_id, querystring, max_search_pages(session), MATCHES_ERROR_TEXT,
+                             cached_page or await take_prefetch(session, querystring))
+    try:
+        properties_data = await anext(pages, None)
+        if properties_data:
+            session.result_city = properties_data.header
+            selection = hotels_selection(session, properties_data)
+            while selection.needs_more():
+                page_data = await anext(pages, None)
+                if page_data is None:
                     break
+                selection.add(page_data)
+    finally:
+        await pages.aclose()
 
-        search_result_output(message)
+    if properties_data:
+        if cached_page is None or len(selection.viewed_pages) > 1:
+            await engine.blocking(remember_result, querystring, selection.viewed_pages)
+        await search_result_output(user_id, session, selection.hotels())
     else:
-        end_searching_error_text = 'Попробуйте подождать и попробовать снова.'
-        hotels_bot.send_message(message.from_user.id, end_searching_error_text)
+        await send_message(user_id, END_SEARCHING_ERROR_TEXT)
+
+
+def location_querystring_formation(session: SearchSession) -> Dict[str, str]:
+    """
+    Функция составляет параметры запроса локации (/locations/v2/search/) по введённому названию города.
 
+    :param session: поисковая сессия пользователя
+    :type session: sessions.SearchSession
 
-def city_definition(message: types.Message) -> None:
+    :rtype: Dict[str, str]
+    """
+    return {"query": session.city, "locale": "ru_RU", "currency": "USD"}
+
+
+def location_cache_key(query: str, locale: str) -> str:
+    """
+    Функция формирует ключ кэша локаций: название города приводится к нижнему регистру,
+    лишние пробелы удаляются, чтобы "Москва", " москва" и "МОСКВА" давали один и тот же ключ.
+
+    :param query: название города, введённое пользователем
+    :type query: str
+
+    :param locale: локаль запроса
+    :type locale: str
+
+    :return: ключ кэша
+    :rtype: str
+    """
+    return '{locale}:{query}'.format(locale=locale, query=' '.join(query.split()).casefold())
+
+
+@traced('city_definition', session_trace, step=True)
+async def city_definition(message: types.Message, session: SearchSession) -> None:
     """
     Функция принимает ответ пользователя и фиксирует наименование города
-    и его destinationID в словаре search_data.
-    В начале процесса отправляется запрос к API Hotels.com.
+    и его destinationID в поисковой сессии пользователя.
+    Сначала destinationID ищется в кэше location_cache (по нормализованному названию города и локали),
+    и только если его там нет - отправляется запрос к API Hotels.com.
     В случае, если запрос к API будет неуспешным, пользователю в чат будет выведено соответствующее сообщение и
     процесс работы поисковой функции будет прекращён.
     В случае успешного запроса функция проводит обработку данных и создаёт виртуальную клавиатуру, с помощью
@@ -364,6 +949,9 @@ def city_definition(message: types.Message) -> None:
     :param message: сообщение пользователя
     :type message: telebot.types.Message
 
+    :param session: поисковая сессия пользователя
+    :type session: sessions.SearchSession
+
     :raises ValueError: если код ответа не равен 200, вызывается исключение;
         обработка: пользователю в чате присылается сообщение об ошибке
 
@@ -375,154 +963,209 @@ def city_definition(message: types.Message) -> None:
         обработка: пользователю в чате присылается сообщение о некорректном вводе и просьба повторить ввод.
 
     """
-    search_data[message.from_user.id].setdefault('city', message.text)
-
-    location_url_part = '/locations/v2/search/'
-    querystring = {"query": search_data[message.from_user.id]['city'], "locale": "ru_RU", "currency": "USD"}
-    location_error_text = ('Что-то не так с ответом сервера по запросу локации...',
-                           'Попробуйте подождать и попробовать снова.')
-    location_data = get_request_data(message, location_url_part, querystring, location_error_text)
-    try:
-        destination_id = location_data['suggestions'][0]['entities'][0]['destinationId']
-    except TypeError:
-        error_text = ('От сервера пришёл некорректный ответ.\n'
-                      'Пожалуйста, попробуйте снова, начав с ввода команды или /help')
-        hotels_bot.send_message(message.from_user.id, error_text)
-    except IndexError:
-        error_text = ('Некорректный ввод.\n'
-                      'Пожалуйста, попробуйте ввести название города снова')
-        hotels_bot.send_message(message.from_user.id, error_text)
-        hotels_bot.register_next_step_handler(message.from_user.id, city_definition)
-    else:
-        search_data[message.from_user.id].setdefault('destination_id', destination_id)
-        keyboard = get_keyboard()
-        hotels_bot.send_message(message.from_user.id, 'Сколько отелей показать?', reply_markup=keyboard)
-
-
-@hotels_bot.callback_query_handler(func=lambda call: isinstance(call, types.CallbackQuery) is True)
-def set_hotels_number(call: types.CallbackQuery) -> None:
+    engine = get_engine()
+    user_id = message.from_user.id
+    session.city = message.text
+
+    querystring = location_querystring_formation(session)
+    location_key = location_cache_key(querystring['query'], querystring['locale'])
+    destination_id = await engine.blocking(location_cache.get, location_key)
+    if destination_id is None:
+        location_url_part = '/locations/v2/search/'
+        location_data = await get_request_data(user_id, location_url_part, querystring, LOCATION_ERROR_TEXT)
+        try:
+            destination_id = location_data[0]
+        except TypeError:
+            session.next_step = None
+            await send_message(user_id, LOCATION_RESPONSE_ERROR_TEXT)
+            return
+        except IndexError:
+            await send_message(user_id, CITY_INPUT_ERROR_TEXT)
+            return
+        await engine.blocking(location_cache.set, location_key, destination_id)
+
+    session.destination_id = destination_id
+    session.next_step = None
+    keyboard = get_keyboard()
+    await send_message(user_id, HOTELS_NUMBER_QUESTION, reply_markup=keyboard)
+
+
+@traced('set_hotels_number', session_trace, step=True)
+async def set_hotels_number(call: types.CallbackQuery, session: SearchSession) -> None:
     """
-    Функция-обработчик обратного вызова, фиксирует в словаре search_data количество отелей,
-    информацию по которым нужно будет найти.
+    Функция фиксирует в поисковой сессии количество отелей, информацию по которым нужно будет найти
+    (вызывается обработчиком обратного вызова handlers.hotels_number).
     Принимает ответ, отправленный пользователем с помощью виртуальной клавиатуры, созданной в
     функции city_definition().
-    В конце работы направляет к следующему обработчику сообщений - set_dates().
+    В конце работы направляет к следующему шагу диалога - set_dates().
 
     :param call: объект ответа от кнопки на виртуальной клавиатуре
     :type call: telebot.types.CallbackQuery
+
+    :param session: поисковая сессия пользователя
+    :type session: sessions.SearchSession
     """
-    search_data[call.from_user.id].setdefault('hotels_number', int(call.data))
-    dates_question = ('Укажите даты заезда-выезда (формат: гггг-мм-дд - гггг-мм-дд).\n'
-                      'Например 2022-10-15 - 2022-10-21')
-    hotels_bot.send_message(call.from_user.id, dates_question)
-    hotels_bot.register_next_step_handler(call.message, set_dates)
+    session.hotels_number = int(call.data)
+    session.next_step = 'set_dates'
+    await send_message(call.from_user.id, DATES_QUESTION)
 
 
-def set_dates(message: types.Message) -> None:
+@traced('set_dates', session_trace, step=True)
+async def set_dates(message: types.Message, session: SearchSession) -> None:
     """
     Функция принимает ответ пользователя и фиксирует даты пребывания в отеле, а также отдельно дату заезда и
-    дату выезда из отеля, количество дней пребывания. Данные вносятся в словарь search_data.
+    дату выезда из отеля, количество дней пребывания. Данные вносятся в поисковую сессию пользователя.
     Исключение вызывается в случае, если пользователь внёс некорректные данные; обрабатывается
     уведомлением пользователя об ошибке ввода и запросом нового ввода.
-    В конце работы направляет к следующему обработчику сообщений - set_photo_need_and_search().
+    После ввода дат начинается упреждающий запрос первой страницы списка отелей (см. start_prefetch).
+    В конце работы направляет к следующему шагу диалога - set_photo_need_and_search().
 
     :param message: сообщение пользователя
     :type message: telebot.types.Message
 
+    :param session: поисковая сессия пользователя
+    :type session: sessions.SearchSession
+
     :raises ValueError: если даты введены некорректно;
         обработка: пользователю в чате присылается сообщение об ошибке с запросом повторного ввода.
     """
-    dates = message.text.split(' - ')
     try:
-        check_in = datetime.strptime(dates[0], '%Y-%m-%d')
-        check_out = datetime.strptime(dates[1], '%Y-%m-%d')
-        if check_out >= check_in:
-            days_of_stay = days_calculation(check_in, check_out)
-            search_data[message.from_user.id].setdefault('dates',
-                                                         {'dates_of_stay': message.text,
-                                                          'check_in': dates[0],
-                                                          'check_out': dates[1],
-                                                          'days_of_stay': days_of_stay})
-            photo_question = ('Показывать ли фото для каждого отеля (да/нет)?',
-                              'Если да, то сколько (через пробел, макс.фото = 6)?',
-                              'Например:\nНет\n*или*\nДа 5')
-            hotels_bot.send_message(message.from_user.id, '\n'.join(photo_question))
-            hotels_bot.register_next_step_handler(message, set_photo_need_and_search)
+        session.dates = dates_parsing(message.text)
     except ValueError:
-        hotels_bot.send_message(message.from_user.id, 'Даты введены некорректно. Попробуйте снова.')
-        hotels_bot.register_next_step_handler(message, set_dates)
+        await send_message(message.from_user.id, DATES_ERROR_TEXT)
+    else:
+        await start_prefetch(message.from_user.id, session)
+        session.next_step = 'set_photo_need_and_search'
+        await send_message(message.from_user.id, PHOTO_QUESTION)
 
 
-def set_photo_need_and_search(message: types.Message) -> None:
+def dates_parsing(text: str) -> StayDates:
+    """
+    Функция разбирает введённые пользователем даты пребывания (формат: гггг-мм-дд - гггг-мм-дд).
+
+    :param text: ответ пользователя
+    :type text: str
+
+    :return: даты пребывания
+    :rtype: sessions.StayDates
+
+    :raises ValueError: если даты введены некорректно или дата выезда раньше даты заезда
+    """
+    dates = text.split(' - ')
+    if len(dates) != 2:
+        raise ValueError
+    check_in = datetime.strptime(dates[0], '%Y-%m-%d')
+    check_out = datetime.strptime(dates[1], '%Y-%m-%d')
+    if check_out < check_in:
+        raise ValueError
+    return StayDates(dates_of_stay=text,
+                     check_in=dates[0],
+                     check_out=dates[1],
+                     days_of_stay=days_calculation(check_in, check_out))
+
+
+@traced('set_photo_need_and_search', session_trace, step=True)
+async def set_photo_need_and_search(message: types.Message, session: SearchSession) -> None:
     """
     Функция принимает и фиксирует ответ пользователя о необходимости вывода фотографий, а также об их количестве.
-    Данные вносятся в словарь search_data.
+    Данные вносятся в поисковую сессию пользователя.
     Исключение вызывается в случае, если пользователь внёс некорректные данные; обрабатывается
     уведомлением пользователя об ошибке ввода и запросом нового ввода.
     Если первая команда пользователя была "bestdeal", то в конце работы функция направляет к следующему
-    обработчику сообщений - distance_definition().
+    шагу диалога - distance_definition(), иначе начинает поиск (search_for_matches).
 
     :param message: сообщение пользователя
     :type message: telebot.types.Message
 
+    :param session: поисковая сессия пользователя
+    :type session: sessions.SearchSession
+
     :raises ValueError: если ответ по фотографиям введён некорректно;
         обработка: пользователю в чате присылается сообщение об ошибке с запросом повторного ввода.
     """
-    photo_need = message.text.split()
     try:
-        if len(photo_need) == 1 and photo_need[0].lower() == 'нет':
-            search_data[message.from_user.id].setdefault('photo_number', 'none')
-        elif len(photo_need) == 2 and int(photo_need[1]) <= 6:
-            search_data[message.from_user.id].setdefault('photo_number', int(photo_need[1]))
-        else:
-            raise ValueError
+        session.photo_number = photo_number_parsing(message.text)
     except ValueError:
-        error_text = 'Что-то не так. Введите ответ как показано в примере выше'
-        hotels_bot.send_message(message.from_user.id, error_text)
-        hotels_bot.register_next_step_handler(message, set_photo_need_and_search)
+        await send_message(message.from_user.id, INPUT_ERROR_TEXT)
     else:
-        if search_data[message.from_user.id]['search_command'] == 'Bestdeal':
-            distance_question = ('Введите предельное расстояние отеля от центра города (в км)',
-                                 'Например:\n5\n*или*\n9,3')
-            hotels_bot.send_message(message.from_user.id, '\n'.join(distance_question))
-            hotels_bot.register_next_step_handler(message, distance_definition)
+        if session.search_command == 'Bestdeal':
+            session.next_step = 'distance_definition'
+            await send_message(message.from_user.id, DISTANCE_QUESTION)
         else:
-            hotels_bot.send_message(message.from_user.id, 'Приступаю к поиску')
-            search_for_matches(message)
+            session.next_step = None
+            await send_message(message.from_user.id, SEARCH_START_TEXT)
+            with SEARCH_LATENCY.time(session.search_command), span(session.trace, 'search_for_matches'):
+                await search_for_matches(message.from_user.id, session)
+            complete_trace(session.trace)
+
+
+def photo_number_parsing(text: str) -> int:
+    """
+    Функция разбирает ответ пользователя о необходимости вывода фотографий ('Нет' или 'Да n').
+
+    :param text: ответ пользователя
+    :type text: str
+
+    :return: количество фото по каждому отелю (0 - фото не выводятся)
+    :rtype: int
+
+    :raises ValueError: если ответ введён некорректно
+    """
+    photo_need = text.split()
+    if len(photo_need) == 1 and photo_need[0].lower() == 'нет':
+        return 0
+    if len(photo_need) == 2 and 1 <= int(photo_need[1]) <= MAX_PHOTO_NUMBER:
+        return int(photo_need[1])
+    raise ValueError
 
 
-def distance_definition(message: types.Message) -> None:
+def limit_parsing(text: str) -> float:
+    """
+    Функция разбирает введённое пользователем предельное значение (расстояние или цену), например '9,3'.
+
+    :param text: ответ пользователя
+    :type text: str
+
+    :rtype: float
+
+    :raises ValueError: если значение введено некорректно
+    """
+    return float(text.replace(',', '.'))
+
+
+@traced('distance_definition', session_trace, step=True)
+async def distance_definition(message: types.Message, session: SearchSession) -> None:
     """
     Функция принимает ответ пользователя о максимальном расстоянии отеля от центра города.
-    Данные вносятся в словарь search_data.
+    Данные вносятся в поисковую сессию пользователя.
     Исключение вызывается в случае, если пользователь внёс некорректные данные; обрабатывается
     уведомлением пользователя об ошибке ввода и запросом нового ввода.
-    В конце работы функция направляет к следующему обработчику сообщений - price_definition().
+    В конце работы функция направляет к следующему шагу диалога - price_definition().
 
     :param message: сообщение пользователя
     :type message: telebot.types.Message
 
+    :param session: поисковая сессия пользователя
+    :type session: sessions.SearchSession
+
     :raises ValueError: если значение расстояния введено некорректно;
         обработка: пользователю в чате присылается сообщение об ошибке с запросом повторного ввода.
     """
     try:
-        max_distance = float((message.text.replace(',', '.')))
+        max_distance = limit_parsing(message.text)
     except ValueError:
-        error_text = 'Что-то не так. Введите ответ как показано в примере выше'
-        hotels_bot.send_message(message.from_user.id, error_text)
-        hotels_bot.register_next_step_handler(message, distance_definition)
+        await send_message(message.from_user.id, INPUT_ERROR_TEXT)
     else:
-        search_data[message.from_user.id].setdefault('max_distance', max_distance)
-        price_question = ('Введите максимальную стоимость номера за одну ночь (в $)',
-                          'Например:\n50\n*или*\n220,5')
-        hotels_bot.send_message(message.from_user.id, '\n'.join(price_question))
-        hotels_bot.register_next_step_handler(message, price_definition)
+        session.max_distance = max_distance
+        session.next_step = 'price_definition'
+        await send_message(message.from_user.id, PRICE_QUESTION)
 
 
-def price_definition(message: types.Message) -> None:
+@traced('price_definition', session_trace, step=True)
+async def price_definition(message: types.Message, session: SearchSession) -> None:
     """
     Функция принимает ответ пользователя о максимальной цене номера отеля.
-    Данные вносятся в словарь search_data.
+    Данные вносятся в поисковую сессию пользователя.
     Исключение вызывается в случае, если пользователь внёс некорректные данные; обрабатывается
     уведомлением пользователя об ошибке ввода и запросом нового ввода.
     В конце работы функция вызывает search_for_matches(), а та занимается поиском и выводом информации по найденным отелям.
@@ -530,61 +1173,73 @@ def price_definition(message: types.Message) -> None:
     :param message: сообщение пользователя
     :type message: telebot.types.Message
 
+    :param session: поисковая сессия пользователя
+    :type session: sessions.SearchSession
+
     :raises ValueError: если значение расстояния введено некорректно;
         обработка: пользователю в чате присылается сообщение об ошибке с запросом повторного ввода.
     """
     try:
-        max_price = float((message.text.replace(',', '.')))
+        max_price = limit_parsing(message.text)
     except ValueError:
-        error_text = 'Что-то не так. Введите ответ как показано в примере выше'
-        hotels_bot.send_message(message.from_user.id, error_text)
-        hotels_bot.register_next_step_handler(message, price_definition)
+        await send_message(message.from_user.id, INPUT_ERROR_TEXT)
     else:
-        search_data[message.from_user.id].setdefault('max_price', max_price)
-        hotels_bot.send_message(message.from_user.id, 'Приступаю к поиску')
-        search_for_matches(message)
+        session.max_price = max_price
+        session.next_step = None
+        await send_message(message.from_user.id, SEARCH_START_TEXT)
+        with SEARCH_LATENCY.time(session.search_command), span(session.trace, 'search_for_matches'):
+            await search_for_matches(message.from_user.id, session)
+        complete_trace(session.trace)
 
 
-def saving_search_request(user_id: str) -> None:
+DIALOG_STEPS = {
+    'city_definition': city_definition,
+    'set_dates': set_dates,
+    'set_photo_need_and_search': set_photo_need_and_search,
+    'distance_definition': distance_definition,
+    'price_definition': price_definition
+}
+
+
+@traced('saving_search_request', session_trace)
+def saving_search_request(user_id: str, session: SearchSession) -> None:
     """
-    Функция сохраняет поисковые данные из словарей search_data и search_result в файл search_requests.json.
-    В полученном словаре данные по каждому пользователю распределены по датам и времени поискового запроса.
+    Функция сохраняет данные и результаты поисковой сессии в хранилище истории (storage).
+    Данные по каждому пользователю распределены по датам и времени поискового запроса.
 
-    Словарь каждого пользователя хранит не более 5 последних запросов. В случае, когда в словаре
-    достигается этот предел, для предотвращения переполнения словаря удаляется самый ранний по дате запрос,
-    после чего добавляется новый.
+    Для каждого пользователя хранится не более HISTORY_LIMIT (5) последних запросов: при сохранении
+    нового запроса более ранние удаляются в той же транзакции.
 
     :param user_id: ID пользователя, по которому будет записан поисковый запрос
     :type user_id: str
+
+    :param session: поисковая сессия пользователя
+    :type session: sessions.SearchSession
     """
-    with open('search_requests.json', 'r', encoding='utf-8') as req_file:
-        all_requests_data = json.load(req_file)
+    current_date = str(datetime.now()).partition('.')[0]
+    save_search_request(user_id, current_date, history_data_formation(session))
 
-        if user_id not in all_requests_data:
-            all_requests_data[user_id] = dict()
 
-        if len(all_requests_data[user_id]) == 5:
-            for count, search_date in enumerate(all_requests_data[user_id], 1):
-                if count == 1:
-                    all_requests_data[user_id].pop(search_date)
-                    break
+def history_data_formation(session: SearchSession) -> Dict[str, Any]:
+    """
+    Функция составляет из поисковой сессии словарь, который сохраняется в историю поиска.
+    Отели сохраняются компактными строками-списками (см. records.HotelRecord.as_row).
+
+    :param session: поисковая сессия пользователя
+    :type session: sessions.SearchSession
 
-        new_request_data = dict()
-        current_date = str(datetime.now()).partition('.')[0]
-
-        new_request_data[current_date] = {
-            'Команда поиска': search_data[int(user_id)]['search_command'],
-            'Даты пребывания': search_data[int(user_id)]['dates']['dates_of_stay']
-        }
-        if search_data[int(user_id)]['search_command'] == 'Bestdeal':
-            new_request_data[current_date].update(
-                {
-                    'Макс. расстояние от центра': '{value} км'.format(
-                                                  value=search_data[int(user_id)]['max_distance']),
-                    'Макс. цена, $': search_data[int(user_id)]['max_price']
-                }
-            )
-        new_request_data[current_date].update(search_result[int(user_id)])
-        all_requests_data[user_id].update(new_request_data)
-        with open('search_requests.json', 'w', encoding='utf-8') as req_file:
-            json.dump(all_requests_data, req_file, indent=4, ensure_ascii=False)
+    :rtype: Dict[str, Any]
+    """
+    new_request_data = {
+        'Команда поиска': session.search_command,
+        'Даты пребывания': session.dates.dates_of_stay
+    }
+    if session.search_command == 'Bestdeal':
+        new_request_data.update(
+            {
+                'Макс. расстояние от центра': '{value} км'.format(value=session.max_distance),
+                'Макс. цена, $': session.max_price
+            }
+        )
+    new_request_data.update({'Город': session.result_city, 'Отели': [hotel.as_row() for hotel in session.hotels]})
+    return new_request_data
@@ -0,0 +1,279 @@
+"""
+Модуль режима вебхука (BOT_MODE=webhook).
+
+Вместо опроса getUpdates бот запускает локальный HTTP-сервер, на который Telegram сам отправляет
+обновления (POST-запросы с json-объектом Update) сразу после их появления. Обновления передаются
+тем же обработчикам TeleBot (config.get_hotels_bot), что и в режиме polling.
+
+Обработка выполняется WEBHOOK_WORKERS потоками. Каждый поток обслуживает свою очередь ограниченного
+размера WEBHOOK_QUEUE_SIZE, а обновления одного пользователя всегда попадают в одну и ту же очередь,
+поэтому шаги поискового диалога обрабатываются по порядку. Если очередь переполнена, сервер отвечает
+503, и Telegram повторяет доставку обновления позже (обратное давление вместо неограниченного роста памяти).
+Запросы с телом больше WEBHOOK_MAX_BODY_SIZE отклоняются с ответом 413.
+
+Поисковый диалог пользователя (поисковая сессия и её следующий шаг) хранится в памяти процесса.
+Если запущено несколько экземпляров бота (WEBHOOK_PEERS), обновления пользователя обрабатывает только
+экземпляр с номером user_id % len(WEBHOOK_PEERS); обновление, которое балансировщик направил другому
+экземпляру, пересылается владельцу, поэтому балансировщику не нужно разбирать тело запроса.
+
+WEBHOOK_SECRET необязателен, но без него сервер принимает обновления от любого отправителя.
+
+Режим можно проверить без Telegram, отправив записанные обновления на локальный сервер:
+curl -X POST -H 'Content-Type: application/json' -d @update.json http://127.0.0.1:8443/webhook
+"""
+
+import json
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+from config import (HTTP_CONNECT_TIMEOUT, WEBHOOK_HOST, WEBHOOK_INSTANCE, WEBHOOK_MAX_BODY_SIZE, WEBHOOK_PATH,
+                    WEBHOOK_PEERS, WEBHOOK_PORT, WEBHOOK_QUEUE_SIZE, WEBHOOK_SECRET, WEBHOOK_URL, WEBHOOK_WORKERS,
+                    get_hotels_bot)
+
+from metrics import register_stats
+
+import requests
+
+from telebot import logger, types
+
+FORWARDED_HEADER = 'X-Bot-Webhook-Forwarded'
+FORWARD_TIMEOUT = 5
+peer_session = requests.Session()
+
+
+def update_user_id(update_data: Dict[str, Any]) -> int:
+    """
+    Функция определяет ID пользователя, от которого пришло обновление. Если обновление не связано
+    с пользователем, возвращается ID самого обновления.
+
+    :param update_data: json-объект Update
+    :type update_data: Dict[str, Any]
+
+    :rtype: int
+    """
+    for key, value in update_data.items():
+        if key != 'update_id' and isinstance(value, dict) and 'from' in value:
+            return value['from']['id']
+    return update_data.get('update_id', 0)
+
+
+def update_owner(update_data: Dict[str, Any]) -> int:
+    """
+    Функция определяет номер экземпляра бота, который обрабатывает обновления пользователя (см. WEBHOOK_PEERS).
+
+    :param update_data: json-объект Update
+    :type update_data: Dict[str, Any]
+
+    :rtype: int
+    """
+    if not WEBHOOK_PEERS:
+        return WEBHOOK_INSTANCE
+    return update_user_id(update_data) % len(WEBHOOK_PEERS)
+
+
+class UpdateDispatcher:
+    """
+    Класс распределения обновлений по потокам-обработчикам.
+
+    :param workers: количество потоков-обработчиков
+    :type workers: int
+
+    :param queue_size: максимальный размер очереди одного потока
+    :type queue_size: int
+    """
+
+    def __init__(self, workers: int, queue_size: int) -> None:
+        self.queues: List[queue.Queue] = [queue.Queue(queue_size) for _ in range(workers)]
+        self.rejected = 0
+        self.forwarded = 0
+        self.misrouted = 0
+        self.threads = [threading.Thread(target=self._work, args=(update_queue,), daemon=True,
+                                         name='WebhookWorker-{number}'.format(number=number))
+                        for number, update_queue in enumerate(self.queues)]
+
+    def start(self) -> None:
+        """Метод запускает потоки-обработчики."""
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, update_data: Dict[str, Any]) -> bool:
+        """
+        Метод ставит обновление в очередь потока, который обслуживает пользователя.
+
+        :param update_data: json-объект Update
+        :type update_data: Dict[str, Any]
+
+        :return: False, если очередь переполнена и обновление не принято
+        :rtype: bool
+        """
+        update_queue = self.queues[update_user_id(update_data) % len(self.queues)]
+        try:
+            update_queue.put_nowait(update_data)
+        except queue.Full:
+            self.rejected += 1
+            return False
+        return True
+
+    def depth(self) -> int:
+        """
+        Метод возвращает общее количество обновлений, ожидающих обработки.
+
+        :rtype: int
+        """
+        return sum(update_queue.qsize() for update_queue in self.queues)
+
+    @staticmethod
+    def _work(update_queue: queue.Queue) -> None:
+        """
+        Метод потока-обработчика: по одному передаёт обновления из очереди обработчикам бота.
+
+        :param update_queue: очередь потока
+        :type update_queue: queue.Queue
+        """
+        while True:
+            update_data = update_queue.get()
+            try:
+                get_hotels_bot().process_new_updates([types.Update.de_json(update_data)])
+            except Exception:
+                logger.exception('Ошибка при обработке обновления %s', update_data.get('update_id'))
+            finally:
+                update_queue.task_done()
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    """Класс обработчика HTTP-запросов вебхука."""
+
+    dispatcher: UpdateDispatcher
+
+    def do_POST(self) -> None:  # noqa: N802
+        """
+        Метод принимает обновление от Telegram и ставит его в очередь обработки
+        (или пересылает экземпляру бота, который обрабатывает обновления этого пользователя).
+        """
+        if self.path != WEBHOOK_PATH:
+            self.send_error(404)
+            return
+        if WEBHOOK_SECRET and self.headers.get('X-Telegram-Bot-Api-Secret-Token') != WEBHOOK_SECRET:
+            self.send_error(403)
+            return
+        try:
+            content_length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            self.send_error(400)
+            return
+        if content_length > WEBHOOK_MAX_BODY_SIZE:
+            self.send_error(413)
+            return
+        if content_length < 0:
+            self.send_error(400)
+            return
+        body = self.rfile.read(content_length)
+        try:
+            update_data = json.loads(body)
+        except ValueError:
+            self.send_error(400)
+            return
+        if not isinstance(update_data, dict):
+            self.send_error(400)
+            return
+        owner = update_owner(update_data)
+        if owner != WEBHOOK_INSTANCE:
+            self.forward(owner, body)
+            return
+        if not self.dispatcher.submit(update_data):
+            self.respond(503)
+            return
+        self.respond(200)
+
+    def forward(self, owner: int, body: bytes) -> None:
+        """
+        Метод пересылает обновление экземпляру бота owner и передаёт Telegram его ответ. Повторно уже
+        пересланное обновление не пересылается (списки WEBHOOK_PEERS экземпляров не совпадают): сервер отвечает 421.
+
+        :param owner: номер экземпляра бота в WEBHOOK_PEERS
+        :type owner: int
+
+        :param body: тело запроса с json-объектом Update
+        :type body: bytes
+        """
+        if self.headers.get(FORWARDED_HEADER):
+            self.dispatcher.misrouted += 1
+            logger.error('Обновление для экземпляра %s переслано экземпляру %s: проверьте WEBHOOK_PEERS',
+                         owner, WEBHOOK_INSTANCE)
+            self.respond(421)
+            return
+        forward_headers = {'Content-Type': 'application/json', FORWARDED_HEADER: '1'}
+        if WEBHOOK_SECRET:
+            forward_headers['X-Telegram-Bot-Api-Secret-Token'] = WEBHOOK_SECRET
+        try:
+            response = peer_session.post(WEBHOOK_PEERS[owner], data=body, headers=forward_headers,
+                                         timeout=(HTTP_CONNECT_TIMEOUT, FORWARD_TIMEOUT))
+        except requests.RequestException:
+            self.respond(503)
+            return
+        self.dispatcher.forwarded += 1
+        self.respond(response.status_code)
+
+    def respond(self, status: int) -> None:
+        """
+        Метод отправляет ответ без тела; при ответе 503 Telegram предлагается повторить доставку через секунду.
+
+        :param status: код ответа
+        :type status: int
+        """
+        self.send_response(status)
+        if status == 503:
+            self.send_header('Retry-After', '1')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        """Метод отключает вывод в консоль строки о каждом запросе."""
+
+
+def create_server(host: str = WEBHOOK_HOST, port: int = WEBHOOK_PORT) -> ThreadingHTTPServer:
+    """
+    Функция создаёт HTTP-сервер вебхука и запускает потоки-обработчики обновлений.
+    Обработчики бота выполняются прямо в потоках-обработчиках (TeleBot.threaded = False).
+
+    :param host: адрес, на котором сервер принимает запросы
+    :type host: str
+
+    :param port: порт, на котором сервер принимает запросы
+    :type port: int
+
+    :rtype: http.server.ThreadingHTTPServer
+
+    :raises ValueError: если WEBHOOK_INSTANCE не является номером экземпляра в WEBHOOK_PEERS
+    """
+    if WEBHOOK_PEERS and not 0 <= WEBHOOK_INSTANCE < len(WEBHOOK_PEERS):
+        raise ValueError('WEBHOOK_INSTANCE должен быть номером экземпляра в WEBHOOK_PEERS')
+    get_hotels_bot().threaded = False
+    dispatcher = UpdateDispatcher(WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE)
+    dispatcher.start()
+    register_stats('webhook_updates', 'Очередь обновлений вебхука', 'server',
+                   {'webhook': lambda: {'pending': dispatcher.depth(), 'rejected': dispatcher.rejected,
+                                        'forwarded': dispatcher.forwarded, 'misrouted': dispatcher.misrouted}})
+    handler_class = type('BoundWebhookHandler', (WebhookHandler,), {'dispatcher': dispatcher})
+    server = ThreadingHTTPServer((host, port), handler_class)
+    server.dispatcher = dispatcher
+    return server
+
+
+def run_webhook() -> None:
+    """
+    Функция запуска бота в режиме вебхука. Если задан WEBHOOK_URL, он устанавливается боту,
+    иначе предполагается, что вебхук настроен отдельно (например, на балансировщике нагрузки).
+    """
+    server = create_server()
+    if not WEBHOOK_SECRET:
+        logger.warning('WEBHOOK_SECRET не задан: обновления принимаются от любого отправителя')
+    if WEBHOOK_URL:
+        get_hotels_bot().remove_webhook()
+        get_hotels_bot().set_webhook(url=WEBHOOK_URL, secret_token=WEBHOOK_SECRET)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()